@@ -21,8 +21,9 @@ from multiprocessing import Pool, cpu_count
 # import my libraries
 import plot_utility as pu
 import make_cusp_focal_lut as mcfl
-import interpolate_cielab_data as icd
 import test_pattern_generator2 as tpg
+from lut import interpolate_periodic_1dlut
+from cielab import load_gamut_boundary_lut
 
 # information
 __author__ = 'Toru Yoshihara'
@@ -96,11 +97,9 @@ def calc_chroma_map_degree2(l_focal, c_focal, inner_cusp_lc):
 
 def get_chroma_lightness_val_specfic_hue(
         hue=30/360*2*np.pi, lh_lut_name=mcfl.BT709_BOUNDARY):
-    lh_lut = np.load(lh_lut_name)
-    lstar = np.linspace(0, 100, lh_lut.shape[0])
-    hue_list = np.ones((lh_lut.shape[1])) * hue
-    lh = np.dstack([lstar, hue_list])
-    chroma = icd.bilinear_interpolation(lh, lh_lut)
+    gb_lut = load_gamut_boundary_lut(lh_lut_name)
+    lstar = np.linspace(0, 100, gb_lut.l_sample_num)
+    chroma = gb_lut.chroma(l=lstar, h=hue)
 
     return np.dstack((chroma, lstar))[0]
 
@@ -211,11 +210,7 @@ def _debug_plot_lightness_mapping_specific_hue(
 
 
 def calc_value_from_hue_1dlut(val, lut):
-    x = np.linspace(0, 2*np.pi, len(lut))
-    f = interpolate.interp1d(x, lut)
-    y = f(val)
-
-    return y
+    return interpolate_periodic_1dlut(val, lut)
 
 
 def lightness_mapping_to_l_focal(l_out, c_out, c_map, l_focal):
@@ -5,23 +5,28 @@ implementation of the gamut mapping described in Report ITU-R BT.2407 Annex2.
 
 # import standard libraries
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 # import third-party libraries
 import numpy as np
 from multiprocessing import Pool, cpu_count, Array
-from colour import RGB_to_XYZ, XYZ_to_Lab, Lab_to_XYZ, XYZ_to_RGB,\
-    RGB_COLOURSPACES
+from colour import RGB_to_XYZ, XYZ_to_Lab,\
+    RGB_COLOURSPACES, delta_E
 
 # import my libraries
 from bt2407_parameters import get_chroma_map_lut_name,\
     get_gamut_boundary_lut_name
 import color_space as cs
-from cielab import bilinear_interpolation
+import lut
+import test_pattern_generator2 as tpg
+from cielab import load_gamut_boundary_lut, rgb_linear_to_lab,\
+    lab_to_rgb_linear
 
 from bt2407_parameters import GAMUT_BOUNDARY_LUT_LUMINANCE_SAMPLE,\
     GAMUT_BOUNDARY_LUT_HUE_SAMPLE, get_l_cusp_name, get_focal_name
-from make_bt2047_luts import calc_value_from_hue_1dlut, load_cusp_focal_lut,\
-    calc_chroma_map_degree2
+from make_bt2047_luts import calc_value_from_hue_1dlut,\
+    calc_chroma_map_degree2, get_bt2407_lut_registry
+from lut_registry import GAMUT_BOUNDARY_LUT_KIND
 
 
 # information
@@ -33,6 +38,24 @@ __email__ = 'toru.ver.11 at-sign gmail.com'
 
 __all__ = []
 
+# BT.2407 を焼き込んだ 3DLUT の Shaper のパラメータ。
+# 入力は Linear の 0.0～1.0 を想定しているので max_exposure は
+# log2(1.0 / 0.18) としている。
+BT2407_3DLUT_SHAPER_MID_GRAY = 0.18
+BT2407_3DLUT_SHAPER_MIN_EXPOSURE = -12.0
+BT2407_3DLUT_SHAPER_MAX_EXPOSURE = np.log2(1.0 / 0.18)
+
+# BT2407Mapper.map() が1画素あたりに使用するメモリ量の目安 [byte]。
+# 実測で 280 byte 程度だったので余裕を持たせている。
+BT2407_MAP_BYTES_PER_PIXEL = 320
+
+# BT2407Mapper.map_tiled() のデフォルトのタイルサイズ [pixel]
+BT2407_MAP_DEFAULT_TILE_SIZE = 2 ** 18
+
+# calc_dtype=np.float32 の場合の float64 に対する色差(CIEDE2000)の許容値。
+# _benchmark_float32_mapping() のテストセットで確認している。
+BT2407_FLOAT32_DELTA_E_BUDGET = 0.02
+
 
 def merge_lightness_mapping(
         hd_data_l, st_degree_l,
@@ -163,9 +186,9 @@ def interpolate_chroma_map_lut(cmap_hd_lut, degree_min, degree_max, data_hd):
     # 補間に利用するLUTのIndexを算出
     hue_data = data_hd[..., 0]
     degree_data = data_hd[..., 1]
-    hue_sample_num = GAMUT_BOUNDARY_LUT_HUE_SAMPLE
+    hue_sample_num = cmap_hd_lut.shape[0]
     hue_index_max = hue_sample_num - 1
-    degree_sample_num = GAMUT_BOUNDARY_LUT_HUE_SAMPLE
+    degree_sample_num = cmap_hd_lut.shape[1]
     degree_index_max = degree_sample_num - 1
 
     # 1. h_idx
@@ -295,11 +318,9 @@ def get_chroma_lightness_val_specfic_hue(
     plt.show()
     ```
     """
-    lh_lut = np.load(lh_lut_name)
-    lstar = np.linspace(0, 100, lh_lut.shape[0])
-    hue_list = np.ones((lh_lut.shape[1])) * hue
-    lh = np.dstack([lstar, hue_list])
-    chroma = bilinear_interpolation(lh, lh_lut)
+    gb_lut = load_gamut_boundary_lut(lh_lut_name)
+    lstar = np.linspace(0, 100, gb_lut.l_sample_num)
+    chroma = gb_lut.chroma(l=lstar, h=hue)
 
     return np.dstack((chroma, lstar))[0]
 
@@ -387,14 +408,13 @@ def calc_hue_from_ab(aa, bb):
 
 def calc_hue_degree_data_from_rgb(
         rgb_linear, l_focal_lut, c_focal_lut,
-        outer_color_space_name=cs.BT2020):
+        outer_color_space_name=cs.BT2020, dtype=np.float64):
     """
     Lightness Mapping に使用する Hue-Degree 形式に変換する。
+    dtype は計算に使う型。
     """
-    large_xyz = RGB_to_XYZ(
-        rgb_linear, cs.D65, cs.D65,
-        RGB_COLOURSPACES[outer_color_space_name].RGB_to_XYZ_matrix)
-    lab = XYZ_to_Lab(large_xyz)
+    lab = rgb_linear_to_lab(
+        rgb_linear, color_space_name=outer_color_space_name, dtype=dtype)
 
     lightness = lab[..., 0]
     aa = lab[..., 1]
@@ -428,10 +448,6 @@ def luminance_mapping_in_hd_space(
     BT2407 の Gamut Mapping のコア処理部分。
     Hue-Degree 空間での Luminance Mapping の実行
     """
-
-    hue = hd_data_l[..., 0]
-    l_focal = calc_value_from_hue_1dlut(hue, l_focal_lut)
-    c_focal = calc_value_from_hue_1dlut(hue, c_focal_lut)
     """
     cmap_lut には Mapping 先の座標情報として
     各Focal からの distance が記録されている。
@@ -465,6 +481,34 @@ def luminance_mapping_in_hd_space(
     st_degree_l, ed_degree_l, st_degree_c, ed_degree_c =\
         calc_chroma_map_degree2(l_focal_lut, c_focal_lut, inner_cusp_l_lut)
 
+    return luminance_mapping_in_hd_space_with_lut(
+        hd_data_l=hd_data_l, hd_data_c=hd_data_c,
+        src_chroma=src_chroma, src_lightness=src_lightness,
+        l_focal_lut=l_focal_lut, c_focal_lut=c_focal_lut,
+        cmap_lut_l=cmap_lut_l, cmap_lut_c=cmap_lut_c,
+        st_degree_l=st_degree_l, ed_degree_l=ed_degree_l,
+        st_degree_c=st_degree_c, ed_degree_c=ed_degree_c)
+
+
+def luminance_mapping_in_hd_space_with_lut(
+        hd_data_l, hd_data_c, src_chroma, src_lightness,
+        l_focal_lut, c_focal_lut, cmap_lut_l, cmap_lut_c,
+        st_degree_l, ed_degree_l, st_degree_c, ed_degree_c):
+    """
+    `luminance_mapping_in_hd_space` のうち、画素ごとの処理だけを行う。
+    LUT の Load や Cusp, Degree の計算は呼び出し側で済ませておくこと。
+
+    Parameters
+    ----------
+    cmap_lut_l, cmap_lut_c : array_like
+        L_Focal, C_Focal 用の Chroma Mapping LUT。
+    st_degree_l, ed_degree_l, st_degree_c, ed_degree_c : array_like
+        `calc_chroma_map_degree2` の戻り値。
+    """
+    hue = hd_data_l[..., 0]
+    l_focal = calc_value_from_hue_1dlut(hue, l_focal_lut)
+    c_focal = calc_value_from_hue_1dlut(hue, c_focal_lut)
+
     """
     cmap_lut から Hue-Degree のペアに該当する
     destination の distance を補間計算で算出する。
@@ -510,25 +554,367 @@ def luminance_mapping_in_hd_space(
 
 def calc_rgb_from_hue_chroma_lightness(
         hue, chroma, lightness,
-        color_space_name=cs.BT709):
+        color_space_name=cs.BT709, dtype=np.float64):
     aa = chroma * np.cos(hue)
     bb = chroma * np.sin(hue)
     lab = np.dstack((lightness, aa, bb))
-    large_xyz = Lab_to_XYZ(lab)
-    rgb = XYZ_to_RGB(
-        large_xyz, cs.D65, cs.D65,
-        RGB_COLOURSPACES[color_space_name].XYZ_to_RGB_matrix)
+    rgb = lab_to_rgb_linear(
+        lab, color_space_name=color_space_name, dtype=dtype)
 
     return rgb
 
 
+class BT2407Mapper():
+    def __init__(
+            self, outer_color_space_name=cs.BT2020,
+            inner_color_space_name=cs.BT709,
+            luminance_sample_num=GAMUT_BOUNDARY_LUT_LUMINANCE_SAMPLE,
+            hue_sample_num=GAMUT_BOUNDARY_LUT_HUE_SAMPLE,
+            calc_dtype=np.float64):
+        """
+        BT.2407 の Gamut Mapping に必要な LUT を一度だけ Load して
+        保持するクラス。LUT は mmap で開くため、同じファイルを使う
+        複数プロセス間で物理メモリが共有される。
+        Cusp や Chroma Mapping の Degree の範囲もここで計算しておき、
+        `map()` では画素ごとの処理だけを行う。
+
+        通常は `get_bt2407_mapper()` 経由で取得すること。
+
+        Parameters
+        ----------
+        outer_color_space_name : str
+            src の 色域の Colour Science for Python の名称。
+        inner_color_space_name : str
+            dst の 色域の Colour Science for Python の名称。
+        luminance_sample_num : int
+            LUT の Lightness 方向のサンプル数。
+        hue_sample_num : int
+            LUT の Hue 方向のサンプル数。
+        calc_dtype : type
+            `map()` の計算の型。np.float32 にすると LUT、Lab/LCh の
+            中間データ、出力を全て float32 で扱う。メモリ帯域が半分になる代わりに
+            float64 に対して最大 BT2407_FLOAT32_DELTA_E_BUDGET 程度の色差が生じる。
+            float32 の LUT は mmap ではなくプロセス毎のコピーになる。
+
+        Examples
+        --------
+        >>> mapper = get_bt2407_mapper(cs.BT2020, cs.BT709)
+        >>> for rgb_linear in frames:
+        ...     rgb_dst = mapper.map(rgb_linear)
+        """
+        self.outer_color_space_name = outer_color_space_name
+        self.inner_color_space_name = inner_color_space_name
+        self.luminance_sample_num = luminance_sample_num
+        self.hue_sample_num = hue_sample_num
+        self.calc_dtype = np.dtype(calc_dtype)
+
+        name_args = dict(
+            outer_color_space_name=outer_color_space_name,
+            inner_color_space_name=inner_color_space_name,
+            luminance_sample_num=luminance_sample_num,
+            hue_sample_num=hue_sample_num)
+
+        # Load LUTs. 無い場合はレジストリ経由で作成する
+        registry = get_bt2407_lut_registry()
+        self.l_focal_lut = registry.load(
+            "LfocalLUT", mmap_mode='r', **name_args)
+        self.c_focal_lut = registry.load(
+            "CfocalLUT", mmap_mode='r', **name_args)
+        self.cmap_lut_l = registry.load(
+            "ChromaMapLfocalLUT", mmap_mode='r', **name_args)
+        self.cmap_lut_c = registry.load(
+            "ChromaMapCfocalLUT", mmap_mode='r', **name_args)
+        lh_inner_lut = registry.load(
+            GAMUT_BOUNDARY_LUT_KIND, mmap_mode='r',
+            color_space_name=inner_color_space_name,
+            luminance_sample_num=luminance_sample_num,
+            hue_sample_num=hue_sample_num)
+
+        # Chroma Mapping LUT の Degree の範囲を事前計算
+        inner_cusp_l_lut = calc_cusp_lut(lh_lut=lh_inner_lut)
+        self.st_degree_l, self.ed_degree_l,\
+            self.st_degree_c, self.ed_degree_c\
+            = calc_chroma_map_degree2(
+                self.l_focal_lut, self.c_focal_lut, inner_cusp_l_lut)
+
+        # float32 の場合のみ LUT を float32 のコピーにする。
+        # float64 の場合は mmap のまま使い、プロセス間で共有する
+        # (ChromaMap の LUT は float32 で保存されているが、
+        #  計算時に float64 に昇格される)
+        if self.calc_dtype == np.float32:
+            for attr in ['l_focal_lut', 'c_focal_lut', 'cmap_lut_l',
+                         'cmap_lut_c', 'st_degree_l', 'ed_degree_l',
+                         'st_degree_c', 'ed_degree_c']:
+                setattr(self, attr, np.asarray(
+                    getattr(self, attr), dtype=self.calc_dtype))
+
+    def map(self, rgb_linear):
+        """
+        BT.2407 の Luminance Mapping に基づいた Gamut Mapping をする。
+
+        Parameters
+        ----------
+        rgb_linear : array_like
+            RGB のデータ。**Linear** であること。
+
+        Returns
+        -------
+        rgb_dst : array_like
+            inner_color_space に **変換済み** の RGB値
+            ただし RGB値は **Linear** である。
+        """
+        # shape を (N, 3) に変更。色々と処理しやすくするため。
+        if (len(rgb_linear.shape) != 2) and (rgb_linear.shape[1] != 3):
+            src_shape = rgb_linear.shape
+            shape_0 = 1
+            for shape_val in src_shape[:-1]:
+                shape_0 *= shape_val
+            src_rgb = rgb_linear.reshape((shape_0, 3))
+            restore_shape_flag = True
+        else:
+            restore_shape_flag = False
+            src_rgb = rgb_linear
+
+        # Non-Linear RGB --> Hue Degree への変換
+        hd_data_l, hd_data_c, src_chroma, src_lightness\
+            = calc_hue_degree_data_from_rgb(
+                rgb_linear=src_rgb, l_focal_lut=self.l_focal_lut,
+                c_focal_lut=self.c_focal_lut,
+                outer_color_space_name=self.outer_color_space_name,
+                dtype=self.calc_dtype)
+
+        # Luminance Mapping
+        dst_chroma, dst_lightness = luminance_mapping_in_hd_space_with_lut(
+            hd_data_l=hd_data_l, hd_data_c=hd_data_c,
+            src_chroma=src_chroma, src_lightness=src_lightness,
+            l_focal_lut=self.l_focal_lut, c_focal_lut=self.c_focal_lut,
+            cmap_lut_l=self.cmap_lut_l, cmap_lut_c=self.cmap_lut_c,
+            st_degree_l=self.st_degree_l, ed_degree_l=self.ed_degree_l,
+            st_degree_c=self.st_degree_c, ed_degree_c=self.ed_degree_c)
+
+        # Hue Degree --> Non-Linear RGB へ戻す
+        rgb_dst = calc_rgb_from_hue_chroma_lightness(
+            hue=hd_data_l[..., 0], chroma=dst_chroma,
+            lightness=dst_lightness,
+            color_space_name=self.inner_color_space_name,
+            dtype=self.calc_dtype)
+
+        rgb_dst = np.clip(rgb_dst, 0.0, 1.0)
+
+        if restore_shape_flag:
+            return rgb_dst.reshape((src_shape))
+        else:
+            return rgb_dst[0]
+
+    def map_tiled(
+            self, rgb_linear, tile_size=None, max_memory=None, dtype=None):
+        """
+        画像を tile_size 画素ずつに分割して `map()` を適用する。
+        中間データのメモリ使用量がタイルサイズで抑えられるので、
+        8K などの大きな画像でも一定のメモリで処理できる。
+        各画素は独立に処理されるので結果は `map()` と一致する。
+
+        Parameters
+        ----------
+        rgb_linear : array_like
+            RGB のデータ。**Linear** であること。shape is (..., 3).
+        tile_size : int
+            1回に処理する画素数。
+        max_memory : int
+            中間データに使用するメモリ量の上限 [byte]。
+            tile_size が None の場合はここから tile_size を決める。
+            どちらも None の場合は BT2407_MAP_DEFAULT_TILE_SIZE を使う。
+        dtype : type
+            出力の型。None の場合は calc_dtype。
+            np.float32 にすると出力バッファが半分になる。
+            内部の計算は `map()` と同じく calc_dtype で行う。
+
+        Returns
+        -------
+        rgb_dst : array_like
+            inner_color_space に **変換済み** の RGB値
+            ただし RGB値は **Linear** である。
+        """
+        if tile_size is None:
+            if max_memory is None:
+                tile_size = BT2407_MAP_DEFAULT_TILE_SIZE
+            else:
+                tile_size = max(max_memory // BT2407_MAP_BYTES_PER_PIXEL, 1)
+        dtype = self.calc_dtype if dtype is None else dtype
+
+        rgb_linear = np.asarray(rgb_linear)
+        src_rgb = rgb_linear.reshape((-1, 3))
+        pixel_num = src_rgb.shape[0]
+        tile_size = min(tile_size, pixel_num)
+        dst_rgb = np.empty((pixel_num, 3), dtype=dtype)
+
+        # 入力が calc_dtype の連続領域でない場合はタイル毎にここへコピーする
+        need_copy = (src_rgb.dtype != self.calc_dtype)\
+            or (not src_rgb.flags.c_contiguous)
+        if need_copy:
+            scratch = np.empty((tile_size, 3), dtype=self.calc_dtype)
+
+        for st in range(0, pixel_num, tile_size):
+            ed = min(st + tile_size, pixel_num)
+            if need_copy:
+                src_tile = scratch[:ed - st]
+                np.copyto(src_tile, src_rgb[st:ed])
+            else:
+                src_tile = src_rgb[st:ed]
+            dst_rgb[st:ed] = self.map(src_tile)
+
+        return dst_rgb.reshape(rgb_linear.shape)
+
+    def map_parallel(
+            self, rgb_linear, worker_num=None,
+            tile_size=BT2407_MAP_DEFAULT_TILE_SIZE, dtype=None):
+        """
+        画像を行方向の帯に分割し、スレッドプールで並列に `map_tiled()` する。
+        NumPy の演算中は GIL が解放されるので複数コアを使える。
+        結果は `map()` と一致する。
+
+        Parameters
+        ----------
+        rgb_linear : array_like
+            RGB のデータ。**Linear** であること。shape is (..., 3).
+        worker_num : int
+            スレッド数。None の場合は cpu_count()。
+        tile_size : int
+            各スレッドが1回に処理する画素数。
+        dtype : type
+            出力の型。None の場合は calc_dtype。
+
+        Returns
+        -------
+        rgb_dst : array_like
+            inner_color_space に **変換済み** の RGB値
+            ただし RGB値は **Linear** である。
+        """
+        worker_num = cpu_count() if worker_num is None else worker_num
+        dtype = self.calc_dtype if dtype is None else dtype
+        rgb_linear = np.asarray(rgb_linear)
+        src_rgb = rgb_linear.reshape((-1, 3))
+        dst_rgb = np.empty(src_rgb.shape, dtype=dtype)
+
+        # 画素は行順に並んでいるので、連続する画素の範囲が行方向の帯になる
+        band_num = min(worker_num * 4, src_rgb.shape[0])
+        band_edges = np.linspace(0, src_rgb.shape[0], band_num + 1)
+        band_edges = band_edges.astype(np.int64)
+
+        def map_band(band_idx):
+            st, ed = band_edges[band_idx], band_edges[band_idx + 1]
+            dst_rgb[st:ed] = self.map_tiled(
+                src_rgb[st:ed], tile_size=tile_size, dtype=dtype)
+
+        if worker_num > 1:
+            with ThreadPoolExecutor(worker_num) as executor:
+                list(executor.map(map_band, range(band_num)))
+        else:
+            for band_idx in range(band_num):
+                map_band(band_idx)
+
+        return dst_rgb.reshape(rgb_linear.shape)
+
+    def map_frames(
+            self, frames, worker_num=None, use_process=False,
+            tile_size=BT2407_MAP_DEFAULT_TILE_SIZE):
+        """
+        フレームのイテレータを受け取り、変換後のフレームを順に返す。
+
+        use_process=False の場合は各フレームを `map_parallel()` で処理する。
+        use_process=True の場合はフレーム単位でプロセスプールに割り振る。
+        子プロセスでも LUT は mmap で開くので物理メモリは共有される。
+
+        Parameters
+        ----------
+        frames : iterable
+            RGB のデータ(**Linear**)を返すイテレータ。
+        worker_num : int
+            スレッド数 or プロセス数。None の場合は cpu_count()。
+        use_process : bool
+            プロセスプールを使うかどうか。
+        tile_size : int
+            1回に処理する画素数。
+
+        Yields
+        ------
+        rgb_dst : array_like
+            inner_color_space に **変換済み** の RGB値(**Linear**)。
+
+        Examples
+        --------
+        >>> mapper = get_bt2407_mapper(cs.BT2020, cs.BT709)
+        >>> for rgb_dst in mapper.map_frames(frame_iter, use_process=True):
+        ...     write(rgb_dst)
+        """
+        worker_num = cpu_count() if worker_num is None else worker_num
+        if not use_process:
+            for rgb_linear in frames:
+                yield self.map_parallel(
+                    rgb_linear, worker_num=worker_num, tile_size=tile_size)
+            return
+
+        args = (
+            dict(rgb_linear=rgb_linear, tile_size=tile_size,
+                 outer_color_space_name=self.outer_color_space_name,
+                 inner_color_space_name=self.inner_color_space_name,
+                 luminance_sample_num=self.luminance_sample_num,
+                 hue_sample_num=self.hue_sample_num,
+                 calc_dtype=self.calc_dtype)
+            for rgb_linear in frames)
+        with Pool(worker_num) as pool:
+            for rgb_dst in pool.imap(map_frame_wrapper, args):
+                yield rgb_dst
+
+
+_bt2407_mapper_cache = {}
+
+
+def get_bt2407_mapper(
+        outer_color_space_name=cs.BT2020,
+        inner_color_space_name=cs.BT709,
+        luminance_sample_num=GAMUT_BOUNDARY_LUT_LUMINANCE_SAMPLE,
+        hue_sample_num=GAMUT_BOUNDARY_LUT_HUE_SAMPLE,
+        calc_dtype=np.float64):
+    """
+    BT2407Mapper をキャッシュから取得する。
+    初回呼び出し時のみ LUT の Load と事前計算が走る。
+    """
+    key = (outer_color_space_name, inner_color_space_name,
+           luminance_sample_num, hue_sample_num, np.dtype(calc_dtype).str)
+    if key not in _bt2407_mapper_cache:
+        _bt2407_mapper_cache[key] = BT2407Mapper(
+            outer_color_space_name=outer_color_space_name,
+            inner_color_space_name=inner_color_space_name,
+            luminance_sample_num=luminance_sample_num,
+            hue_sample_num=hue_sample_num, calc_dtype=calc_dtype)
+
+    return _bt2407_mapper_cache[key]
+
+
+def map_frame_wrapper(args):
+    """
+    BT2407Mapper.map_frames() のプロセスプール用。
+    Mapper はプロセス毎にキャッシュされる。
+    """
+    mapper = get_bt2407_mapper(
+        outer_color_space_name=args['outer_color_space_name'],
+        inner_color_space_name=args['inner_color_space_name'],
+        luminance_sample_num=args['luminance_sample_num'],
+        hue_sample_num=args['hue_sample_num'],
+        calc_dtype=args['calc_dtype'])
+
+    return mapper.map_tiled(args['rgb_linear'], tile_size=args['tile_size'])
+
+
 def bt2407_gamut_mapping_for_rgb_linear(
         rgb_linear=(np.array([1023, 512, 256])/1023)**2.4,
         outer_color_space_name=cs.BT2020,
-        inner_color_space_name=cs.BT709):
+        inner_color_space_name=cs.BT709, calc_dtype=np.float64):
     """
     BT.2407 の Luminance Mapping に基づいた Gamut Mapping をする。
     なお、事前に諸々のLUTを作成しておく必要がある。
+    LUT は初回呼び出し時に Load され、以後はキャッシュが使われる。
 
     Parameters
     ----------
@@ -538,6 +924,8 @@ def bt2407_gamut_mapping_for_rgb_linear(
         src の 色域の Colour Science for Python の名称。
     inner_color_space_name : str
         dst の 色域の Colour Science for Python の名称。
+    calc_dtype : type
+        計算の型。np.float32 も可。詳細は BT2407Mapper を参照。
 
     Returns
     -------
@@ -545,53 +933,292 @@ def bt2407_gamut_mapping_for_rgb_linear(
         inner_color_space に **変換済み** の RGB値
         ただし RGB値は **Linear** である。必要に応じて OETF を適用すること。
     """
-    # shape を (N, 3) に変更。色々と処理しやすくするため。
-    if (len(rgb_linear.shape) != 2) and (rgb_linear.shape[1] != 3):
-        src_shape = rgb_linear.shape
-        shape_0 = 1
-        for shape_val in src_shape[:-1]:
-            shape_0 *= shape_val
-        src_rgb = rgb_linear.reshape((shape_0, 3))
-        restore_shape_flag = True
-    else:
-        restore_shape_flag = False
-        src_rgb = rgb_linear
+    mapper = get_bt2407_mapper(
+        outer_color_space_name=outer_color_space_name,
+        inner_color_space_name=inner_color_space_name,
+        calc_dtype=calc_dtype)
+
+    return mapper.map(rgb_linear)
+
+
+def get_bt2407_3dlut_name(
+        outer_color_space_name=cs.BT2020,
+        inner_color_space_name=cs.BT709,
+        grid_num=65):
+    name = "./luts/bt2407_{}_to_{}_grid_{}_with_shaper.cube".format(
+        outer_color_space_name, inner_color_space_name, grid_num)
+    return name
+
 
-    # Load LUTs
-    _, l_focal_lut, c_focal_lut = load_cusp_focal_lut(
+def get_bt2407_3dlut_shaper_name(
+        outer_color_space_name=cs.BT2020,
+        inner_color_space_name=cs.BT709):
+    name = "./luts/bt2407_{}_to_{}_shaper.spi1d".format(
+        outer_color_space_name, inner_color_space_name)
+    return name
+
+
+def apply_bt2407_shaper(rgb_linear):
+    """
+    Linear の RGB値に 3DLUT 用の Shaper(Log2) を適用する。
+    """
+    rgb_linear = np.clip(rgb_linear, 0.0, 1.0)
+    with np.errstate(divide='ignore'):
+        rgb_shaper = tpg.shaper_func_linear_to_log2(
+            x=rgb_linear, mid_gray=BT2407_3DLUT_SHAPER_MID_GRAY,
+            min_exposure=BT2407_3DLUT_SHAPER_MIN_EXPOSURE,
+            max_exposure=BT2407_3DLUT_SHAPER_MAX_EXPOSURE)
+
+    return rgb_shaper
+
+
+def make_bt2407_3dlut(
+        outer_color_space_name=cs.BT2020,
+        inner_color_space_name=cs.BT709,
+        grid_num=65, sample_num_1d=4096, save_file=True):
+    """
+    BT.2407 の Gamut Mapping を Shaper付きの 3DLUT に焼き込む。
+    3DLUT の入力は Shaper(Log2) 適用後の値、出力は Linear の RGB値。
+
+    Shaper は 1DLUT としても保存する。2019/008 の例と同じく
+    Log2 -> Linear の向きで保存しているので、OCIO では inverse で使うこと。
+
+    Parameters
+    ----------
+    outer_color_space_name : str
+        src の 色域の Colour Science for Python の名称。
+    inner_color_space_name : str
+        dst の 色域の Colour Science for Python の名称。
+    grid_num : int
+        3DLUT の格子点数。精度と速度のトレードオフになる。
+    sample_num_1d : int
+        Shaper の 1DLUT のサンプル数。
+    save_file : bool
+        ファイルに保存するかどうか。
+
+    Returns
+    -------
+    lut_3d : array_like
+        3dlut data with cube format.
+    """
+    # make shaper 1dlut
+    if save_file:
+        x_shaper = np.linspace(0, 1, sample_num_1d)
+        y_shaper = tpg.shaper_func_log2_to_linear(
+            x=x_shaper, mid_gray=BT2407_3DLUT_SHAPER_MID_GRAY,
+            min_exposure=BT2407_3DLUT_SHAPER_MIN_EXPOSURE,
+            max_exposure=BT2407_3DLUT_SHAPER_MAX_EXPOSURE)
+        lut.save_1dlut(
+            lut=y_shaper, filename=get_bt2407_3dlut_shaper_name(
+                outer_color_space_name, inner_color_space_name))
+
+    # make 3dlut with shaper
+    x_3d = lut.get_3d_grid_cube_format(grid_num)
+    rgb_linear = tpg.shaper_func_log2_to_linear(
+        x=x_3d, mid_gray=BT2407_3DLUT_SHAPER_MID_GRAY,
+        min_exposure=BT2407_3DLUT_SHAPER_MIN_EXPOSURE,
+        max_exposure=BT2407_3DLUT_SHAPER_MAX_EXPOSURE)
+    # Shaper の最小値は 0.0 にならないので、0.0 を明示的に通す
+    rgb_linear[x_3d == 0.0] = 0.0
+    mapper = get_bt2407_mapper(
         outer_color_space_name=outer_color_space_name,
         inner_color_space_name=inner_color_space_name)
+    lut_3d = mapper.map_tiled(rgb_linear)
 
-    # Non-Linear RGB --> Hue Degree への変換
-    hd_data_l, hd_data_c, src_chroma, src_lightness\
-        = calc_hue_degree_data_from_rgb(
-            rgb_linear=src_rgb, l_focal_lut=l_focal_lut,
-            c_focal_lut=c_focal_lut,
-            outer_color_space_name=outer_color_space_name)
+    if save_file:
+        title = "BT.2407 Gamut Mapping {} to {} with Log2 shaper".format(
+            outer_color_space_name, inner_color_space_name)
+        lut.save_3dlut(
+            lut=lut_3d, grid_num=grid_num, title=title,
+            filename=get_bt2407_3dlut_name(
+                outer_color_space_name, inner_color_space_name, grid_num))
 
-    # Luminance Mapping
-    dst_chroma, dst_lightness = luminance_mapping_in_hd_space(
-        hd_data_l=hd_data_l, hd_data_c=hd_data_c,
-        src_chroma=src_chroma, src_lightness=src_lightness,
-        l_focal_lut=l_focal_lut, c_focal_lut=c_focal_lut)
+    return lut_3d
+
+
+def bt2407_gamut_mapping_using_3dlut(rgb_linear, lut3d):
+    """
+    make_bt2407_3dlut() で作った 3DLUT で Gamut Mapping をする。
+
+    Parameters
+    ----------
+    rgb_linear : array_like
+        RGB のデータ。**Linear** であること。
+    lut3d : lut.Lut3D
+        make_bt2407_3dlut() の結果を格納した Lut3D。
 
-    # Hue Degree --> Non-Linear RGB へ戻す
-    rgb_dst = calc_rgb_from_hue_chroma_lightness(
-        hue=hd_data_l[..., 0], chroma=dst_chroma, lightness=dst_lightness,
-        color_space_name=inner_color_space_name)
+    Returns
+    -------
+    rgb_dst : array_like
+        inner_color_space に **変換済み** の RGB値(**Linear**)。
 
-    rgb_dst = np.clip(rgb_dst, 0.0, 1.0)
+    Examples
+    --------
+    >>> grid_num = 65
+    >>> lut3d = lut.Lut3D(make_bt2407_3dlut(grid_num=grid_num), grid_num)
+    >>> bt2407_gamut_mapping_using_3dlut(rgb_linear, lut3d)
+    """
+    return lut3d.apply(apply_bt2407_shaper(rgb_linear))
+
+
+def _test_bt2407_3dlut(
+        outer_color_space_name=cs.BT2020,
+        inner_color_space_name=cs.BT709,
+        grid_num_list=[17, 33, 65], sample_num=2 ** 18):
+    """
+    3DLUT を使った結果と解析的な結果の色差(CIEDE2000)を表示する。
+    """
+    import time
 
-    if restore_shape_flag:
-        return rgb_dst.reshape((src_shape))
+    mapper = get_bt2407_mapper(
+        outer_color_space_name=outer_color_space_name,
+        inner_color_space_name=inner_color_space_name)
+    rgb_linear = np.random.default_rng(0).random((sample_num, 3)) ** 2.4
+    start = time.time()
+    ref_rgb = mapper.map_tiled(rgb_linear)
+    print("analytic: {:.3f}[s]".format(time.time() - start))
+
+    inner_color_space = RGB_COLOURSPACES[inner_color_space_name]
+    illuminant = inner_color_space.whitepoint
+    ref_lab = XYZ_to_Lab(RGB_to_XYZ(
+        ref_rgb, illuminant, illuminant,
+        inner_color_space.RGB_to_XYZ_matrix), illuminant)
+
+    for grid_num in grid_num_list:
+        lut3d = lut.Lut3D(
+            make_bt2407_3dlut(
+                outer_color_space_name, inner_color_space_name,
+                grid_num=grid_num, save_file=False),
+            grid_num)
+        start = time.time()
+        lut_rgb = bt2407_gamut_mapping_using_3dlut(rgb_linear, lut3d)
+        elapsed_time = time.time() - start
+        lut_lab = XYZ_to_Lab(RGB_to_XYZ(
+            lut_rgb, illuminant, illuminant,
+            inner_color_space.RGB_to_XYZ_matrix), illuminant)
+        de = delta_E(ref_lab, lut_lab, method='CIE 2000')
+        print("grid_num={:d}: {:.3f}[s], max dE={:.4f}, mean dE={:.4f}".format(
+            grid_num, elapsed_time, np.max(de), np.mean(de)))
+
+
+def _benchmark_tiled_mapping_worker(args):
+    import resource
+    import time
+    width, height, tile_size = args
+    mapper = get_bt2407_mapper()
+    rgb_linear = np.random.default_rng(0).random((height, width, 3))
+    start = time.time()
+    if tile_size is None:
+        rgb_dst = mapper.map(rgb_linear)
     else:
-        return rgb_dst[0]
+        rgb_dst = mapper.map_tiled(rgb_linear, tile_size=tile_size)
+    elapsed_time = time.time() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    checksum = float(np.sum(rgb_dst))
+
+    return elapsed_time, peak_rss, checksum
+
+
+def _benchmark_tiled_mapping(
+        width=3840, height=2160, tile_size_list=[None, 2 ** 20, 2 ** 18]):
+    """
+    map() と map_tiled() の処理時間と peak RSS を比較する。
+    peak RSS を個別に測るため、条件毎に別プロセスで実行する。
+    tile_size=None は map() で一括処理した場合。
+    """
+    for tile_size in tile_size_list:
+        with Pool(1) as pool:
+            elapsed_time, peak_rss, checksum = pool.map(
+                _benchmark_tiled_mapping_worker,
+                [(width, height, tile_size)])[0]
+        print("tile_size={}, time={:.2f}[sec], peak RSS={:.0f}[MB], "
+              "checksum={}".format(
+                  tile_size, elapsed_time, peak_rss / 2 ** 20, checksum))
+
+
+def _benchmark_parallel_mapping(
+        width=1920, height=1080, frame_num=8, worker_num_list=None):
+    """
+    map_frames() の worker 数に対するスループット [fps] を計測する。
+    """
+    import time
+
+    if worker_num_list is None:
+        worker_num_list = sorted({1, 2, 4, cpu_count()})
+    mapper = get_bt2407_mapper()
+    frame = np.random.default_rng(0).random((height, width, 3))
+    ref = mapper.map(frame)
+
+    for use_process in [False, True]:
+        for worker_num in worker_num_list:
+            start = time.time()
+            for rgb_dst in mapper.map_frames(
+                    (frame for idx in range(frame_num)),
+                    worker_num=worker_num, use_process=use_process):
+                pass
+            elapsed_time = time.time() - start
+            print("process={}, worker_num={:d}: {:.3f}[fps], "
+                  "max diff={:.3e}".format(
+                      use_process, worker_num, frame_num / elapsed_time,
+                      np.max(np.abs(rgb_dst - ref))))
+
+
+def _benchmark_float32_mapping(
+        width=1920, height=1080, grid_num=33,
+        de_budget=BT2407_FLOAT32_DELTA_E_BUDGET):
+    """
+    calc_dtype=np.float32 と np.float64 の処理時間、peak メモリ、
+    および色差(CIEDE2000)を比較する。
+
+    テストセットは RGB の grid_num^3 の格子点(色域の境界を含む)と
+    width x height のランダムな画像(Linear)。
+    色差は inner_color_space の Lab で float64 の結果を基準に計算する。
+    """
+    import time
+    import tracemalloc
+
+    grid = lut.get_3d_grid_cube_format(grid_num) ** 2.4
+    frame = np.random.default_rng(0).random((height * width, 3)) ** 2.4
+    test_set = np.vstack((grid, frame))
+
+    inner_color_space = RGB_COLOURSPACES[cs.BT709]
+    result = {}
+    for calc_dtype in [np.float64, np.float32]:
+        mapper = get_bt2407_mapper(calc_dtype=calc_dtype)
+        src_rgb = test_set.astype(calc_dtype)
+        mapper.map_tiled(src_rgb[:1024])  # warm up
+        tracemalloc.start()
+        start = time.time()
+        rgb_dst = mapper.map_tiled(src_rgb)
+        elapsed_time = time.time() - start
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        result[calc_dtype] = rgb_dst
+        print("{}: {:.2f}[Mpixel/s], peak memory={:.0f}[MB]".format(
+            np.dtype(calc_dtype).name,
+            test_set.shape[0] / elapsed_time / 1e6, peak_memory / 2 ** 20))
+
+    lab64, lab32 = [
+        XYZ_to_Lab(RGB_to_XYZ(
+            result[calc_dtype].astype(np.float64), cs.D65, cs.D65,
+            inner_color_space.RGB_to_XYZ_matrix))
+        for calc_dtype in [np.float64, np.float32]]
+    de = delta_E(lab64, lab32, method='CIE 2000')
+    print("dE2000 (float32 vs float64): max={:.4f}, mean={:.5f}, "
+          "99.9%={:.4f}".format(
+              np.max(de), np.mean(de), np.percentile(de, 99.9)))
+    assert np.max(de) <= de_budget
 
 
 def main_func():
-    pass
+    make_bt2407_3dlut(
+        outer_color_space_name=cs.BT2020, inner_color_space_name=cs.BT709,
+        grid_num=65)
 
 
 if __name__ == '__main__':
     os.chdir(os.path.dirname(os.path.abspath(__file__)))
     main_func()
+    # _benchmark_parallel_mapping()
+    # _benchmark_float32_mapping()
+    # _test_bt2407_3dlut()
@@ -53,8 +53,18 @@ def get_gamut_boundary_lut_name(
         color_space_name=cs.BT709,
         luminance_sample_num=GAMUT_BOUNDARY_LUT_LUMINANCE_SAMPLE,
         hue_sample_num=GAMUT_BOUNDARY_LUT_HUE_SAMPLE):
+    # lut_registry は cielab 等も import するので、使う時だけ import する
+    import lut_registry
+    return lut_registry.get_gamut_boundary_lut_name(
+        color_space_name, luminance_sample_num, hue_sample_num)
+
+
+def get_gamut_boundary_lut_checkpoint_name(
+        color_space_name=cs.BT709,
+        luminance_sample_num=GAMUT_BOUNDARY_LUT_LUMINANCE_SAMPLE,
+        hue_sample_num=GAMUT_BOUNDARY_LUT_HUE_SAMPLE):
     name = f"./luts/GamutBoundaryLUT_{color_space_name}_"\
-        + f"L_{luminance_sample_num}_H_{hue_sample_num}.npy"
+        + f"L_{luminance_sample_num}_H_{hue_sample_num}_checkpoint.npy"
     return name
 
 
@@ -7,13 +7,15 @@ BT2407 実装用の各種LUTを作成する
 
 # import standard libraries
 import os
-import ctypes
 import time
+import atexit
+from functools import partial
+from multiprocessing import shared_memory
 
 # import third-party libraries
 from sympy import symbols
 import numpy as np
-from multiprocessing import Pool, cpu_count, Array
+from multiprocessing import Pool, cpu_count
 from scipy import signal, interpolate
 import matplotlib.pyplot as plt
 
@@ -21,7 +23,10 @@ import matplotlib.pyplot as plt
 # import my libraries
 import cielab as cl
 import color_space as cs
+from lut import interpolate_periodic_1dlut
+from lut_registry import get_lut_registry, GAMUT_BOUNDARY_LUT_KIND
 from bt2407_parameters import L_SAMPLE_NUM_MAX, H_SAMPLE_NUM_MAX,\
+    get_gamut_boundary_lut_checkpoint_name,\
     GAMUT_BOUNDARY_LUT_LUMINANCE_SAMPLE, GAMUT_BOUNDARY_LUT_HUE_SAMPLE,\
     get_gamut_boundary_lut_name, get_l_cusp_name, get_focal_name,\
     DIPS_150_SAMPLE_ST_BT2020, DIPS_150_SAMPLE_ED_BT2020,\
@@ -43,15 +48,6 @@ __email__ = 'toru.ver.11 at-sign gmail.com'
 __all__ = []
 
 
-shared_array = Array(
-    typecode_or_type=ctypes.c_float,
-    size_or_initializer=L_SAMPLE_NUM_MAX*H_SAMPLE_NUM_MAX)
-
-shared_array2 = Array(
-    typecode_or_type=ctypes.c_float,
-    size_or_initializer=L_SAMPLE_NUM_MAX*H_SAMPLE_NUM_MAX)
-
-
 def load_cusp_focal_lut(
         outer_color_space_name=cs.BT2020,
         inner_color_space_name=cs.BT709):
@@ -89,138 +85,422 @@ def calc_cusp_focal_specific_hue(
     return l_cusp, l_focal, c_focal
 
 
-def solve_chroma_wrapper(args):
-    chroma = cl.solve_chroma(**args)
-    s_idx = args['h_sample_num'] * args['l_idx'] + args['h_idx']
-    shared_array[s_idx] = chroma
+# LUT作成用の Pool。プロセス起動のコストを毎回払わないように使い回す。
+_worker_pool = None
+
+# ワーカー側で sympy の式を使い回すためのキャッシュ
+_worker_rgb_exprs_cache = {}
 
+# ワーカー側で LUT を使い回すためのキャッシュ
+_worker_lut_cache = {}
 
-def solve_chroma_wrapper_fast(args):
-    chroma = cl.solve_chroma_fast(**args)
-    s_idx = args['h_sample_num'] * args['l_idx'] + args['h_idx']
-    shared_array[s_idx] = chroma
 
+def get_worker_pool():
+    """
+    LUT作成用の Pool を返す。初回呼び出し時に作成し、以降は使い回す。
+    """
+    global _worker_pool
+    if _worker_pool is None:
+        _worker_pool = Pool(cpu_count())
+        atexit.register(close_worker_pool)
+    return _worker_pool
 
-def solve_chroma_wrapper_fastest(args):
-    chroma = cl.solve_chroma_fastest(**args)
-    s_idx = args['h_sample_num'] * args['l_idx']
-    shared_array[s_idx:s_idx+args['h_sample_num']] = chroma
 
+def close_worker_pool():
+    global _worker_pool
+    if _worker_pool is not None:
+        _worker_pool.close()
+        _worker_pool.join()
+        _worker_pool = None
 
-def make_chroma_array(primaries=cs.get_primaries(cs.BT709),
-                      l_sample_num=L_SAMPLE_NUM_MAX,
-                      h_sample_num=H_SAMPLE_NUM_MAX):
+
+def create_shared_buffer(shape, dtype=np.float32):
     """
-    L*a*b* 空間における a*b*平面の境界線プロットのために、
-    各L* における 境界線の Chroma を計算する。
+    ワーカープロセスと共有するバッファを確保する。
+    サイズは実際に作成する LUT に合わせる。
+
+    Returns
+    -------
+    shm : SharedMemory
+        shared memory. 使い終わったら release_shared_buffer で解放すること。
+    buf : ndarray
+        shm を参照する ndarray.
     """
+    size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    buf = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    buf[...] = 0
+    return shm, buf
+
 
-    l, c, h = symbols('l, c, h')
-    rgb_exprs = cl.lab_to_rgb_expr(l, c, h, primaries=primaries)
+def attach_shared_buffer(name, shape, dtype=np.float32):
+    """
+    create_shared_buffer で確保したバッファをワーカー側から参照する。
+    """
+    shm = shared_memory.SharedMemory(name=name)
+    buf = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    return shm, buf
+
+
+def release_shared_buffer(shm, unlink=False):
+    shm.close()
+    if unlink:
+        shm.unlink()
+
+
+def open_checkpoint_buffer(fname, shape, dtype=np.float32):
+    """
+    途中結果を保存するための memmap のバッファを開く。
+    ファイルが既にあり shape, dtype が一致する場合はそのまま再利用する。
+    無い場合は未計算を表す NaN で初期化して作成する。
+
+    Returns
+    -------
+    buf : memmap
+        チェックポイントファイルを参照する memmap.
+    """
+    if os.path.isfile(fname):
+        buf = np.load(fname, mmap_mode='r+')
+        if buf.shape == tuple(shape) and buf.dtype == np.dtype(dtype):
+            return buf
+        del buf
+        print(f"{fname} has a different shape. it is recreated.")
+    buf = np.lib.format.open_memmap(fname, mode='w+', dtype=dtype, shape=shape)
+    buf[...] = np.nan
+    buf.flush()
+    return buf
+
+
+def fill_from_coarse_lut(chroma_buf, coarse_lut):
+    """
+    粗い LUT の値を、格子点が一致する細かい LUT の位置にコピーする。
+    既に計算済みの値は上書きしない。
+
+    (fine_sample_num - 1) が (coarse_sample_num - 1) で
+    割り切れる必要がある(格子点が一致しないため)。
+    """
+    step_list = []
+    for fine_num, coarse_num in zip(chroma_buf.shape, coarse_lut.shape):
+        if (fine_num - 1) % (coarse_num - 1) != 0:
+            raise ValueError(
+                f"the grid of the coarse LUT {coarse_lut.shape} "
+                f"does not match {chroma_buf.shape}.")
+        step_list.append((fine_num - 1) // (coarse_num - 1))
+    l_step, h_step = step_list
+    sub_buf = chroma_buf[::l_step, ::h_step]
+    not_done_idx = np.isnan(sub_buf)
+    sub_buf[not_done_idx] = np.asarray(coarse_lut)[not_done_idx]
+
+
+def _load_lut_cached(fname):
+    """
+    ワーカープロセス内で同じ LUT を何度も読み込まないようにする。
+    ファイルが更新された場合は読み直す。
+    """
+    mtime = os.path.getmtime(fname)
+    if fname not in _worker_lut_cache\
+            or _worker_lut_cache[fname][0] != mtime:
+        _worker_lut_cache[fname] = (mtime, np.load(fname))
+    return _worker_lut_cache[fname][1]
+
+
+def _get_worker_rgb_exprs(primaries):
+    """
+    sympy の式の作成は重いので、ワーカープロセス毎に1回だけ作る。
+    """
+    key = tuple(np.asarray(primaries).flatten())
+    if key not in _worker_rgb_exprs_cache:
+        l, c, h = symbols('l, c, h')
+        rgb_exprs = cl.lab_to_rgb_expr(l, c, h, primaries=primaries)
+        _worker_rgb_exprs_cache[key] = (rgb_exprs, l, c, h)
+    return _worker_rgb_exprs_cache[key]
+
+
+def print_progress(done_num, total_num, elapsed_time):
+    """
+    make_chroma_array_tiled 用のデフォルトの進捗表示。
+    """
+    eta = elapsed_time / done_num * (total_num - done_num)
+    print(f"progress: {done_num}/{total_num} "
+          f"({done_num / total_num * 100:.1f}%), "
+          f"elapsed={elapsed_time:.1f}[sec], eta={eta:.1f}[sec]")
+
+
+def solve_chroma_tile_wrapper(args):
+    """
+    (L, H) のタイル1枚分の Chroma を計算して共有バッファに書き込む。
+    計算済み(NaN ではない)のサンプルはスキップする。
+    """
+    solver = args['solver']
+    l_sample_num = args['l_sample_num']
+    h_sample_num = args['h_sample_num']
     l_vals = np.linspace(0, 100, l_sample_num)
     h_vals = np.linspace(0, 2*np.pi, h_sample_num)
-    for l_idx, l_val in enumerate(l_vals):
-        args = []
-        for h_idx, h_val in enumerate(h_vals):
-            d = dict(
-                l_val=l_val, l_idx=l_idx, h_val=h_val, h_idx=h_idx,
-                rgb_exprs=rgb_exprs, l=l, c=c, h=h,
-                l_sample_num=l_sample_num, h_sample_num=h_sample_num)
-            args.append(d)
-        with Pool(cpu_count()) as pool:
-            pool.map(solve_chroma_wrapper, args)
-
-    chroma = np.array(
-        shared_array[:l_sample_num * h_sample_num]).reshape(
-            (l_sample_num, h_sample_num))
+    h_st = args['h_st']
+    h_ed = args['h_ed']
+    if args['checkpoint_fname'] is not None:
+        shm = None
+        chroma_buf = np.load(args['checkpoint_fname'], mmap_mode='r+')
+    else:
+        shm, chroma_buf = attach_shared_buffer(
+            args['shm_name'], (l_sample_num, h_sample_num))
+
+    done_num = 0
+    for l_idx in range(args['l_st'], args['l_ed']):
+        h_idx_list = h_st + np.flatnonzero(
+            np.isnan(chroma_buf[l_idx, h_st:h_ed]))
+        done_num += len(h_idx_list)
+        if len(h_idx_list) == 0:
+            continue
+        if solver == 'fastest':
+            # cl.is_inner_gamut は1サンプルだけだと動かないので2つ渡す
+            h_vals_pending = h_vals[np.resize(h_idx_list, 2)]\
+                if len(h_idx_list) == 1 else h_vals[h_idx_list]
+            chroma = cl.solve_chroma_fastest(
+                l_val=l_vals[l_idx], l_idx=l_idx, h_vals=h_vals_pending,
+                l_sample_num=l_sample_num,
+                color_space_name=args['color_space_name'])
+            chroma_buf[l_idx, h_idx_list] = chroma[:len(h_idx_list)]
+            continue
+        for h_idx in h_idx_list:
+            if solver == 'sympy':
+                rgb_exprs, l, c, h = _get_worker_rgb_exprs(args['primaries'])
+                chroma = cl.solve_chroma(
+                    l_val=l_vals[l_idx], l_idx=l_idx,
+                    h_val=h_vals[h_idx], h_idx=h_idx,
+                    rgb_exprs=rgb_exprs, l=l, c=c, h=h,
+                    l_sample_num=l_sample_num)
+            else:
+                chroma = cl.solve_chroma_fast(
+                    l_val=l_vals[l_idx], l_idx=l_idx,
+                    h_val=h_vals[h_idx], h_idx=h_idx,
+                    l_sample_num=l_sample_num,
+                    color_space_name=args['color_space_name'])
+            chroma_buf[l_idx, h_idx] = chroma
+
+    if shm is None:
+        chroma_buf.flush()
+        del chroma_buf
+    else:
+        del chroma_buf
+        release_shared_buffer(shm)
+
+    return done_num
+
+
+def make_chroma_array_tiled(
+        solver='fast', color_space_name=cs.BT709, primaries=None,
+        l_sample_num=L_SAMPLE_NUM_MAX, h_sample_num=H_SAMPLE_NUM_MAX,
+        l_tile_size=1, h_tile_size=64, progress_callback=print_progress,
+        checkpoint_fname=None, coarse_lut=None):
+    """
+    L*a*b* 空間における a*b*平面の境界線プロットのために、
+    各L* における 境界線の Chroma を計算する。
+    (L, H) 平面をタイルに分割し、使い回しの Pool で並列に計算する。
+
+    checkpoint_fname を指定した場合は共有メモリの代わりに memmap の
+    .npy ファイルに直接書き込む。処理が途中で止まっても、
+    同じ引数で再実行すれば未計算のタイルだけを計算する。
+
+    Parameters
+    ----------
+    solver : str
+        'sympy', 'fast', 'fastest' のいずれか。
+        それぞれ cl.solve_chroma, cl.solve_chroma_fast,
+        cl.solve_chroma_fastest に対応する。
+    color_space_name : str
+        target color space name. 'fast', 'fastest' で使用。
+    primaries : array_like
+        primaries of the target color space. 'sympy' で使用。
+    l_sample_num : int
+        sample number of the lightness.
+    h_sample_num : int
+        sample number of the hue.
+    l_tile_size : int
+        L方向のタイルサイズ。
+    h_tile_size : int
+        H方向のタイルサイズ。
+    progress_callback : callable
+        タイルが1枚終わる毎に
+        ``progress_callback(done_num, total_num, elapsed_time)``
+        の形式で呼ばれる。None の場合は何もしない。
+    checkpoint_fname : str
+        途中結果を保存する .npy ファイル名。None の場合は保存しない。
+    coarse_lut : array_like
+        同じ色域の粗い LUT。格子点が一致するサンプルは計算せずに
+        この値を使う。詳細は fill_from_coarse_lut を参照。
+
+    Returns
+    -------
+    array_like
+        chroma. shape is (l_sample_num, h_sample_num).
+    """
+    if primaries is None:
+        primaries = cs.get_primaries(color_space_name)
+    shape = (l_sample_num, h_sample_num)
+    if checkpoint_fname is not None:
+        shm = None
+        chroma_buf = open_checkpoint_buffer(checkpoint_fname, shape)
+    else:
+        shm, chroma_buf = create_shared_buffer(shape)
+        chroma_buf[...] = np.nan
+    if coarse_lut is not None:
+        fill_from_coarse_lut(chroma_buf, coarse_lut)
+        if shm is None:
+            chroma_buf.flush()
+
+    args = []
+    for l_st in range(0, l_sample_num, l_tile_size):
+        for h_st in range(0, h_sample_num, h_tile_size):
+            l_ed = min(l_st + l_tile_size, l_sample_num)
+            h_ed = min(h_st + h_tile_size, h_sample_num)
+            if not np.isnan(chroma_buf[l_st:l_ed, h_st:h_ed]).any():
+                continue
+            args.append(
+                dict(
+                    solver=solver, color_space_name=color_space_name,
+                    primaries=primaries, checkpoint_fname=checkpoint_fname,
+                    shm_name=None if shm is None else shm.name,
+                    l_sample_num=l_sample_num, h_sample_num=h_sample_num,
+                    l_st=l_st, l_ed=l_ed, h_st=h_st, h_ed=h_ed))
+
+    total_num = int(np.count_nonzero(np.isnan(chroma_buf)))
+    done_num = 0
+    start = time.time()
+    pool = get_worker_pool()
+    try:
+        for sample_num in pool.imap_unordered(
+                solve_chroma_tile_wrapper, args):
+            done_num += sample_num
+            if progress_callback is not None:
+                progress_callback(done_num, total_num, time.time() - start)
+        chroma = np.array(chroma_buf)
+    finally:
+        del chroma_buf
+        if shm is not None:
+            release_shared_buffer(shm, unlink=True)
+
     return chroma
 
 
+def make_chroma_array(primaries=cs.get_primaries(cs.BT709),
+                      l_sample_num=L_SAMPLE_NUM_MAX,
+                      h_sample_num=H_SAMPLE_NUM_MAX,
+                      checkpoint_fname=None):
+    """
+    L*a*b* 空間における a*b*平面の境界線プロットのために、
+    各L* における 境界線の Chroma を計算する。
+    """
+    return make_chroma_array_tiled(
+        solver='sympy', primaries=primaries,
+        l_sample_num=l_sample_num, h_sample_num=h_sample_num,
+        l_tile_size=1, h_tile_size=16, checkpoint_fname=checkpoint_fname)
+
+
 def make_chroma_array_fast(
         color_space_name=cs.BT709,
         l_sample_num=L_SAMPLE_NUM_MAX,
-        h_sample_num=H_SAMPLE_NUM_MAX):
+        h_sample_num=H_SAMPLE_NUM_MAX,
+        checkpoint_fname=None):
     """
     L*a*b* 空間における a*b*平面の境界線プロットのために、
     各L* における 境界線の Chroma を計算する。
     高速版。
     """
-
-    l_vals = np.linspace(0, 100, l_sample_num)
-    h_vals = np.linspace(0, 2*np.pi, h_sample_num)
-    for l_idx, l_val in enumerate(l_vals):
-        args = []
-        for h_idx, h_val in enumerate(h_vals):
-            d = dict(
-                l_val=l_val, l_idx=l_idx, h_val=h_val, h_idx=h_idx,
-                l_sample_num=l_sample_num, h_sample_num=h_sample_num,
-                color_space_name=color_space_name)
-            args.append(d)
-        with Pool(cpu_count()) as pool:
-            pool.map(solve_chroma_wrapper_fast, args)
-
-    chroma = np.array(
-        shared_array[:l_sample_num * h_sample_num]).reshape(
-            (l_sample_num, h_sample_num))
-    return chroma
+    return make_chroma_array_tiled(
+        solver='fast', color_space_name=color_space_name,
+        l_sample_num=l_sample_num, h_sample_num=h_sample_num,
+        l_tile_size=1, h_tile_size=64, checkpoint_fname=checkpoint_fname)
 
 
 def make_chroma_array_fastest(
         color_space_name=cs.BT709,
         l_sample_num=L_SAMPLE_NUM_MAX,
-        h_sample_num=H_SAMPLE_NUM_MAX):
+        h_sample_num=H_SAMPLE_NUM_MAX,
+        checkpoint_fname=None):
     """
     L*a*b* 空間における a*b*平面の境界線プロットのために、
     各L* における 境界線の Chroma を計算する。
     高速版。
     """
+    return make_chroma_array_tiled(
+        solver='fastest', color_space_name=color_space_name,
+        l_sample_num=l_sample_num, h_sample_num=h_sample_num,
+        l_tile_size=8, h_tile_size=h_sample_num,
+        checkpoint_fname=checkpoint_fname)
+
+
+def make_chroma_array_analytical(
+        color_space_name=cs.BT709,
+        l_sample_num=L_SAMPLE_NUM_MAX,
+        h_sample_num=H_SAMPLE_NUM_MAX):
+    """
+    L*a*b* 空間における a*b*平面の境界線プロットのために、
+    各L* における 境界線の Chroma を計算する。
+    3次方程式の解の公式を使って全サンプルを一括で計算する版。
+    """
     l_vals = np.linspace(0, 100, l_sample_num)
     h_vals = np.linspace(0, 2*np.pi, h_sample_num)
-    args = []
-    for l_idx, l_val in enumerate(l_vals):
-        d = dict(
-            l_val=l_val, l_idx=l_idx, h_vals=h_vals,
-            l_sample_num=l_sample_num, h_sample_num=h_sample_num,
-            color_space_name=color_space_name)
-        args.append(d)
-    with Pool(cpu_count()) as pool:
-        pool.map(solve_chroma_wrapper_fastest, args)
-
-    chroma = np.array(
-        shared_array[:l_sample_num * h_sample_num]).reshape(
-            (l_sample_num, h_sample_num))
+    chroma = cl.solve_chroma_analytical(
+        l_vals[:, np.newaxis], h_vals[np.newaxis, :],
+        color_space_name=color_space_name)
+
     return chroma
 
 
 def make_gamut_bondary_lut(
         l_sample_num=GAMUT_BOUNDARY_LUT_LUMINANCE_SAMPLE,
         h_sample_num=GAMUT_BOUNDARY_LUT_HUE_SAMPLE,
-        color_space_name=cs.BT709):
+        color_space_name=cs.BT709, resume=True):
+    checkpoint_fname = get_gamut_boundary_lut_checkpoint_name(
+        color_space_name, l_sample_num, h_sample_num) if resume else None
     chroma = make_chroma_array(
         primaries=cs.get_primaries(color_space_name),
-        l_sample_num=l_sample_num, h_sample_num=h_sample_num)
+        l_sample_num=l_sample_num, h_sample_num=h_sample_num,
+        checkpoint_fname=checkpoint_fname)
     fname = get_gamut_boundary_lut_name(
         color_space_name, l_sample_num, h_sample_num)
     np.save(fname, chroma)
+    remove_checkpoint(checkpoint_fname)
 
 
 def make_gamut_bondary_lut_fast(
         l_sample_num=GAMUT_BOUNDARY_LUT_LUMINANCE_SAMPLE,
         h_sample_num=GAMUT_BOUNDARY_LUT_HUE_SAMPLE,
-        color_space_name=cs.BT709):
+        color_space_name=cs.BT709, resume=True):
+    checkpoint_fname = get_gamut_boundary_lut_checkpoint_name(
+        color_space_name, l_sample_num, h_sample_num) if resume else None
     chroma = make_chroma_array_fast(
         color_space_name=color_space_name,
-        l_sample_num=l_sample_num, h_sample_num=h_sample_num)
+        l_sample_num=l_sample_num, h_sample_num=h_sample_num,
+        checkpoint_fname=checkpoint_fname)
     fname = get_gamut_boundary_lut_name(
         color_space_name, l_sample_num, h_sample_num)
     np.save(fname, chroma)
+    remove_checkpoint(checkpoint_fname)
 
 
 def make_gamut_bondary_lut_fastest(
         l_sample_num=GAMUT_BOUNDARY_LUT_LUMINANCE_SAMPLE,
         h_sample_num=GAMUT_BOUNDARY_LUT_HUE_SAMPLE,
-        color_space_name=cs.BT709):
+        color_space_name=cs.BT709, resume=True):
+    checkpoint_fname = get_gamut_boundary_lut_checkpoint_name(
+        color_space_name, l_sample_num, h_sample_num) if resume else None
     chroma = make_chroma_array_fastest(
+        color_space_name=color_space_name,
+        l_sample_num=l_sample_num, h_sample_num=h_sample_num,
+        checkpoint_fname=checkpoint_fname)
+    fname = get_gamut_boundary_lut_name(
+        color_space_name, l_sample_num, h_sample_num)
+    np.save(fname, chroma)
+    remove_checkpoint(checkpoint_fname)
+
+
+def make_gamut_bondary_lut_analytical(
+        l_sample_num=GAMUT_BOUNDARY_LUT_LUMINANCE_SAMPLE,
+        h_sample_num=GAMUT_BOUNDARY_LUT_HUE_SAMPLE,
+        color_space_name=cs.BT709):
+    chroma = make_chroma_array_analytical(
         color_space_name=color_space_name,
         l_sample_num=l_sample_num, h_sample_num=h_sample_num)
     fname = get_gamut_boundary_lut_name(
@@ -228,6 +508,58 @@ def make_gamut_bondary_lut_fastest(
     np.save(fname, chroma)
 
 
+def remove_checkpoint(checkpoint_fname):
+    """
+    LUT の保存が完了したらチェックポイントのファイルを削除する。
+    """
+    if checkpoint_fname is not None and os.path.isfile(checkpoint_fname):
+        os.remove(checkpoint_fname)
+
+
+def refine_gamut_boundary_lut(
+        color_space_name=cs.BT709,
+        coarse_l_sample_num=GAMUT_BOUNDARY_LUT_LUMINANCE_SAMPLE,
+        coarse_h_sample_num=GAMUT_BOUNDARY_LUT_HUE_SAMPLE,
+        l_sample_num=GAMUT_BOUNDARY_LUT_LUMINANCE_SAMPLE * 2 - 1,
+        h_sample_num=GAMUT_BOUNDARY_LUT_HUE_SAMPLE * 2 - 1,
+        solver='fastest'):
+    """
+    既存の粗い Gamut Boundary LUT から細かい LUT を作る。
+    格子点が一致するサンプルは粗い LUT の値を使い、
+    新たに増えたサンプルだけを計算する。チェックポイントも有効。
+
+    例えば 1024x1024 -> 2047x2047 の場合、計算量は約3/4になる。
+
+    Parameters
+    ----------
+    color_space_name : str
+        target color space name.
+    coarse_l_sample_num, coarse_h_sample_num : int
+        粗い LUT のサンプル数。
+    l_sample_num, h_sample_num : int
+        作成する LUT のサンプル数。
+        (l_sample_num - 1) は (coarse_l_sample_num - 1) で
+        割り切れること。Hue も同様。
+    solver : str
+        make_chroma_array_tiled の solver.
+    """
+    coarse_lut = np.load(get_gamut_boundary_lut_name(
+        color_space_name, coarse_l_sample_num, coarse_h_sample_num))
+    checkpoint_fname = get_gamut_boundary_lut_checkpoint_name(
+        color_space_name, l_sample_num, h_sample_num)
+    tile_size_list = dict(sympy=(1, 16), fast=(1, 64), fastest=(8, None))
+    l_tile_size, h_tile_size = tile_size_list[solver]
+    chroma = make_chroma_array_tiled(
+        solver=solver, color_space_name=color_space_name,
+        l_sample_num=l_sample_num, h_sample_num=h_sample_num,
+        l_tile_size=l_tile_size, h_tile_size=h_tile_size or h_sample_num,
+        checkpoint_fname=checkpoint_fname, coarse_lut=coarse_lut)
+    fname = get_gamut_boundary_lut_name(
+        color_space_name, l_sample_num, h_sample_num)
+    np.save(fname, chroma)
+    remove_checkpoint(checkpoint_fname)
+
+
 def make_gamut_boundary_lut_all():
     # L*a*b* 全体のデータを算出
     start = time.time()
@@ -282,6 +614,24 @@ def make_gamut_boundary_lut_all_fastest():
     print("elapsed_time:{0}".format(elapsed_time) + "[sec]")
 
 
+def make_gamut_boundary_lut_all_analytical():
+    # L*a*b* 全体のデータを算出
+    start = time.time()
+    make_gamut_bondary_lut_analytical(color_space_name=cs.BT709)
+    elapsed_time = time.time() - start
+    print("elapsed_time:{0}".format(elapsed_time) + "[sec]")
+
+    start = time.time()
+    make_gamut_bondary_lut_analytical(color_space_name=cs.BT2020)
+    elapsed_time = time.time() - start
+    print("elapsed_time:{0}".format(elapsed_time) + "[sec]")
+
+    start = time.time()
+    make_gamut_bondary_lut_analytical(color_space_name=cs.P3_D65)
+    elapsed_time = time.time() - start
+    print("elapsed_time:{0}".format(elapsed_time) + "[sec]")
+
+
 def calc_intercsection_with_lightness_axis(inter_cusp, outer_cusp):
     """
     calculate the intersection of the two cusps
@@ -328,6 +678,32 @@ def calc_cusp_in_lc_plane(hue, lh_lut):
     return np.array((l_sample[cusp_idx], chroma_for_each_l[cusp_idx]))
 
 
+def calc_cusp_in_lc_plane_all_hue(hue_list, lh_lut):
+    """
+    calc_cusp_in_lc_plane の全 Hue 一括版。
+    (L*, Hue) の格子で Chroma を一括で補間計算して argmax を取る。
+
+    Parameters
+    ----------
+    hue_list : array_like
+        hue(the unit is radian). shape is (N,).
+    lh_lut : array_like (2D)
+        L*-Chroma 2D-LUT.
+
+    Returns
+    -------
+    array_like
+        [L*star, Chroma] of the Cusp. shape is (N, 2).
+    """
+    l_sample = np.linspace(0, 100, GAMUT_BOUNDARY_LUT_LUMINANCE_SAMPLE)
+    chroma = cl.GamutBoundaryLUT(lh_lut).chroma(
+        l=l_sample[:, np.newaxis], h=np.asarray(hue_list)[np.newaxis, :])
+    cusp_idx = np.argmax(chroma, axis=0)
+    cusp_chroma = chroma[cusp_idx, np.arange(chroma.shape[1])]
+
+    return np.stack((l_sample[cusp_idx], cusp_chroma), axis=-1)
+
+
 def calc_l_cusp_specific_hue(hue, inner_lut, outer_lut):
     """
     Parameters
@@ -348,19 +724,26 @@ def calc_l_cusp_specific_hue(hue, inner_lut, outer_lut):
 
 
 def calc_l_cusp(
-        inner_color_space_name=cs.BT709, outer_color_space_name=cs.BT2020):
-    inner_lut = np.load(
-        get_gamut_boundary_lut_name(inner_color_space_name))
-    outer_lut = np.load(
-        get_gamut_boundary_lut_name(outer_color_space_name))
-    l_cusp = []
+        inner_color_space_name=cs.BT709, outer_color_space_name=cs.BT2020,
+        inner_lut=None, outer_lut=None):
+    """
+    全 Hue の L_cusp を一括で計算する。
+    inner_lut, outer_lut が None の場合はファイルから読み込む。
+    """
+    if inner_lut is None:
+        inner_lut = np.load(
+            get_gamut_boundary_lut_name(inner_color_space_name))
+    if outer_lut is None:
+        outer_lut = np.load(
+            get_gamut_boundary_lut_name(outer_color_space_name))
     h_sample = GAMUT_BOUNDARY_LUT_HUE_SAMPLE
     hue_list = np.linspace(0, 2*np.pi, h_sample)
 
-    for hue in hue_list:
-        lll = calc_l_cusp_specific_hue(hue, inner_lut, outer_lut)
-        l_cusp.append(lll)
-    l_cusp = np.array(l_cusp)
+    inner_cusp = calc_cusp_in_lc_plane_all_hue(hue_list, inner_lut)
+    outer_cusp = calc_cusp_in_lc_plane_all_hue(hue_list, outer_lut)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        l_cusp, _ = calc_intercsection_with_lightness_axis(
+            inner_cusp.T, outer_cusp.T)
 
     return l_cusp
 
@@ -410,7 +793,7 @@ def get_dips_value_around_300(l_cusp, outer_color_space_name=cs.BT2020):
     return dips_300, dips_300_idx
 
 
-def calc_l_focal(l_cusp, outer_color_space_name=cs.BT2020):
+def calc_l_focal(l_cusp, outer_color_space_name=cs.BT2020, debug_plot=True):
     """
     l_cusp に修正を加えた l_focal を求める
 
@@ -433,9 +816,10 @@ def calc_l_focal(l_cusp, outer_color_space_name=cs.BT2020):
     l_focal[l_focal_240_index:dips_300_idx + 1] = decrement_data
     l_focal[dips_300_idx:] = dips_300
 
-    _debug_plot_l_cusp(
-        l_cusp, l_focal, dips_150, dips_300, l_cusp_low_pass,
-        outer_color_space_name)
+    if debug_plot:
+        _debug_plot_l_cusp(
+            l_cusp, l_focal, dips_150, dips_300, l_cusp_low_pass,
+            outer_color_space_name)
 
     return l_focal
 
@@ -457,7 +841,9 @@ def calc_intersection_with_chroma_axis(inner_cusp, outer_cusp):
 
     div_val = (y2 - y1)
 
-    x = x2 - (x2 - x1) / div_val * y2 if div_val != 0 else 0
+    # 全 Hue 一括で計算する場合もあるので np.where で 0 にする
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x = np.where(div_val != 0, x2 - (x2 - x1) / div_val * y2, 0)
 
     return (0, x)
 
@@ -495,38 +881,54 @@ def interpolate_where_value_is_zero(x, y):
 
 def calc_c_focal(
         outer_color_space_name=cs.BT2020,
-        inner_color_space_name=cs.BT709):
-    inner_lut = np.load(
-        get_gamut_boundary_lut_name(inner_color_space_name))
-    outer_lut = np.load(
-        get_gamut_boundary_lut_name(outer_color_space_name))
-    c_focal = []
+        inner_color_space_name=cs.BT709,
+        inner_lut=None, outer_lut=None, debug_plot=True):
+    """
+    全 Hue の C_focal を一括で計算する。
+    inner_lut, outer_lut が None の場合はファイルから読み込む。
+    """
+    if inner_lut is None:
+        inner_lut = np.load(
+            get_gamut_boundary_lut_name(inner_color_space_name))
+    if outer_lut is None:
+        outer_lut = np.load(
+            get_gamut_boundary_lut_name(outer_color_space_name))
     h_sample = GAMUT_BOUNDARY_LUT_HUE_SAMPLE
     hue_list = np.linspace(0, 2*np.pi, h_sample)
 
-    for idx, hue in enumerate(hue_list):
-        lll = calc_c_focal_specific_hue(hue, inner_lut, outer_lut)
-        c_focal.append(lll)
-        # break
-    c_focal = np.abs(np.array(c_focal))
+    inner_cusp = calc_cusp_in_lc_plane_all_hue(hue_list, inner_lut)
+    outer_cusp = calc_cusp_in_lc_plane_all_hue(hue_list, outer_lut)
+    _, c_focal = calc_intersection_with_chroma_axis(
+        inner_cusp.T, outer_cusp.T)
+    c_focal = np.abs(c_focal)
 
     # 色々と問題があるので補間とかLPFとか処理する
     c_focal_interp = interpolate_where_value_is_zero(hue_list, c_focal)
     c_focal_interp[c_focal_interp > C_FOCAL_MAX_VALUE] = C_FOCAL_MAX_VALUE
     c_focal_lpf = low_pass_filter2(
         c_focal_interp, nn=LPF_NN_PARAM, wn=LPF_WN_PARAM)
-    _debug_plot_c_focal(c_focal, c_focal_lpf, outer_color_space_name)
+    if debug_plot:
+        _debug_plot_c_focal(c_focal, c_focal_lpf, outer_color_space_name)
 
     return c_focal_lpf
 
 
 def make_focal_lut(
         outer_color_space_name=cs.BT2020,
-        inner_color_space_name=cs.BT709):
+        inner_color_space_name=cs.BT709, debug_plot=True):
+    """
+    L_Cusp, L_Focal, C_Focal の LUT を作成する。
+    Gamut Boundary LUT は1回だけ読み込み、全 Hue を一括で計算する。
+    debug_plot=False にするとグラフの作成を省略する。
+    """
+    inner_lut = np.load(get_gamut_boundary_lut_name(inner_color_space_name))
+    outer_lut = np.load(get_gamut_boundary_lut_name(outer_color_space_name))
+
     # L Cusp
     l_cusp = calc_l_cusp(
         outer_color_space_name=outer_color_space_name,
-        inner_color_space_name=inner_color_space_name)
+        inner_color_space_name=inner_color_space_name,
+        inner_lut=inner_lut, outer_lut=outer_lut)
     np.save(
         get_l_cusp_name(
             outer_color_space_name=outer_color_space_name,
@@ -535,7 +937,8 @@ def make_focal_lut(
 
     # L_focal
     l_focal = calc_l_focal(
-        l_cusp, outer_color_space_name=outer_color_space_name)
+        l_cusp, outer_color_space_name=outer_color_space_name,
+        debug_plot=debug_plot)
     np.save(
         get_focal_name(
             outer_color_space_name=outer_color_space_name,
@@ -546,7 +949,8 @@ def make_focal_lut(
     # C_focal
     c_focal = calc_c_focal(
         outer_color_space_name=outer_color_space_name,
-        inner_color_space_name=inner_color_space_name)
+        inner_color_space_name=inner_color_space_name,
+        inner_lut=inner_lut, outer_lut=outer_lut, debug_plot=debug_plot)
     np.save(
         get_focal_name(
             outer_color_space_name=outer_color_space_name,
@@ -634,8 +1038,9 @@ def _debug_plot_c_focal(c_focal, low_pass, outer_color_space_name):
 
 def get_chroma_lightness_val_specfic_hue(
         hue=30/360*2*np.pi,
-        lh_lut_name=get_gamut_boundary_lut_name(cs.BT709)):
-    lh_lut = np.load(lh_lut_name)
+        lh_lut_name=get_gamut_boundary_lut_name(cs.BT709), lh_lut=None):
+    if lh_lut is None:
+        lh_lut = np.load(lh_lut_name)
     lstar = np.linspace(0, 100, lh_lut.shape[0])
     hue_list = np.ones((lh_lut.shape[1])) * hue
     lh = np.dstack([lstar, hue_list])
@@ -648,12 +1053,10 @@ def calc_value_from_hue_1dlut(val, lut):
     """
     Lfocal や Cfocal など Hue値が入力となっている
     1DLUTの補間計算をして出力する。
+    計算の型は lut に合わせる(float32 の LUT なら float32)。
     """
-    x = np.linspace(0, 2*np.pi, len(lut))
-    f = interpolate.interp1d(x, lut)
-    y = f(val)
-
-    return y
+    return interpolate_periodic_1dlut(
+        val, lut, dtype=np.result_type(lut, np.float32))
 
 
 def calc_chroma_map_degree2(l_focal, c_focal, inner_cusp_lc):
@@ -756,6 +1159,103 @@ def solve_equation_for_intersection(
     return icn_valid_x, icn_valid_y
 
 
+def _calc_intersection_with_segment(cl_point, a1, b1, a2, b2, seg_idx):
+    """
+    solve_equation_for_intersection と同じ計算を
+    各直線につき1つの線分 (seg_idx) に対してだけ行う。
+    """
+    icn_x = (b1 - b2[seg_idx]) / (a2[seg_idx] - a1)
+    icn_y = a1 * icn_x + b1
+    x0 = cl_point[:-1, 0][seg_idx]
+    x1 = cl_point[1:, 0][seg_idx]
+    y0 = cl_point[:-1, 1][seg_idx]
+    y1 = cl_point[1:, 1][seg_idx]
+    ok_idx = ((icn_x >= x0) & (icn_x <= x1)) | ((icn_x <= x0) & (icn_x >= x1))
+    ok_idx = ok_idx & (icn_y >= y0) & (icn_y <= y1)
+
+    return icn_x, icn_y, ok_idx
+
+
+def solve_equation_for_intersection_sorted(
+        cl_point, a1, b1, a2, b2, focal_point,
+        focal="L_Focal", inner_cusp=None):
+    """
+    solve_equation_for_intersection と同じ結果を
+    O(N+M) のメモリで求める。
+
+    Inner Gamut Boundary の各点を Focal から見た角度は
+    Lightness 方向に単調に変化するので、Focal からの直線の角度を
+    np.searchsorted で探索すれば交差する線分の候補が分かる。
+    候補の前後の線分に対して solve_equation_for_intersection と
+    同一の判定を行い、候補が見つからなかった直線だけ
+    従来の総当たりで解く。
+
+    Parameters
+    ----------
+    cl_point : array_like (2d array)
+        Inner Gamut Boundary の Chroma-Lightness データ。
+    a1 : array_like
+        y=ax+b の a のパラメータ。
+        Focal を中心とした直線。
+    b1 : array_like
+        y=ax+b の b のパラメータ。
+        Focal を中心とした直線。
+    a2 : array_like
+        y=ax+b の a のパラメータ。
+        Inner Gamut Boundary の隣接するサンプルを結んだ直線
+    b2 : array_like
+        y=ax+b の b のパラメータ。
+        Inner Gamut Boundary の隣接するサンプルを結んだ直線
+    focal_point : array_like
+        Focal の (Chroma, Lightness) 座標。
+    focal : str
+        focal の種類を設定。"L_Focal" or "C_Focal".
+    inner_cusp : array_like
+        C_Focal の特別処理用。
+        交点の Lightness値は Inner Gamut の Cusp よりも小さい必要がある。
+    """
+    # L_Focal は Chroma の正方向、C_Focal は負方向に直線が伸びる
+    if focal == "L_Focal":
+        sign = 1
+        ray_angle = np.arctan(a1)
+        seg_num = len(a2)
+    else:
+        sign = -1
+        ray_angle = np.arctan(a1) + np.pi
+        # Cusp より上の線分が解になることはないので探索対象から外す
+        seg_num = max(np.count_nonzero(cl_point[:-1, 1] < inner_cusp), 1)
+    point_angle = np.arctan2(
+        cl_point[:seg_num + 1, 1] - focal_point[1],
+        cl_point[:seg_num + 1, 0] - focal_point[0])
+    seg_idx = np.searchsorted(
+        sign * point_angle, sign * ray_angle, side='right') - 1
+
+    icn_valid_x = np.zeros_like(ray_angle)
+    icn_valid_y = np.zeros_like(ray_angle)
+    ok_dst_idx = np.zeros(ray_angle.shape, dtype=bool)
+    # 浮動小数点の誤差で隣の線分が解になる場合があるので前後も確認する
+    for offset in [0, -1, 1]:
+        idx = np.clip(seg_idx + offset, 0, seg_num - 1)
+        icn_x, icn_y, ok_idx = _calc_intersection_with_segment(
+            cl_point, a1, b1, a2, b2, idx)
+        if focal != "L_Focal":
+            ok_idx = ok_idx & (icn_y < inner_cusp)
+        ok_idx = ok_idx & ~ok_dst_idx
+        icn_valid_x[ok_idx] = icn_x[ok_idx]
+        icn_valid_y[ok_idx] = icn_y[ok_idx]
+        ok_dst_idx = ok_dst_idx | ok_idx
+
+    # 候補が見つからなかった直線は総当たりで確認する
+    ng_idx = ~ok_dst_idx
+    if np.any(ng_idx):
+        icn_valid_x[ng_idx], icn_valid_y[ng_idx]\
+            = solve_equation_for_intersection(
+                cl_point, a1[ng_idx], b1[ng_idx], a2, b2,
+                focal=focal, inner_cusp=inner_cusp)
+
+    return icn_valid_x, icn_valid_y
+
+
 def calc_distance_from_l_focal(chroma, lightness, l_focal):
     """
     L_Focal から 引数で指定した Chroma-Lightness までの距離を求める。
@@ -842,21 +1342,20 @@ def make_chroma_map_lut_specific_hue(
     """
     print(f"hue={np.rad2deg(hue):.2f}")
     # maping 先となる BT.709 の Gamut Boundary データを作成
-    cl_inner = get_chroma_lightness_val_specfic_hue(
-        hue, get_gamut_boundary_lut_name(inner_color_space_name))
+    lh_inner_lut = _load_lut_cached(
+        get_gamut_boundary_lut_name(inner_color_space_name))
+    cl_inner = get_chroma_lightness_val_specfic_hue(hue, lh_lut=lh_inner_lut)
 
     # 境界値の計算に使用する Cusp を作成
-    lh_inner_lut = np.load(
-        get_gamut_boundary_lut_name(inner_color_space_name))
     inner_cusp = calc_cusp_in_lc_plane(hue, lh_inner_lut)
 
     # l_cusp, l_focal, c_focal 準備
-    l_focal_lut = np.load(
+    l_focal_lut = _load_lut_cached(
         get_focal_name(
             outer_color_space_name=outer_color_space_name,
             inner_color_space_name=inner_color_space_name,
             focal_type="Lfocal"))
-    c_focal_lut = np.load(
+    c_focal_lut = _load_lut_cached(
         get_focal_name(
             outer_color_space_name=outer_color_space_name,
             inner_color_space_name=inner_color_space_name,
@@ -884,13 +1383,13 @@ def make_chroma_map_lut_specific_hue(
     a2, b2 = _calc_ab_coef_from_cl_point(cl_inner)
 
     # GamutBoundaryの直線群とFlcalの直線群の交点を求める。(L_focal)
-    icn_x_l, icn_y_l = solve_equation_for_intersection(
-        cl_inner, a1_l, b1_l, a2, b2)
+    icn_x_l, icn_y_l = solve_equation_for_intersection_sorted(
+        cl_inner, a1_l, b1_l, a2, b2, focal_point=(0, l_focal))
 
     # GamutBoundaryの直線群とFlcalの直線群の交点を求める。(C_focal)
-    icn_x_c, icn_y_c = solve_equation_for_intersection(
-        cl_inner, a1_c, b1_c, a2, b2, focal="C_Focal",
-        inner_cusp=inner_cusp[0])
+    icn_x_c, icn_y_c = solve_equation_for_intersection_sorted(
+        cl_inner, a1_c, b1_c, a2, b2, focal_point=(c_focal, 0),
+        focal="C_Focal", inner_cusp=inner_cusp[0])
 
     # cl_outer = get_chroma_lightness_val_specfic_hue(
     #     hue, get_gamut_boundary_lut_name(outer_color_space_name))
@@ -918,11 +1417,18 @@ def make_chroma_map_lut_specific_hue(
 
 
 def thread_wrapper_make_chroma_map_lut(args):
+    shm_name_l = args.pop('shm_name_l')
+    shm_name_c = args.pop('shm_name_c')
     cmap_l, cmap_c = make_chroma_map_lut_specific_hue(**args)
 
-    s_idx = GAMUT_BOUNDARY_LUT_HUE_SAMPLE * args['idx']
-    shared_array[s_idx:s_idx+CHROMA_MAP_DEGREE_SAMPLE_NUM] = cmap_l
-    shared_array2[s_idx:s_idx+GAMUT_BOUNDARY_LUT_HUE_SAMPLE] = cmap_c
+    lut_shape = (GAMUT_BOUNDARY_LUT_HUE_SAMPLE, CHROMA_MAP_DEGREE_SAMPLE_NUM)
+    shm_l, cmap_l_buf = attach_shared_buffer(shm_name_l, lut_shape)
+    shm_c, cmap_c_buf = attach_shared_buffer(shm_name_c, lut_shape)
+    cmap_l_buf[args['idx']] = cmap_l
+    cmap_c_buf[args['idx']] = cmap_c
+    del cmap_l_buf, cmap_c_buf
+    release_shared_buffer(shm_l)
+    release_shared_buffer(shm_c)
 
 
 def make_chroma_map_lut(
@@ -934,6 +1440,9 @@ def make_chroma_map_lut(
     """
     hue_sample = GAMUT_BOUNDARY_LUT_HUE_SAMPLE
     hue_list = np.linspace(0, 2 * np.pi, hue_sample)
+    lut_shape = (GAMUT_BOUNDARY_LUT_HUE_SAMPLE, CHROMA_MAP_DEGREE_SAMPLE_NUM)
+    shm_l, cmap_l_buf = create_shared_buffer(lut_shape)
+    shm_c, cmap_c_buf = create_shared_buffer(lut_shape)
     args = []
     # cmap_l_buf = []
     # cmap_c_buf = []
@@ -948,17 +1457,18 @@ def make_chroma_map_lut(
             dict(
                 hue=hue, idx=idx,
                 inner_color_space_name=inner_color_space_name,
-                outer_color_space_name=outer_color_space_name)
+                outer_color_space_name=outer_color_space_name,
+                shm_name_l=shm_l.name, shm_name_c=shm_c.name)
         )
-    with Pool(cpu_count()) as pool:
+    pool = get_worker_pool()
+    try:
         pool.map(thread_wrapper_make_chroma_map_lut, args)
-
-    cmap_l_lut = np.array(
-        shared_array[:GAMUT_BOUNDARY_LUT_HUE_SAMPLE*CHROMA_MAP_DEGREE_SAMPLE_NUM]).reshape(
-        (GAMUT_BOUNDARY_LUT_HUE_SAMPLE, CHROMA_MAP_DEGREE_SAMPLE_NUM))
-    cmap_c_lut = np.array(
-        shared_array2[:GAMUT_BOUNDARY_LUT_HUE_SAMPLE*CHROMA_MAP_DEGREE_SAMPLE_NUM]).reshape(
-        (GAMUT_BOUNDARY_LUT_HUE_SAMPLE, CHROMA_MAP_DEGREE_SAMPLE_NUM))
+        cmap_l_lut = cmap_l_buf.copy()
+        cmap_c_lut = cmap_c_buf.copy()
+    finally:
+        del cmap_l_buf, cmap_c_buf
+        release_shared_buffer(shm_l, unlink=True)
+        release_shared_buffer(shm_c, unlink=True)
 
     # 整形して .npy で保存
     # cmap_l_lut = np.array(cmap_l_buf)
@@ -984,10 +1494,122 @@ def make_chroma_mapping_lut(
     pass
 
 
+def check_default_sample_num(luminance_sample_num, hue_sample_num):
+    """
+    make_focal_lut, make_chroma_map_lut は既定のサンプル数の LUT しか
+    作れないので、それ以外が指定された場合はエラーにする。
+    """
+    if (luminance_sample_num != GAMUT_BOUNDARY_LUT_LUMINANCE_SAMPLE)\
+            or (hue_sample_num != GAMUT_BOUNDARY_LUT_HUE_SAMPLE):
+        raise ValueError(
+            "only the default sample number "
+            f"(L={GAMUT_BOUNDARY_LUT_LUMINANCE_SAMPLE}, "
+            f"H={GAMUT_BOUNDARY_LUT_HUE_SAMPLE}) is supported.")
+
+
+def build_focal_lut(
+        outer_color_space_name, inner_color_space_name,
+        luminance_sample_num, hue_sample_num, focal_type=None):
+    """
+    LutRegistry 用。L_Cusp, L_Focal, C_Focal の LUT をまとめて作る。
+    """
+    check_default_sample_num(luminance_sample_num, hue_sample_num)
+    make_focal_lut(
+        outer_color_space_name=outer_color_space_name,
+        inner_color_space_name=inner_color_space_name, debug_plot=False)
+
+
+def get_focal_lut_depends(
+        outer_color_space_name, inner_color_space_name,
+        luminance_sample_num, hue_sample_num, focal_type=None):
+    return [
+        (GAMUT_BOUNDARY_LUT_KIND, dict(
+            color_space_name=color_space_name,
+            luminance_sample_num=luminance_sample_num,
+            hue_sample_num=hue_sample_num))
+        for color_space_name
+        in [inner_color_space_name, outer_color_space_name]]
+
+
+def build_chroma_map_lut(
+        outer_color_space_name, inner_color_space_name,
+        luminance_sample_num, hue_sample_num, focal_type=None):
+    """
+    LutRegistry 用。L_Focal, C_Focal 用の Chroma Map LUT をまとめて作る。
+    """
+    check_default_sample_num(luminance_sample_num, hue_sample_num)
+    make_chroma_map_lut(
+        outer_color_space_name=outer_color_space_name,
+        inner_color_space_name=inner_color_space_name)
+
+
+def get_chroma_map_lut_depends(
+        outer_color_space_name, inner_color_space_name,
+        luminance_sample_num, hue_sample_num, focal_type=None):
+    name_args = dict(
+        outer_color_space_name=outer_color_space_name,
+        inner_color_space_name=inner_color_space_name,
+        luminance_sample_num=luminance_sample_num,
+        hue_sample_num=hue_sample_num)
+    return [
+        (GAMUT_BOUNDARY_LUT_KIND, dict(
+            color_space_name=inner_color_space_name,
+            luminance_sample_num=luminance_sample_num,
+            hue_sample_num=hue_sample_num)),
+        ("LfocalLUT", name_args), ("CfocalLUT", name_args)]
+
+
+def get_bt2407_lut_registry():
+    """
+    BT.2407 用の LUT(L_Cusp, L_Focal, C_Focal, Chroma Map)を
+    登録したレジストリを返す。Gamut Boundary LUT は lut_registry 側で登録済み。
+
+    Examples
+    --------
+    >>> registry = get_bt2407_lut_registry()
+    >>> fname = registry.ensure(
+    ...     "ChromaMapLfocalLUT", outer_color_space_name=cs.BT2020,
+    ...     inner_color_space_name=cs.BT709)
+    """
+    registry = get_lut_registry()
+    if "LCuspLUT" in registry.entries:
+        return registry
+
+    focal_constants = dict(
+        lpf_nn=LPF_NN_PARAM, lpf_wn=LPF_WN_PARAM,
+        c_focal_max=C_FOCAL_MAX_VALUE,
+        dips_bt2020=[
+            DIPS_150_SAMPLE_ST_BT2020, DIPS_150_SAMPLE_ED_BT2020,
+            DIPS_300_SAMPLE_ST_BT2020, DIPS_300_SAMPLE_ED_BT2020],
+        dips_p3=[
+            DIPS_150_SAMPLE_ST_P3, DIPS_150_SAMPLE_ED_P3,
+            DIPS_300_SAMPLE_ST_P3, DIPS_300_SAMPLE_ED_P3],
+        l_focal_240_index=[L_FOCAL_240_INDEX_BT2020, L_FOCAL_240_INDEX_P3])
+    registry.register(
+        kind="LCuspLUT", name_func=get_l_cusp_name,
+        build_func=build_focal_lut, depends_func=get_focal_lut_depends,
+        constants=focal_constants)
+    for focal_type in ["Lfocal", "Cfocal"]:
+        registry.register(
+            kind=f"{focal_type}LUT",
+            name_func=partial(get_focal_name, focal_type=focal_type),
+            build_func=build_focal_lut, depends_func=get_focal_lut_depends,
+            constants=focal_constants)
+        registry.register(
+            kind=f"ChromaMap{focal_type}LUT",
+            name_func=partial(get_chroma_map_lut_name, focal_type=focal_type),
+            build_func=build_chroma_map_lut,
+            depends_func=get_chroma_map_lut_depends,
+            constants=dict(degree_sample_num=CHROMA_MAP_DEGREE_SAMPLE_NUM))
+
+    return registry
+
+
 def main_func():
     # make_gamut_boundary_lut_all()
     # make_gamut_boundary_lut_all_fast()
     # make_gamut_boundary_lut_all_fastest()
+    # make_gamut_boundary_lut_all_analytical()
     make_focal_lut(
         outer_color_space_name=cs.BT2020,
         inner_color_space_name=cs.BT709)
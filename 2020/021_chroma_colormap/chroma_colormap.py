@@ -19,6 +19,9 @@ from scipy import interpolate
 import color_space as cs
 import transfer_functions as tf
 import turbo_colormap
+from lut import interpolate_periodic_1dlut
+from cielab import solve_chroma_newton
+from lut_registry import get_lut_registry, GAMUT_BOUNDARY_LUT_KIND
 
 # information
 __author__ = 'Toru Yoshihara'
@@ -35,11 +38,7 @@ def calc_value_from_hue_1dlut(val, lut):
     Lfocal や Cfocal など Hue値が入力となっている
     1DLUTの補間計算をして出力する。
     """
-    x = np.linspace(0, 2*np.pi, len(lut))
-    f = interpolate.interp1d(x, lut)
-    y = f(val)
-
-    return y
+    return interpolate_periodic_1dlut(val, lut)
 
 
 def calc_cusp_lut(lh_lut):
@@ -66,15 +65,6 @@ def calc_cusp_lut(lh_lut):
     return np.dstack((cusp_lightness, cusp_chroma))[0]
 
 
-def get_gamut_boundary_lut_name(
-        color_space_name=cs.BT709,
-        luminance_sample_num=1024,
-        hue_sample_num=1024):
-    name = f"./luts/GamutBoundaryLUT_{color_space_name}_"\
-        + f"L_{luminance_sample_num}_H_{hue_sample_num}.npy"
-    return name
-
-
 def make_linear_input_rgb_value(grid_num=33, tfc=tf.GAMMA24):
     rgb_non_linear = LUT3D.linear_table(grid_num)
     rgb_non_linear = rgb_non_linear.reshape((grid_num ** 3, 3))
@@ -101,18 +91,31 @@ def lch_to_rgb(lch, color_space_name=cs.BT709):
 
 
 def calc_gamut_boundary_specific_lightness_hue(
-        lch, color_space_name=cs.BT709):
+        lch, color_space_name=cs.BT709, solver="newton"):
+    """
+    lch の L*, Hue における Gamut Boundary の Chroma を求める。
+
+    solver="newton" の場合は cielab.solve_chroma_newton を使う。
+    solver="bisection" の場合は従来の 30回の二分法で求める。
+    収束判定の閾値はどちらも 300 / 2**30 相当。
+    """
     chroma_init = 300
     trial_num = 30
     src_lightness = lch[..., 0]
     src_chroma = lch[..., 1]
     src_hue = lch[..., 2]
 
+    if solver == "newton":
+        return solve_chroma_newton(
+            l_vals=src_lightness, h_vals=np.deg2rad(src_hue),
+            color_space_name=color_space_name, chroma_max=chroma_init * 2,
+            tolerance=chroma_init / (2 ** trial_num))
+
     dst_chroma = chroma_init * np.ones_like(src_chroma)
 
     for t_idx in range(trial_num):
         dst_lch = np.dstack((src_lightness, dst_chroma, src_hue))
-        dst_rgb = lch_to_rgb(dst_lch)
+        dst_rgb = lch_to_rgb(dst_lch, color_space_name=color_space_name)
 
         # dst_rgb is inside of the gamut boundary?
         r_judge = (dst_rgb[..., 0] >= 0) & (dst_rgb[..., 0] <= 1)
@@ -225,8 +228,8 @@ def make_chroma_colormap_3dlut_rev01(
 
 
 def calc_cusp_chroma(lch, color_space_name=cs.BT709):
-    boundary_lut = np.load(
-        get_gamut_boundary_lut_name(color_space_name=cs.BT709))
+    boundary_lut = get_lut_registry().load(
+        GAMUT_BOUNDARY_LUT_KIND, color_space_name=cs.BT709)
     cusp_lc_lut = calc_cusp_lut(boundary_lut)
     cusp_chroma_lut = cusp_lc_lut[..., 1]
     hue = np.deg2rad(lch[..., 2])
@@ -303,8 +306,8 @@ def main_func():
 
 if __name__ == '__main__':
     os.chdir(os.path.dirname(os.path.abspath(__file__)))
-    # gb_lut = np.load(
-    #     get_gamut_boundary_lut_name(color_space_name=cs.BT709))
+    # gb_lut = get_lut_registry().load(
+    #     GAMUT_BOUNDARY_LUT_KIND, color_space_name=cs.BT709)
     # hue_list = np.linspace(0, 2*np.pi, 8, endpoint=False)
     # for hue in hue_list:
     #     cusp = calc_cusp_in_lc_plane(hue, gb_lut)
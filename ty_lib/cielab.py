@@ -14,9 +14,7 @@ import os
 import numpy as np
 from sympy import sin, cos
 from sympy.solvers import solve
-from scipy import linalg
-from colour import xy_to_XYZ, Lab_to_XYZ, XYZ_to_RGB
-from colour import RGB_COLOURSPACES
+from colour import xy_to_XYZ, Lab_to_XYZ, XYZ_to_RGB, RGB_to_XYZ, XYZ_to_Lab
 from colour.models import BT709_COLOURSPACE
 
 # import my libraries
@@ -51,6 +49,10 @@ __all__ = []
 
 im_threshold = 0.00000000001
 
+# load_gamut_boundary_lut() のキャッシュ。
+# {(filename, dtype): (mtime, GamutBoundaryLUT)}
+_gamut_boundary_lut_cache = {}
+
 
 def get_ty(l):
     """
@@ -113,10 +115,8 @@ def get_large_z(l, c, h, kk):
 
 
 def get_xyz_to_rgb_matrix(primaries=cs.get_primaries(cs.BT2020)):
-    rgb_to_xyz_matrix = cs.calc_rgb_to_xyz_matrix(
+    return cs.calc_xyz_to_rgb_matrix(
         gamut_xy=primaries, white_large_xyz=D65_WHITE)
-    xyz_to_rgb_matrix = linalg.inv(rgb_to_xyz_matrix)
-    return xyz_to_rgb_matrix
 
 
 def lab_to_rgb_expr(l, c, h, primaries=cs.get_primaries(cs.BT2020)):
@@ -182,7 +182,7 @@ def solve_chroma(
 def is_inner_gamut(lab, color_space_name=cs.BT709):
     rgb = XYZ_to_RGB(
         Lab_to_XYZ(lab), cs.D65, cs.D65,
-        RGB_COLOURSPACES[color_space_name].XYZ_to_RGB_matrix)
+        cs.get_colour_xyz_to_rgb_matrix(color_space_name))
     r_judge = (rgb[..., 0] >= 0) & (rgb[..., 0] <= 1)
     g_judge = (rgb[..., 1] >= 0) & (rgb[..., 1] <= 1)
     b_judge = (rgb[..., 2] >= 0) & (rgb[..., 2] <= 1)
@@ -229,10 +229,14 @@ def solve_chroma_fast(
 
 
 def solve_chroma_fastest(
-        l_val, l_idx, h_vals, l_sample_num, color_space_name, **kwarg):
+        l_val, l_idx, h_vals, l_sample_num, color_space_name,
+        solver="newton", **kwarg):
     """
     引数で与えられた L*, H に対する Chroma値を算出する。
     ```make_chroma_array``` のループからコールされることが前提のコード。
+
+    solver="newton" の場合は `solve_chroma_newton` を使う。
+    solver="bisection" の場合は従来の 50回の二分法で求める。
     """
     if l_sample_num == 0:  # 特定の ab平面計算用の引数
         pass
@@ -241,6 +245,13 @@ def solve_chroma_fastest(
     elif l_idx == 0:   # L=0 の Chroma は 0 なので計算しない
         return np.zeros_like(h_vals)
 
+    if solver == "newton":
+        chroma = solve_chroma_newton(
+            l_vals=l_val, h_vals=h_vals, color_space_name=color_space_name,
+            chroma_max=600, tolerance=300 / (2 ** 50))
+        print(f"color_space={color_space_name}, L*={l_val:.2f}")
+        return chroma
+
     r_val_init = 300
     trial_num = 50
 
@@ -258,14 +269,475 @@ def solve_chroma_fastest(
         r_val[~ok_idx] = r_val[~ok_idx] - add_sub
 
     chroma = r_val
-    print(f"color_space={color_space_name}, L*={l_val}:.2f")
+    print(f"color_space={color_space_name}, L*={l_val:.2f}")
     return chroma
 
 
+def _calc_gamut_distance_on_chroma_ray(
+        chroma, ty, coef_x, coef_z, rgb_offset, mtx):
+    """
+    L*, Hue を固定して Chroma を変化させた際の、RGB の [0, 1] からの
+    はみ出し量とその Chroma での微分値を計算する。
+
+    はみ出し量は max(R - 1, G - 1, B - 1, -R, -G, -B) であり、
+    0 以下なら Gamut 内である(`is_inner_gamut` と同じ判定)。
+    RGB は XYZ の線形結合なので、X, Z の f(t) の逆関数を
+    Chroma の関数として直接計算する。
+    rgb_offset は Y の寄与分で shape は (3, N)。
+
+    Returns
+    -------
+    distance : array_like
+        はみ出し量。
+    derivative : array_like
+        はみ出し量が最大のチャンネルの Chroma での微分値。
+    """
+    tx = ty + chroma * coef_x
+    tz = ty + chroma * coef_z
+    low_x = tx <= SIGMA
+    low_z = tz <= SIGMA
+    # ** 3 は pow の呼び出しになり遅いので乗算で計算する
+    tx2 = tx * tx
+    tz2 = tz * tz
+    fx = np.where(low_x, 3 * (SIGMA ** 2) * (tx - 4 / 29), tx2 * tx)
+    fz = np.where(low_z, 3 * (SIGMA ** 2) * (tz - 4 / 29), tz2 * tz)
+    dfx = np.where(low_x, 3 * (SIGMA ** 2), 3 * tx2) * coef_x
+    dfz = np.where(low_z, 3 * (SIGMA ** 2), 3 * tz2) * coef_z
+
+    # (N, 6) の配列は作らずにチャンネル毎に最大値を更新する
+    rgb = [rgb_offset[ch_idx] + mtx[ch_idx, 0] * fx + mtx[ch_idx, 2] * fz
+           for ch_idx in range(3)]
+    drgb = [mtx[ch_idx, 0] * dfx + mtx[ch_idx, 2] * dfz
+            for ch_idx in range(3)]
+    distance = rgb[0] - 1
+    derivative = drgb[0]
+    for violation, dviolation in zip(
+            [rgb[1] - 1, rgb[2] - 1, -rgb[0], -rgb[1], -rgb[2]],
+            [drgb[1], drgb[2], -drgb[0], -drgb[1], -drgb[2]]):
+        update_idx = violation > distance
+        distance = np.where(update_idx, violation, distance)
+        derivative = np.where(update_idx, dviolation, derivative)
+
+    return distance, derivative
+
+
+def solve_chroma_newton(
+        l_vals, h_vals, color_space_name=cs.BT709, chroma_max=600,
+        tolerance=300 / (2 ** 50), iteration_max=64, bisection_num=8):
+    """
+    引数で与えられた L*, H に対する Gamut Boundary の Chroma値を
+    配列全体に対してまとめて算出する。
+
+    `solve_chroma_fastest` の二分法と同じく RGB が [0, 1] に収まる
+    Chroma の上限を求めるが、Lab to RGB は colour を使わずに直接計算し、
+    [0, chroma_max] の区間を保持しながら Newton法で解く。
+    Newton法の次の値が区間外になる場合や、R, G, B の切り替わりで
+    Newton法が振動して更新量が半分以下にならない場合は、
+    区間の両端の値を使った Regula Falsi(Illinois法)で更新する。
+    最初の二分法の後、大半のサンプルは 3～5回の反復で tolerance 以下に収束する。
+
+    なお、高明度の黄～緑付近では Chroma 方向に Gamut の内外が
+    複数回切り替わる場合がある。どの境界に収束するかは途中の値に依存するため、
+    最初の bisection_num 回は従来の二分法と同じ値で区間を狭めて、
+    二分法と同じ境界を選ぶようにしている
+    (`solve_chroma_analytical` は最小の境界を返す)。
+
+    Parameters
+    ----------
+    l_vals : array_like
+        L* の値。
+    h_vals : array_like
+        Hue の値。単位は radian。l_vals と broadcast できること。
+    color_space_name : str
+        色域の名称。
+    chroma_max : float
+        探索する Chroma の上限。
+    tolerance : float
+        収束判定の閾値。Chroma の更新量がこれ以下になったら終了。
+    iteration_max : int
+        反復回数の上限。
+    bisection_num : int
+        最初に二分法で更新する回数。
+
+    Returns
+    -------
+    array_like
+        Chroma値。
+
+    Examples
+    --------
+    >>> l_vals = np.linspace(0, 100, 1024)[:, np.newaxis]
+    >>> h_vals = np.linspace(0, 2 * np.pi, 1024)[np.newaxis, :]
+    >>> chroma = solve_chroma_newton(l_vals, h_vals, cs.BT709)
+    """
+    l_vals, h_vals = np.broadcast_arrays(
+        np.asarray(l_vals, dtype=np.float64),
+        np.asarray(h_vals, dtype=np.float64))
+    shape = l_vals.shape
+    l_vals = l_vals.flatten()
+    h_vals = h_vals.flatten()
+
+    # 白色点での正規化は Matrix に含める
+    mtx = cs.get_normalized_xyz_to_rgb_matrix(color_space_name)
+    ty = (l_vals + 16) / 116
+    coef_x = np.cos(h_vals) / 500
+    coef_z = -np.sin(h_vals) / 200
+    rgb_offset = mtx[:, 1:2] * _lab_f_inv_inplace(ty.copy())[np.newaxis, :]
+
+    def calc_distance(c_val, idx):
+        return _calc_gamut_distance_on_chroma_ray(
+            c_val, ty[idx], coef_x[idx], coef_z[idx], rgb_offset[:, idx],
+            mtx)
+
+    idx = np.arange(l_vals.size)
+    lo = np.zeros_like(l_vals)
+    hi = chroma_max * np.ones_like(l_vals)
+    d_lo, _ = calc_distance(lo, idx)
+    d_hi, _ = calc_distance(hi, idx)
+    chroma = 0.5 * hi
+    step = 0.5 * hi
+    step_prev = np.copy(hi)
+    # 直前に更新した区間の端。1: lo, -1: hi
+    last_side = np.zeros(l_vals.shape, dtype=np.int8)
+
+    # chroma_max でも Gamut 内の場合は chroma_max とする
+    chroma[d_hi <= 0] = chroma_max
+    idx = idx[d_hi > 0]
+
+    for t_idx in range(iteration_max):
+        if idx.size == 0:
+            break
+        c_val = chroma[idx]
+        distance, derivative = calc_distance(c_val, idx)
+
+        # 区間の更新
+        inner_idx = distance <= 0
+        lo_val = np.where(inner_idx, c_val, lo[idx])
+        hi_val = np.where(inner_idx, hi[idx], c_val)
+        lo[idx] = lo_val
+        hi[idx] = hi_val
+
+        # 同じ側の端が続けて更新された場合は反対側の値を半分にする(Illinois法)
+        side = np.where(inner_idx, 1, -1).astype(np.int8)
+        scale = np.where(side == last_side[idx], 0.5, 1.0)
+        d_lo_val = np.where(inner_idx, distance, d_lo[idx] * scale)
+        d_hi_val = np.where(inner_idx, d_hi[idx] * scale, distance)
+        d_lo[idx] = d_lo_val
+        d_hi[idx] = d_hi_val
+
+        if t_idx < bisection_num - 1:
+            # 二分法
+            c_next = 0.5 * (lo_val + hi_val)
+        else:
+            # Newton法。区間外に出る場合、収束が遅い場合は Regula Falsi
+            last_side[idx] = side
+            with np.errstate(divide='ignore', invalid='ignore'):
+                c_newton = c_val - distance / derivative
+                c_falsi = lo_val - d_lo_val * (hi_val - lo_val)\
+                    / (d_hi_val - d_lo_val)
+            newton_ok = (c_newton >= lo_val) & (c_newton <= hi_val)\
+                & (np.abs(2 * distance)
+                   <= np.abs(step_prev[idx] * derivative))
+            falsi_ok = (c_falsi >= lo_val) & (c_falsi <= hi_val)
+            c_next = np.where(
+                newton_ok, c_newton,
+                np.where(falsi_ok, c_falsi, 0.5 * (lo_val + hi_val)))
+        chroma[idx] = c_next
+        step_prev[idx] = step[idx]
+        step[idx] = c_next - c_val
+
+        converged = (np.abs(c_next - c_val) <= tolerance)\
+            | ((hi_val - lo_val) <= tolerance)
+        idx = idx[~converged]
+
+    return chroma.reshape(shape)
+
+
 def solve_chroma_wrapper(args):
     solve_chroma(*args)
 
 
+def _calc_t_poly_coef(ty, coef, ijk_val):
+    """
+    X, Z の計算に使う f(t) を Chroma の多項式として表現した際の係数を返す。
+    t = ty + coef * c であり、f(t) は t > sigma なら t ** 3、
+    t <= sigma なら 3 * sigma**2 * (t - 4/29) である。
+
+    Returns
+    -------
+    list
+        [c**3 の係数, c**2 の係数, c**1 の係数, c**0 の係数]
+    """
+    if ijk_val:
+        return [coef ** 3, 3 * ty * (coef ** 2), 3 * (ty ** 2) * coef,
+                ty ** 3 * np.ones_like(coef)]
+    else:
+        zeros = np.zeros_like(coef)
+        return [zeros, zeros, 3 * (SIGMA ** 2) * coef,
+                3 * (SIGMA ** 2) * (ty - 4 / 29) * np.ones_like(coef)]
+
+
+def _solve_quadratic_real_roots(a, b, c):
+    """
+    a * x**2 + b * x + c = 0 の実数解を求める。
+    解が存在しない箇所は np.nan とする。
+
+    Returns
+    -------
+    array_like
+        shape は (N, 2)。
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        disc = b ** 2 - 4 * a * c
+        sqrt_disc = np.sqrt(np.where(disc >= 0, disc, np.nan))
+        qq = -0.5 * (b + np.where(b >= 0, 1.0, -1.0) * sqrt_disc)
+        x0 = np.where(a != 0, qq / a, np.nan)
+        x1 = np.where(qq != 0, c / qq, np.nan)
+        # 1次式になっている場合
+        linear_idx = (a == 0)
+        x0 = np.where(linear_idx, -c / b, x0)
+        x1 = np.where(linear_idx, np.nan, x1)
+
+    return np.stack((x0, x1), axis=-1)
+
+
+def solve_cubic_real_roots(a, b, c, d, polish_num=2):
+    """
+    a * x**3 + b * x**2 + c * x + d = 0 の実数解を
+    配列全体に対してまとめて解析的に求める。
+    解が存在しない箇所は np.nan とする。
+
+    a が他の係数に比べて十分小さい場合は2次方程式として解き、
+    最後に元の3次式に対して Newton法で解を補正する。
+
+    Parameters
+    ----------
+    a, b, c, d : array_like
+        各係数。shape は (N,) であること。
+    polish_num : int
+        Newton法による補正の回数。
+
+    Returns
+    -------
+    array_like
+        shape は (N, 3)。
+
+    Examples
+    --------
+    >>> solve_cubic_real_roots(
+    ...     np.array([1.0]), np.array([-6.0]), np.array([11.0]),
+    ...     np.array([-6.0]))
+    array([[ 3.,  2.,  1.]])
+    """
+    a, b, c, d = [np.asarray(x, dtype=np.float64) for x in [a, b, c, d]]
+    scale = np.maximum(
+        np.maximum(np.abs(a), np.abs(b)), np.maximum(np.abs(c), np.abs(d)))
+    scale[scale == 0] = 1.0
+    a, b, c, d = a / scale, b / scale, c / scale, d / scale
+    cubic_idx = np.abs(a) > 1e-8
+    roots = np.nan * np.ones(a.shape + (3,))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # 3次方程式。x = y - bb/3 で y**3 + pp * y + qq = 0 に変形
+        a_safe = np.where(cubic_idx, a, 1.0)
+        bb = b / a_safe
+        cc = c / a_safe
+        dd = d / a_safe
+        bb2 = bb * bb
+        pp = cc - bb2 / 3
+        qq = bb * (2 * bb2 - 9 * cc) / 27 + dd
+        disc = qq * qq / 4 + pp * pp * pp / 27
+        offset = -bb / 3
+        one_idx = cubic_idx & (disc > 0)
+        three_idx = cubic_idx & (disc <= 0)
+
+        # 実数解が1つの場合(Cardano)
+        sqrt_disc = np.sqrt(disc[one_idx])
+        half_q = -qq[one_idx] / 2
+        roots[one_idx, 0] = np.cbrt(half_q + sqrt_disc)\
+            + np.cbrt(half_q - sqrt_disc) + offset[one_idx]
+
+        # 実数解が3つの場合(三角関数解)。pp == 0 は3重解
+        pp_three = pp[three_idx]
+        pp_neg = np.where(pp_three < 0, pp_three, -1.0)
+        rr = np.where(pp_three < 0, 2 * np.sqrt(-pp_neg / 3), 0.0)
+        cos_val = np.clip(
+            3 * qq[three_idx] / (2 * pp_neg) * np.sqrt(-3 / pp_neg),
+            -1.0, 1.0)
+        phi = np.arccos(cos_val) / 3
+        for k in range(3):
+            roots[three_idx, k]\
+                = rr * np.cos(phi - 2 * np.pi * k / 3) + offset[three_idx]
+
+    # a が小さい箇所は2次方程式として扱う
+    quad_idx = ~cubic_idx
+    roots[quad_idx, :2] = _solve_quadratic_real_roots(
+        b[quad_idx], c[quad_idx], d[quad_idx])
+
+    # Newton法で補正
+    a, b, c, d = [x[..., np.newaxis] for x in [a, b, c, d]]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for idx in range(polish_num):
+            f_val = ((a * roots + b) * roots + c) * roots + d
+            df_val = (3 * a * roots + 2 * b) * roots + c
+            delta = f_val / df_val
+            roots -= np.where(np.isfinite(delta), delta, 0.0)
+
+    return roots
+
+
+def solve_chroma_analytical(
+        l_vals, h_vals, color_space_name=cs.BT709, chroma_scale=100):
+    """
+    引数で与えられた L*, H に対する Gamut Boundary の Chroma値を
+    配列全体に対してまとめて算出する。
+
+    `solve_chroma` と同様に IJK_LIST の各分岐で R, G, B = 0, 1 となる
+    Chroma を求めるが、sympy.solve ではなく3次方程式の解の公式を使う。
+
+    Parameters
+    ----------
+    l_vals : array_like
+        L* の値。
+    h_vals : array_like
+        Hue の値。単位は radian。l_vals と broadcast できること。
+    color_space_name : str
+        色域の名称。
+    chroma_scale : float
+        数値誤差を抑えるため、c = chroma_scale * u と変数変換して解く。
+
+    Returns
+    -------
+    array_like
+        Chroma値。
+
+    Examples
+    --------
+    >>> l_vals = np.linspace(0, 100, 1024)[:, np.newaxis]
+    >>> h_vals = np.linspace(0, 2 * np.pi, 1024)[np.newaxis, :]
+    >>> chroma = solve_chroma_analytical(l_vals, h_vals, cs.BT709)
+    >>> chroma.shape
+    (1024, 1024)
+    """
+    l_vals, h_vals = np.broadcast_arrays(
+        np.asarray(l_vals, dtype=np.float64),
+        np.asarray(h_vals, dtype=np.float64))
+    shape = l_vals.shape
+    l_vals = l_vals.flatten()
+    h_vals = h_vals.flatten()
+
+    mtx = get_xyz_to_rgb_matrix(
+        primaries=cs.get_primaries(color_space_name))
+    white = [D65_X / 100, D65_Y / 100, D65_Z / 100]
+    ty_all = (l_vals + 16) / 116
+    coef_x_all = np.cos(h_vals) / 500 * chroma_scale
+    coef_z_all = -np.sin(h_vals) / 200 * chroma_scale
+    chroma = np.inf * np.ones_like(l_vals)
+
+    for ijk in IJK_LIST:
+        # c >= 0 の範囲で分岐条件を満たし得るサンプルだけを計算する
+        branch_idx = np.ones_like(l_vals, dtype=bool)
+        for coef, ijk_val in zip([coef_x_all, coef_z_all], [ijk[0], ijk[2]]):
+            branch_idx &= ((ty_all > SIGMA) | (coef > 0)) if ijk_val\
+                else ((ty_all <= SIGMA) | (coef < 0))
+        branch_idx &= (ty_all > SIGMA) if ijk[1] else (ty_all <= SIGMA)
+        if not np.any(branch_idx):
+            continue
+        ty = ty_all[branch_idx]
+        coef_x = coef_x_all[branch_idx]
+        coef_z = coef_z_all[branch_idx]
+        chroma_branch = chroma[branch_idx]
+
+        poly_x = np.array(_calc_t_poly_coef(ty, coef_x, ijk[0])) * white[0]
+        poly_y = np.array(_calc_t_poly_coef(ty, np.zeros_like(ty), ijk[1]))\
+            * white[1]
+        poly_z = np.array(_calc_t_poly_coef(ty, coef_z, ijk[2])) * white[2]
+        for rgb_idx in range(3):  # R, G, B のループ
+            poly = mtx[rgb_idx][0] * poly_x + mtx[rgb_idx][1] * poly_y\
+                + mtx[rgb_idx][2] * poly_z
+            for target in [0, 1]:
+                roots = solve_cubic_real_roots(
+                    poly[0], poly[1], poly[2], poly[3] - target)
+
+                # 解が IJK_LIST の分岐条件を満たしているか確認
+                with np.errstate(invalid='ignore'):
+                    tx = ty[:, np.newaxis] + roots * coef_x[:, np.newaxis]
+                    tz = ty[:, np.newaxis] + roots * coef_z[:, np.newaxis]
+                    ok_idx = (roots >= 0.0)
+                    ok_idx &= (tx > SIGMA) if ijk[0] else (tx <= SIGMA)
+                    ok_idx &= (tz > SIGMA) if ijk[2] else (tz <= SIGMA)
+                roots = np.where(ok_idx, roots * chroma_scale, np.inf)
+                chroma_branch = np.minimum(
+                    chroma_branch, np.min(roots, axis=-1))
+        chroma[branch_idx] = chroma_branch
+
+    # L=0, L=100 の Chroma は 0
+    chroma[(l_vals <= 0) | (l_vals >= 100)] = 0.0
+
+    return chroma.reshape(shape)
+
+
+def _test_solve_chroma_analytical(
+        l_sample_num=5, h_sample_num=8, color_space_name=cs.BT709):
+    """
+    solve_chroma_analytical の結果を sympy 版の solve_chroma と比較する。
+    sympy 版は遅いので疎なグリッドで確認する。
+    """
+    from sympy import symbols
+    l, c, h = symbols('l, c, h')
+    rgb_exprs = lab_to_rgb_expr(
+        l, c, h, primaries=cs.get_primaries(color_space_name))
+    l_vals = np.linspace(0, 100, l_sample_num)
+    h_vals = np.linspace(0, 2 * np.pi, h_sample_num)
+
+    ref = np.zeros((l_sample_num, h_sample_num))
+    for l_idx, l_val in enumerate(l_vals):
+        for h_idx, h_val in enumerate(h_vals):
+            ref[l_idx, h_idx] = solve_chroma(
+                l_val=l_val, l_idx=l_idx, h_val=h_val, h_idx=h_idx,
+                rgb_exprs=rgb_exprs, l=l, c=c, h=h,
+                l_sample_num=l_sample_num)
+
+    chroma = solve_chroma_analytical(
+        l_vals[:, np.newaxis], h_vals[np.newaxis, :], color_space_name)
+    diff = np.max(np.abs(chroma - ref))
+    print(f"max diff = {diff}")
+    assert diff < 1e-6
+
+
+def _benchmark_solve_chroma_newton(
+        l_sample_num=64, h_sample_num=1024, color_space_name=cs.BT709):
+    """
+    solve_chroma_newton() と solve_chroma_fastest() の二分法の
+    処理時間と差分を比較する。solve_chroma_analytical() との差分も表示する。
+    """
+    import time
+
+    l_vals = np.linspace(0, 100, l_sample_num)[1:-1]
+    h_vals = np.linspace(0, 2 * np.pi, h_sample_num)
+
+    start = time.time()
+    ref = np.array([
+        solve_chroma_fastest(
+            l_val=l_val, l_idx=l_idx + 1, h_vals=h_vals,
+            l_sample_num=l_sample_num, color_space_name=color_space_name,
+            solver="bisection")
+        for l_idx, l_val in enumerate(l_vals)])
+    time_ref = time.time() - start
+
+    start = time.time()
+    chroma = solve_chroma_newton(
+        l_vals[:, np.newaxis], h_vals[np.newaxis, :], color_space_name)
+    time_new = time.time() - start
+
+    analytical = solve_chroma_analytical(
+        l_vals[:, np.newaxis], h_vals[np.newaxis, :], color_space_name)
+    print("bisection={:.3f}[s], newton={:.3f}[s], max diff={:.3e}, "
+          "max diff from analytical={:.3e}".format(
+              time_ref, time_new, np.max(np.abs(chroma - ref)),
+              np.max(np.abs(chroma - analytical))))
+
+
 def _calc_bilinear_sample_data(lh, l_sample_num, h_sample_num):
     """
     CIELAB空間の特定の色域の Gamut Boundary に対して
@@ -373,6 +845,254 @@ def bilinear_interpolation(lh, lut2d):
     return result[0]
 
 
+class GamutBoundaryLUT():
+    def __init__(self, lut2d, dtype=np.float64):
+        """
+        Gamut Boundary の 2DLUT(lut2d[L_idx, H_idx] = Chroma)から
+        任意の L*, Hue の Chroma を Bilinear で補間計算する。
+
+        `bilinear_interpolation` と同じ結果を返すが、
+        index は1次元化したものを1回だけ計算し、np.take で4点を取得する。
+        中間データの np.dstack もしない。
+        また、Hue方向に隣接する2点をペアにしたテーブルを事前に作っておき、
+        1回の np.take で2点を取得する(ランダムアクセスの回数が半分になる)。
+        Hue は 0～2π の範囲外の場合は折り返す。
+
+        Parameters
+        ----------
+        lut2d : array_like
+            2d lut data. 格子点は L* が np.linspace(0, 100, shape[0])、
+            Hue が np.linspace(0, 2*np.pi, shape[1])。
+        dtype : type
+            LUT と補間計算の型。np.float32 にすると LUT のサイズと
+            `chroma()` の中間データが半分になる。
+
+        Examples
+        --------
+        >>> gb_lut = GamutBoundaryLUT(np.load(get_gamut_boundary_lut_name()))
+        >>> chroma = gb_lut.chroma(l=lightness, h=hue)
+        """
+        self.lut = np.ascontiguousarray(lut2d, dtype=dtype)
+        self.l_sample_num = self.lut.shape[0]
+        self.h_sample_num = self.lut.shape[1]
+        lut_pair = np.empty(
+            (self.l_sample_num, self.h_sample_num, 2), dtype=self.lut.dtype)
+        lut_pair[..., 0] = self.lut
+        lut_pair[:, :-1, 1] = self.lut[:, 1:]
+        lut_pair[:, -1, 1] = self.lut[:, -1]
+        self.lut_pair = lut_pair.reshape((-1, 2))
+
+    def chroma(self, l, h):
+        """
+        Parameters
+        ----------
+        l : array_like
+            L* data.
+        h : array_like
+            Hue data. the unit is radian.
+
+        Returns
+        -------
+        array_like
+            Chroma. shape は np.broadcast(l, h) と同じ。
+        """
+        l, h = np.broadcast_arrays(
+            np.asarray(l, dtype=self.lut.dtype),
+            np.asarray(h, dtype=self.lut.dtype))
+        shape = l.shape
+        l = l.reshape(-1)
+        h = h.reshape(-1)
+        out_of_range = (h < 0.0) | (h > 2 * np.pi)
+        if np.any(out_of_range):
+            h = np.where(out_of_range, np.mod(h, 2 * np.pi), h)
+
+        l_pos = l * ((self.l_sample_num - 1) / 100)
+        np.maximum(l_pos, 0.0, out=l_pos)
+        np.minimum(l_pos, self.l_sample_num - 1, out=l_pos)
+        h_pos = h * ((self.h_sample_num - 1) / (2 * np.pi))
+        l_idx = l_pos.astype(np.intp)
+        np.minimum(l_idx, self.l_sample_num - 2, out=l_idx)
+        h_idx = h_pos.astype(np.intp)
+        np.minimum(h_idx, self.h_sample_num - 2, out=h_idx)
+        l_pos -= l_idx
+        h_pos -= h_idx
+
+        # 左下の格子点の index。L* 方向は stride を足して求める
+        idx = l_idx
+        idx *= self.h_sample_num
+        idx += h_idx
+        pair_lo = np.take(self.lut_pair, idx, axis=0)
+        idx += self.h_sample_num
+        pair_hi = np.take(self.lut_pair, idx, axis=0)
+
+        # interpolation in Hue direction
+        c_00 = pair_lo[..., 0]
+        c_10 = pair_hi[..., 0]
+        c_01 = pair_lo[..., 1] - c_00
+        c_01 *= h_pos
+        c_00 += c_01
+        c_11 = pair_hi[..., 1] - c_10
+        c_11 *= h_pos
+        c_10 += c_11
+
+        # interpolation in Luminance direction
+        c_10 -= c_00
+        c_10 *= l_pos
+        c_00 += c_10
+
+        return c_00.reshape(shape)
+
+
+def load_gamut_boundary_lut(filename, dtype=np.float64):
+    """
+    Gamut Boundary の LUT ファイルを GamutBoundaryLUT として読み込む。
+    同じファイル、同じ dtype は2回目以降はキャッシュを返す。
+    ファイルが更新された場合は読み直す。
+    """
+    mtime = os.path.getmtime(filename)
+    key = (filename, np.dtype(dtype).str)
+    if key not in _gamut_boundary_lut_cache\
+            or _gamut_boundary_lut_cache[key][0] != mtime:
+        _gamut_boundary_lut_cache[key]\
+            = (mtime, GamutBoundaryLUT(np.load(filename), dtype=dtype))
+    return _gamut_boundary_lut_cache[key][1]
+
+
+def _lab_f_inplace(t):
+    """
+    CIELAB の f(t) を計算する。t は上書きされる。
+    """
+    low_idx = t <= (24 / 116) ** 3
+    t_low = t[low_idx] * (841 / 108) + 16 / 116
+    np.cbrt(t, out=t)
+    t[low_idx] = t_low
+
+    return t
+
+
+def _lab_f_inv_inplace(f):
+    """
+    CIELAB の f(t) の逆関数を計算する。f は上書きされる。
+    """
+    low_idx = f <= 24 / 116
+    f_low = (f[low_idx] - 16 / 116) * (108 / 841)
+    f **= 3
+    f[low_idx] = f_low
+
+    return f
+
+
+def rgb_linear_to_lab(
+        rgb_linear, color_space_name=cs.BT2020, dtype=np.float64):
+    """
+    Linear RGB を CIELAB (D65) に変換する。
+
+    dtype が np.float64 の場合は Colour Science for Python の
+    RGB_to_XYZ(), XYZ_to_Lab() をそのまま使う。
+    np.float32 の場合は白色点での正規化を RGB to XYZ の Matrix に含めて、
+    中間データも含めて全て float32 で計算する。
+
+    Parameters
+    ----------
+    rgb_linear : array_like
+        RGB のデータ。**Linear** であること。shape is (..., 3).
+    color_space_name : str
+        RGB の色域の Colour Science for Python の名称。
+    dtype : type
+        計算と出力の型。
+
+    Returns
+    -------
+    array_like
+        Lab のデータ。shape is (..., 3).
+    """
+    if np.dtype(dtype) == np.float64:
+        large_xyz = RGB_to_XYZ(
+            rgb_linear, cs.D65, cs.D65,
+            cs.get_colour_rgb_to_xyz_matrix(color_space_name))
+        return XYZ_to_Lab(large_xyz)
+
+    mtx = cs.get_rgb_to_normalized_xyz_matrix(color_space_name)
+    rgb = np.asarray(rgb_linear, dtype=dtype)
+    f_xyz = _lab_f_inplace(np.matmul(rgb, mtx.T.astype(dtype)))
+    lab = np.empty_like(f_xyz)
+    np.subtract(f_xyz[..., 0], f_xyz[..., 1], out=lab[..., 1])
+    lab[..., 1] *= 500
+    np.subtract(f_xyz[..., 1], f_xyz[..., 2], out=lab[..., 2])
+    lab[..., 2] *= 200
+    np.multiply(f_xyz[..., 1], 116, out=lab[..., 0])
+    lab[..., 0] -= 16
+
+    return lab
+
+
+def lab_to_rgb_linear(lab, color_space_name=cs.BT709, dtype=np.float64):
+    """
+    CIELAB (D65) を Linear RGB に変換する。
+    `rgb_linear_to_lab()` の逆変換。
+
+    Parameters
+    ----------
+    lab : array_like
+        Lab のデータ。shape is (..., 3).
+    color_space_name : str
+        RGB の色域の Colour Science for Python の名称。
+    dtype : type
+        計算と出力の型。
+
+    Returns
+    -------
+    array_like
+        RGB のデータ(**Linear**)。shape is (..., 3).
+    """
+    if np.dtype(dtype) == np.float64:
+        large_xyz = Lab_to_XYZ(lab)
+        return XYZ_to_RGB(
+            large_xyz, cs.D65, cs.D65,
+            cs.get_colour_xyz_to_rgb_matrix(color_space_name))
+
+    mtx = cs.get_normalized_xyz_to_rgb_matrix(color_space_name)
+    lab = np.asarray(lab, dtype=dtype)
+    f_xyz = np.empty_like(lab)
+    np.add(lab[..., 0], 16, out=f_xyz[..., 1])
+    f_xyz[..., 1] /= 116
+    np.divide(lab[..., 1], 500, out=f_xyz[..., 0])
+    f_xyz[..., 0] += f_xyz[..., 1]
+    np.divide(lab[..., 2], -200, out=f_xyz[..., 2])
+    f_xyz[..., 2] += f_xyz[..., 1]
+
+    return np.matmul(_lab_f_inv_inplace(f_xyz), mtx.T.astype(dtype))
+
+
+def _benchmark_gamut_boundary_lut(
+        sample_num=2 ** 20, l_sample_num=1024, h_sample_num=1024):
+    """
+    GamutBoundaryLUT.chroma() と bilinear_interpolation() の
+    処理時間と差分を比較する。
+    """
+    import time
+
+    ll = np.linspace(0, 1, l_sample_num)[:, np.newaxis]
+    hh = np.linspace(0, 2 * np.pi, h_sample_num)[np.newaxis, :]
+    lut2d = 100 * np.sin(np.pi * ll) * (1.2 + np.cos(hh))
+    rng = np.random.default_rng(0)
+    lightness = rng.random(sample_num) * 100
+    hue = rng.random(sample_num) * 2 * np.pi
+
+    start = time.time()
+    ref = bilinear_interpolation(np.dstack((lightness, hue)), lut2d)
+    time_ref = time.time() - start
+
+    gb_lut = GamutBoundaryLUT(lut2d)
+    start = time.time()
+    chroma = gb_lut.chroma(lightness, hue)
+    time_new = time.time() - start
+
+    print("bilinear_interpolation={:.3f}[s], GamutBoundaryLUT={:.3f}[s], "
+          "max diff={:.3e}".format(
+              time_ref, time_new, np.max(np.abs(chroma - ref))))
+
+
 if __name__ == '__main__':
     os.chdir(os.path.dirname(os.path.abspath(__file__)))
     l_sample = 64
@@ -384,3 +1104,6 @@ if __name__ == '__main__':
             solve_chroma2(
                 l_val=l_val, l_idx=l_idx, h_val=h_val, h_idx=h_idx,
                 l_sample_num=l_sample, color_space_name=cs.BT709)
+    # _test_solve_chroma_analytical()
+    # _benchmark_solve_chroma_newton()
+    # _benchmark_gamut_boundary_lut()
@@ -96,6 +96,10 @@ const_rec709_y_coef = [0.2126, 0.7152, 0.0722]
 const_srgb_eotf_threshold = 0.04045
 const_srgb_oetf_threshold = 0.0031308
 
+# ColorPipeline で1回に処理する画素数。
+# float64 で 1.5MB 程度になり L2 キャッシュに収まる。
+const_color_pipeline_chunk_size = 2 ** 16
+
 rgb2yuv_rec709mtx = [[0.2126, 0.7152, 0.0722],
                      [-0.2126/1.8556, -0.7152/1.8556, 0.9278/1.8556],
                      [0.7874/1.5748, -0.7152/1.5748, -0.0722/1.5748]]
@@ -198,17 +202,114 @@ def color_cvt(img, mtx):
         img_max = np.finfo(img.dtype).max
         img_min = np.finfo(img.dtype).min
 
-    r, g, b = np.dsplit(img, 3)
-    ro = r * mtx[0][0] + g * mtx[0][1] + b * mtx[0][2]
-    go = r * mtx[1][0] + g * mtx[1][1] + b * mtx[1][2]
-    bo = r * mtx[2][0] + g * mtx[2][1] + b * mtx[2][2]
+    # 整数の画像は float64 で計算する
+    mtx = np.asarray(mtx, dtype=np.result_type(img.dtype, 1.0))
+    out_img = np.matmul(img, mtx.T)
+    np.clip(out_img, img_min, img_max, out=out_img)
 
-    out_img = np.dstack((ro, go, bo))
+    return out_img
 
-    out_img[out_img < img_min] = img_min
-    out_img[out_img > img_max] = img_max
 
-    return out_img
+class ColorPipeline():
+    def __init__(
+            self, steps, clip_range=None,
+            chunk_size=const_color_pipeline_chunk_size):
+        """
+        # 概要
+        EOTF → Matrix → OETF のような一連の変換をまとめて実行する。
+
+        clip_range を指定しない場合、連続する Matrix は事前に
+        1つの Matrix に合成しておく。
+        画像は (N, 3) に reshape して chunk_size 画素ずつ処理するので、
+        中間データはキャッシュに収まる大きさのバッファを使い回す。
+        Matrix は np.matmul(out=...)、クリップは np.clip(out=...) で
+        バッファに直接書き込む。
+
+        # 引数
+        steps : list
+            各要素は 3x3 の Matrix か、画素毎の変換関数
+            (例えば srgb_to_linear, linear_to_pq)。
+            関数は array を受け取り、同じ shape の array を返すこと。
+        clip_range : list
+            [min, max]。指定した場合は各 Matrix の直後にクリップする。
+            途中のクリップの結果が変わらないように Matrix の合成は行わない。
+        chunk_size : int
+            1回に処理する画素数。
+
+        # 使い方
+        >>> pipeline = ColorPipeline(
+        ...     [srgb_to_linear, srgb_to_2020_mtx, linear_to_pq],
+        ...     clip_range=[0.0, 1.0])
+        >>> out_img = pipeline.apply(img)
+        """
+        self.clip_range = clip_range
+        self.chunk_size = chunk_size
+        self.steps = []
+        for step in steps:
+            if callable(step):
+                self.steps.append(step)
+                continue
+            mtx = np.asarray(step, dtype=np.float64)
+            if mtx.shape != (3, 3):
+                raise ValueError('matrix must be 3x3')
+            if clip_range is None and len(self.steps) > 0\
+                    and isinstance(self.steps[-1], np.ndarray):
+                # 直前の Matrix と合成。steps には転置して保存している
+                mtx = mtx.dot(self.steps[-1].T)
+                self.steps.pop()
+            self.steps.append(mtx.T.copy())
+
+    def apply(self, img, out=None):
+        """
+        # 概要
+        img に steps を順番に適用する。
+
+        # 引数
+        img : array_like
+            shape は (..., 3)。float32 の場合は float32 のまま計算する。
+            それ以外は float64 で計算する。
+        out : array_like
+            出力先。img と同じ shape の C-contiguous な配列。
+
+        # 戻り値
+        img と同じ shape の array。
+        """
+        img = np.asarray(img)
+        dtype = np.float32 if img.dtype == np.float32 else np.float64
+        src = img.reshape((-1, 3))
+        if out is None:
+            out = np.empty(img.shape, dtype=dtype)
+        if not out.flags.c_contiguous:
+            raise ValueError('out must be C-contiguous')
+        dst = out.reshape((-1, 3))
+        pixel_num = src.shape[0]
+        chunk_size = max(min(self.chunk_size, pixel_num), 1)
+        buf_list = [np.empty((chunk_size, 3), dtype=dtype) for x in range(2)]
+        steps = [step.astype(dtype) if isinstance(step, np.ndarray) else step
+                 for step in self.steps]
+
+        for st in range(0, pixel_num, chunk_size):
+            ed = min(st + chunk_size, pixel_num)
+            chunk = buf_list[0][:ed - st]
+            np.copyto(chunk, src[st:ed])
+            for step in steps:
+                if isinstance(step, np.ndarray):
+                    # 入力と重ならない方のバッファに書き込む
+                    buf = buf_list[1] if np.may_share_memory(
+                        chunk, buf_list[0]) else buf_list[0]
+                    chunk = np.matmul(chunk, step, out=buf[:ed - st])
+                    if self.clip_range is not None:
+                        np.clip(
+                            chunk, self.clip_range[0], self.clip_range[1],
+                            out=chunk)
+                else:
+                    chunk = step(chunk)
+            dst[st:ed] = chunk
+
+        return out
+
+    def __call__(self, img, out=None):
+        return self.apply(img, out=out)
 
 
 def xyY_to_XYZ(xyY):
@@ -236,46 +337,85 @@ def xyY_to_XYZ(xyY):
     return np.dstack((large_x, large_y, large_z))
 
 
-def srgb_to_linear(img):
+def _check_normalized_float(img):
     """
     # 概要
-    sRGB の 画像をリニアに戻す
-
-    # 注意事項
-    img は float型であること
+    img が float 型で、かつ 1.0 以下に正規化されているかを確認する。
+    np.sum(img > 1) と違って bool の配列を作らない。
     """
-
     float_list = [np.float, np.float16, np.float32]
 
     if img.dtype not in float_list:
         raise TypeError('img must be float type!')
 
-    if np.sum(img > 1) > 0:
+    if img.size > 0 and np.max(img) > 1:
         raise ValueError('img must be normalized to 0 .. 1')
 
-    lower_img = img / 12.92
-    upper_img = ((img + 0.055) / 1.055) ** 2.4
 
-    out_img = lower_img * (img <= const_srgb_eotf_threshold)\
-        + upper_img * (img >= const_srgb_eotf_threshold)
+def _prepare_out(img, out):
+    """
+    # 概要
+    out が None なら img と同じ shape の出力先を確保する。
+    dtype は img が浮動小数点型ならそのまま、整数型なら float64 とする。
+    out に img 自身を渡すと in-place で変換する。
+    """
+    if out is None:
+        if np.issubdtype(img.dtype, np.floating):
+            out = np.empty_like(img)
+        else:
+            out = np.empty(img.shape, dtype=np.float64)
+    elif out.shape != img.shape:
+        raise ValueError('out must have the same shape as img')
 
-    return out_img
+    return out
 
 
-def linear_to_pq(img):
+def srgb_to_linear(img, out=None, validate=True):
+    """
+    # 概要
+    sRGB の 画像をリニアに戻す
+
+    # 引数
+    img : array_like
+        sRGB の画像。float型であること。
+    out : array_like
+        出力先。img 自身を指定すると in-place で変換する。
+    validate : bool
+        False の場合は型とレンジのチェックを省略する。
+
+    # 注意事項
+    where= を指定した ufunc は SIMD が効かず遅いため、
+    べき乗の区間は全画素で計算し、線形の区間の画素だけ上書きする。
+    """
+    img = np.asarray(img)
+    if validate:
+        _check_normalized_float(img)
+    out = _prepare_out(img, out)
+
+    # in-place の場合に備えて、上書きされる前に取り出しておく
+    lower = img <= const_srgb_eotf_threshold
+    lower_img = img[lower] / 12.92
+    with np.errstate(invalid='ignore'):
+        np.add(img, 0.055, out=out)
+        out /= 1.055
+        np.power(out, 2.4, out=out)
+    out[lower] = lower_img
+
+    return out
+
+
+def linear_to_pq(img, out=None, validate=True):
     """
     # brief
     convert linear data to pq.
+    img**m1 is computed only once.
     # reference
     ITU-R BT.2100-0
     """
-    float_list = [np.float, np.float16, np.float32]
-
-    if img.dtype not in float_list:
-        raise TypeError('img must be float type!')
-
-    if np.sum(img > 1) > 0:
-        raise ValueError('img must be normalized to 0 .. 1')
+    img = np.asarray(img)
+    if validate:
+        _check_normalized_float(img)
+    out = _prepare_out(img, out)
 
     m1 = 2610 / 16384
     m2 = 2523 / 4096 * 128
@@ -283,19 +423,26 @@ def linear_to_pq(img):
     c2 = 2413 / 4096 * 32
     c3 = 2392 / 4096 * 32
 
-    numerator = c1 + c2 * (img**m1)
-    denominator = 1 + c3 * (img**m1)
+    np.power(img, m1, out=out)
+    denominator = out * c3
+    denominator += 1
+    out *= c2
+    out += c1
+    out /= denominator
 
-    return (numerator / denominator) ** m2
+    return np.power(out, m2, out=out)
 
 
-def pq_to_linear(img):
+def pq_to_linear(img, out=None):
     """
     # brief
     convert pq data to linear data.
+    img**(1/m2) is computed only once.
     # reference
     ITU-R BT.2100-0
     """
+    img = np.asarray(img)
+    out = _prepare_out(img, out)
 
     m1 = 2610 / 16384
     m2 = 2523 / 4096 * 128
@@ -303,54 +450,74 @@ def pq_to_linear(img):
     c2 = 2413 / 4096 * 32
     c3 = 2392 / 4096 * 32
 
-    numerator = (img ** (1/m2)) - c1
-    numerator[numerator < 0] = 0
-    denominator = c2 - c3 * (img ** (1/m2))
+    np.power(img, 1/m2, out=out)
+    denominator = out * -c3
+    denominator += c2
+    out -= c1
+    np.maximum(out, 0, out=out)
+    out /= denominator
 
-    return (numerator / denominator) ** (1/m1)
+    return np.power(out, 1/m1, out=out)
 
 
-def linear_to_hlg(img):
+def linear_to_hlg(img, out=None):
     """
     # brief
     convert linear data to hlg.
     # reference
     ITU-R BT.2100-0
     """
+    img = np.asarray(img)
+    out = _prepare_out(img, out)
+
     a = 0.17883277
     b = 0.02372241
     c = 1.00429347
-    lower = (img <= 1/12) * ((3 * img) ** (0.5))
-    img_b = img - b
-    img_b[img_b < 0] = 0.00001
-    upper = (img > 1/12) * (a * np.log(img_b) + c)
-    return lower + upper
+    # in-place の場合に備えて、上書きされる前に取り出しておく
+    lower = img <= 1/12
+    lower_img = np.sqrt(img[lower] * 3)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.subtract(img, b, out=out)
+        np.log(out, out=out)
+        out *= a
+        out += c
+    out[lower] = lower_img
 
+    return out
 
-def linear_to_srgb(img):
+
+def linear_to_srgb(img, out=None, validate=True):
     """
     # 概要
     リニアの画像をsRGBに変換する
 
+    # 引数
+    img : array_like
+        リニアの画像。float型であること。
+    out : array_like
+        出力先。img 自身を指定すると in-place で変換する。
+    validate : bool
+        False の場合は型とレンジのチェックを省略する。
+
     # 注意事項
-    img は float型であること
+    where= を指定した ufunc は SIMD が効かず遅いため、
+    べき乗の区間は全画素で計算し、線形の区間の画素だけ上書きする。
     """
+    img = np.asarray(img)
+    if validate:
+        _check_normalized_float(img)
+    out = _prepare_out(img, out)
 
-    float_list = [np.float, np.float16, np.float32]
+    # in-place の場合に備えて、上書きされる前に取り出しておく
+    lower = img <= const_srgb_oetf_threshold
+    lower_img = img[lower] * 12.92
+    with np.errstate(invalid='ignore'):
+        np.power(img, 1/2.4, out=out)
+        out *= 1.055
+        out -= 0.055
+    out[lower] = lower_img
 
-    if img.dtype not in float_list:
-        raise TypeError('img must be float type!')
-
-    if np.sum(img > 1) > 0:
-        raise ValueError('img must be normalized to 0 .. 1')
-
-    lower_img = img * 12.92
-    upper_img = 1.055 * (img ** (1/2.4)) - 0.055
-
-    out_img = lower_img * (img <= const_srgb_oetf_threshold)\
-        + upper_img * (img >= const_srgb_oetf_threshold)
-
-    return out_img
+    return out
 
 
 def linear_to_rec709(img, plot=False):
@@ -806,7 +973,120 @@ def yuv_to_ycbcr(yuv, bit_depth=10):
     return ycbcr
 
 
+def _benchmark_color_pipeline(width=3840, height=2160):
+    """
+    # 概要
+    sRGB → BT.2020 PQ の変換で、個別の関数を順に呼んだ場合と
+    ColorPipeline の処理時間、peak メモリ、差分を比較する。
+    """
+    import time
+    import tracemalloc
+
+    mtx = linalg.inv(get_rgb_to_xyz_matrix(gamut=const_rec2020_xy)).dot(
+        get_rgb_to_xyz_matrix(gamut=const_sRGB_xy))
+    pipeline = ColorPipeline(
+        [srgb_to_linear, mtx, linear_to_pq], clip_range=[0.0, 1.0])
+
+    def convert_separately(img):
+        rgb = color_cvt(srgb_to_linear(img), mtx)
+        rgb[rgb < 0] = 0
+        rgb[rgb > 1] = 1
+        return linear_to_pq(rgb)
+
+    for dtype in [np.float64, np.float32]:
+        img = np.random.default_rng(0).random((height, width, 3))
+        img = img.astype(dtype)
+        result = []
+        for func in [convert_separately, pipeline.apply]:
+            tracemalloc.start()
+            start = time.time()
+            out_img = func(img)
+            elapsed_time = time.time() - start
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            result.append(out_img)
+            print("{}, {}: {:.3f}[s], peak memory={:.0f}[MB]".format(
+                np.dtype(dtype).name, func.__name__, elapsed_time,
+                peak_memory / 2 ** 20))
+        print("max diff={:.3e}".format(np.max(np.abs(result[0] - result[1]))))
+
+
+def _benchmark_transfer_kernels(width=3840, height=2160):
+    """
+    # 概要
+    4K の float32 画像で、srgb/pq/hlg の変換関数を以前の実装
+    (両方の区間を計算して bool の mask を掛ける方式) と比較する。
+    """
+    import time
+    import tracemalloc
+
+    m1 = 2610 / 16384
+    m2 = 2523 / 4096 * 128
+    c1 = 3424 / 4096
+    c2 = 2413 / 4096 * 32
+    c3 = 2392 / 4096 * 32
+
+    def srgb_to_linear_ref(img):
+        lower_img = img / 12.92
+        upper_img = ((img + 0.055) / 1.055) ** 2.4
+        return lower_img * (img <= const_srgb_eotf_threshold)\
+            + upper_img * (img >= const_srgb_eotf_threshold)
+
+    def linear_to_srgb_ref(img):
+        lower_img = img * 12.92
+        upper_img = 1.055 * (img ** (1/2.4)) - 0.055
+        return lower_img * (img <= const_srgb_oetf_threshold)\
+            + upper_img * (img >= const_srgb_oetf_threshold)
+
+    def linear_to_pq_ref(img):
+        numerator = c1 + c2 * (img**m1)
+        denominator = 1 + c3 * (img**m1)
+        return (numerator / denominator) ** m2
+
+    def pq_to_linear_ref(img):
+        numerator = (img ** (1/m2)) - c1
+        numerator[numerator < 0] = 0
+        denominator = c2 - c3 * (img ** (1/m2))
+        return (numerator / denominator) ** (1/m1)
+
+    def linear_to_hlg_ref(img):
+        a = 0.17883277
+        b = 0.02372241
+        c = 1.00429347
+        lower = (img <= 1/12) * ((3 * img) ** (0.5))
+        img_b = img - b
+        img_b[img_b < 0] = 0.00001
+        upper = (img > 1/12) * (a * np.log(img_b) + c)
+        return lower + upper
+
+    img = np.random.default_rng(0).random((height, width, 3))
+    img = img.astype(np.float32)
+    out_img = np.empty_like(img)
+    func_list = [
+        (srgb_to_linear_ref, srgb_to_linear),
+        (linear_to_srgb_ref, linear_to_srgb),
+        (linear_to_pq_ref, linear_to_pq),
+        (pq_to_linear_ref, pq_to_linear),
+        (linear_to_hlg_ref, linear_to_hlg)]
+
+    for ref_func, func in func_list:
+        result = []
+        for name, cvt in [("ref", ref_func),
+                          ("new", lambda x: func(x, out=out_img))]:
+            tracemalloc.start()
+            start = time.time()
+            result.append(cvt(img).copy())
+            elapsed_time = time.time() - start
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print("{}, {}: {:.3f}[s], peak memory={:.0f}[MB]".format(
+                func.__name__, name, elapsed_time, peak_memory / 2 ** 20))
+        print("max diff={:.3e}".format(np.max(np.abs(result[0] - result[1]))))
+
+
 if __name__ == '__main__':
+    # _benchmark_color_pipeline()
+    # _benchmark_transfer_kernels()
     # lab = np.ones((1, 1, 3))
     # lab[0][0][0] = 42.101
     # lab[0][0][1] = 53.378
@@ -18,6 +18,7 @@ In-Out は原則 [0:1] のレンジで行う。
 """
 
 import os
+from functools import lru_cache
 import numpy as np
 from colour.colorimetry import ILLUMINANTS
 from colour import RGB_COLOURSPACES
@@ -44,6 +45,9 @@ DCI_P3 = 'DCI-P3'
 SRTB = 'sRGB'
 P3_D65 = 'P3-D65'
 
+# 変換 Matrix のキャッシュ数
+MATRIX_CACHE_SIZE = 256
+
 
 def xy_to_xyz_internal(xy):
     rz = 1 - (xy[0][0] + xy[0][1])
@@ -57,9 +61,36 @@ def xy_to_xyz_internal(xy):
     return xyz
 
 
+def _to_hashable(value):
+    """
+    ndarray を lru_cache のキーとして使える tuple に変換する。
+    """
+    value = np.asarray(value, dtype=np.float64)
+    return (value.shape, tuple(value.flatten().tolist()))
+
+
+def _from_hashable(key):
+    """
+    `_to_hashable()` の逆変換。
+    """
+    shape, data = key
+    return np.array(data, dtype=np.float64).reshape(shape)
+
+
+def _make_read_only(mtx):
+    """
+    キャッシュした Matrix を呼び出し側で壊されないように
+    書き込み禁止のコピーにする。
+    """
+    mtx = np.array(mtx, dtype=np.float64)
+    mtx.setflags(write=False)
+    return mtx
+
+
 def calc_rgb_to_xyz_matrix(gamut_xy, white_large_xyz):
     """
-    RGB2XYZ Matrixを計算する
+    RGB2XYZ Matrixを計算する。
+    同じ引数での計算結果はキャッシュされる。
 
     Parameters
     ----------
@@ -70,10 +101,18 @@ def calc_rgb_to_xyz_matrix(gamut_xy, white_large_xyz):
 
     Returns
     -------
-    array_like
-        a cms pattern image.
+    ndarray
+        RGB2XYZ Matrix. 書き込み禁止。
 
     """
+    return _calc_rgb_to_xyz_matrix_cached(
+        _to_hashable(gamut_xy), _to_hashable(white_large_xyz))
+
+
+@lru_cache(maxsize=MATRIX_CACHE_SIZE)
+def _calc_rgb_to_xyz_matrix_cached(gamut_key, white_key):
+    gamut_xy = _from_hashable(gamut_key)
+    white_large_xyz = _from_hashable(white_key)
 
     # まずは xyz 座標を準備
     # ------------------------------------------------
@@ -105,13 +144,30 @@ def calc_rgb_to_xyz_matrix(gamut_xy, white_large_xyz):
     s_matrix = np.array(s_matrix)
     rgb2xyz_mtx = gamut_mtx.T.dot(s_matrix)
 
-    return rgb2xyz_mtx
+    return _make_read_only(rgb2xyz_mtx)
 
 
+def calc_xyz_to_rgb_matrix(gamut_xy, white_large_xyz):
+    """
+    XYZ2RGB Matrixを計算する。
+    `calc_rgb_to_xyz_matrix()` の逆行列。同じくキャッシュされる。
+    """
+    return _calc_xyz_to_rgb_matrix_cached(
+        _to_hashable(gamut_xy), _to_hashable(white_large_xyz))
+
+
+@lru_cache(maxsize=MATRIX_CACHE_SIZE)
+def _calc_xyz_to_rgb_matrix_cached(gamut_key, white_key):
+    rgb_to_xyz_matrix = _calc_rgb_to_xyz_matrix_cached(gamut_key, white_key)
+    return _make_read_only(linalg.inv(rgb_to_xyz_matrix))
+
+
+@lru_cache(maxsize=MATRIX_CACHE_SIZE)
 def get_rgb_to_xyz_matrix(name):
     """
     RGB to XYZ の Matrix を求める。
     DCI-P3 で D65 の係数を返せるように内部関数化した。
+    結果はキャッシュされるため書き込み禁止にしてある。
     """
     if name != "DCI-P3":
         rgb_to_xyz_matrix = RGB_COLOURSPACES[name].RGB_to_XYZ_matrix
@@ -120,23 +176,24 @@ def get_rgb_to_xyz_matrix(name):
             = calc_rgb_to_xyz_matrix(RGB_COLOURSPACES[DCI_P3].primaries,
                                      xy_to_XYZ(ILLUMINANTS[CMFS_NAME]['D65']))
 
-    return rgb_to_xyz_matrix
+    return _make_read_only(rgb_to_xyz_matrix)
 
 
+@lru_cache(maxsize=MATRIX_CACHE_SIZE)
 def get_xyz_to_rgb_matrix(name):
     """
     XYZ to RGB の Matrix を求める。
     DCI-P3 で D65 の係数を返せるように内部関数化した。
+    結果はキャッシュされるため書き込み禁止にしてある。
     """
     if name != "DCI-P3":
         xyz_to_rgb_matrix = RGB_COLOURSPACES[name].XYZ_to_RGB_matrix
     else:
-        rgb_to_xyz_matrix\
-            = calc_rgb_to_xyz_matrix(RGB_COLOURSPACES[DCI_P3].primaries,
+        xyz_to_rgb_matrix\
+            = calc_xyz_to_rgb_matrix(RGB_COLOURSPACES[DCI_P3].primaries,
                                      xy_to_XYZ(ILLUMINANTS[CMFS_NAME]['D65']))
-        xyz_to_rgb_matrix = linalg.inv(rgb_to_xyz_matrix)
 
-    return xyz_to_rgb_matrix
+    return _make_read_only(xyz_to_rgb_matrix)
 
 
 def get_white_point(name=ACES_AP0):
@@ -147,18 +204,111 @@ def get_white_point(name=ACES_AP0):
         return ILLUMINANTS[CMFS_NAME][illuminant]
 
 
-def rgb2rgb_mtx(src_name, dst_name):
+@lru_cache(maxsize=MATRIX_CACHE_SIZE)
+def rgb2rgb_mtx(src_name, dst_name, cat='CAT02'):
+    """
+    RGB to RGB の Matrix を求める。
+    RGB→XYZ→色順応→RGB を1つの Matrix に合成したものを返す。
+    白色点は色域の名称から決まるため、(src_name, dst_name, cat) を
+    キーにキャッシュする。
+
+    Parameters
+    ----------
+    src_name : str
+        変換元の色域の名称。
+    dst_name : str
+        変換先の色域の名称。
+    cat : str
+        色順応の方式。
+
+    Returns
+    -------
+    ndarray
+        RGB to RGB の Matrix. 書き込み禁止。
+    """
     src_white = xy_to_XYZ(get_white_point(src_name))
     dst_white = xy_to_XYZ(get_white_point(dst_name))
 
-    chromatic_adaptation_mtx = cat02_mtx(src_white, dst_white, 'CAT02')
+    chromatic_adaptation_mtx = cat02_mtx(src_white, dst_white, cat)
     src_rgb2xyz_mtx = get_rgb_to_xyz_matrix(src_name)
     dst_xyz2rgb_mtx = get_xyz_to_rgb_matrix(dst_name)
 
     temp = np.dot(chromatic_adaptation_mtx, src_rgb2xyz_mtx)
     mtx = np.dot(dst_xyz2rgb_mtx, temp)
 
-    return mtx
+    return _make_read_only(mtx)
+
+
+@lru_cache(maxsize=MATRIX_CACHE_SIZE)
+def get_colour_rgb_to_xyz_matrix(name):
+    """
+    colour の RGB_COLOURSPACES に定義されている RGB to XYZ の Matrix を
+    そのまま返す。`get_rgb_to_xyz_matrix()` と違い、
+    DCI-P3 も DCI の白色点の係数のまま。書き込み禁止。
+    """
+    return _make_read_only(RGB_COLOURSPACES[name].RGB_to_XYZ_matrix)
+
+
+@lru_cache(maxsize=MATRIX_CACHE_SIZE)
+def get_colour_xyz_to_rgb_matrix(name):
+    """
+    colour の RGB_COLOURSPACES に定義されている XYZ to RGB の Matrix を
+    そのまま返す。`get_xyz_to_rgb_matrix()` と違い、
+    DCI-P3 も DCI の白色点の係数のまま。書き込み禁止。
+    """
+    return _make_read_only(RGB_COLOURSPACES[name].XYZ_to_RGB_matrix)
+
+
+@lru_cache(maxsize=MATRIX_CACHE_SIZE)
+def get_rgb_to_normalized_xyz_matrix(name, white=tuple(D65)):
+    """
+    RGB を白色点で正規化した XYZ (X/Xn, Y/Yn, Z/Zn) に変換する Matrix を求める。
+    CIELAB の f(t) の直前までを1つの Matrix に合成したもの。
+    RGB to XYZ の Matrix は `get_colour_rgb_to_xyz_matrix()` を使う。
+
+    Parameters
+    ----------
+    name : str
+        RGB の色域の名称。
+    white : tuple
+        正規化に使う白色点の xy 座標。
+
+    Returns
+    -------
+    ndarray
+        Matrix. 書き込み禁止。
+    """
+    white_large_xyz = xy_to_XYZ(np.array(white))
+    mtx = get_colour_rgb_to_xyz_matrix(name)\
+        / white_large_xyz[:, np.newaxis]
+
+    return _make_read_only(mtx)
+
+
+@lru_cache(maxsize=MATRIX_CACHE_SIZE)
+def get_normalized_xyz_to_rgb_matrix(name, white=tuple(D65)):
+    """
+    `get_rgb_to_normalized_xyz_matrix()` の逆方向の Matrix を求める。
+    CIELAB の f^-1(t) の直後から RGB までを1つの Matrix に合成したもの。
+    XYZ to RGB の Matrix は `get_colour_xyz_to_rgb_matrix()` を使う。
+
+    Parameters
+    ----------
+    name : str
+        RGB の色域の名称。
+    white : tuple
+        正規化に使う白色点の xy 座標。
+
+    Returns
+    -------
+    ndarray
+        Matrix. 書き込み禁止。
+    """
+    white_large_xyz = xy_to_XYZ(np.array(white))
+    mtx = get_colour_xyz_to_rgb_matrix(name)\
+        * white_large_xyz[np.newaxis, :]
+
+    return _make_read_only(mtx)
 
 
 def mtx44_from_mtx33(mtx):
@@ -184,6 +334,26 @@ def get_primaries(color_space_name=BT709):
     return RGB_COLOURSPACES[color_space_name].primaries
 
 
+def _benchmark_matrix_cache(loop_num=2000):
+    """
+    Matrix のキャッシュの効果を確認する。
+    """
+    import time
+
+    def measure(func):
+        st = time.perf_counter()
+        for idx in range(loop_num):
+            func()
+        return (time.perf_counter() - st) / loop_num * 1e6
+
+    funcs = [(rgb2rgb_mtx, (BT709, ACES_AP0)),
+             (get_xyz_to_rgb_matrix, (DCI_P3, ))]
+    for func, args in funcs:
+        print("{}: {:.1f} us -> {:.1f} us".format(
+            func.__name__, measure(lambda: func.__wrapped__(*args)),
+            measure(lambda: func(*args))))
+
+
 if __name__ == '__main__':
     os.chdir(os.path.dirname(os.path.abspath(__file__)))
     # print(rgb2rgb_mtx(DCI_P3, ACES_AP0))
@@ -197,6 +367,7 @@ if __name__ == '__main__':
     # ap0_bt709 = rgb2rgb_mtx(ACES_AP0, BT709)
     # print(ocio_matrix_transform_mtx(ACES_AP0, BT709))
     # print(ocio_matrix_transform_mtx(BT709, ACES_AP0))
+    # _benchmark_matrix_cache()
 
     print(ocio_matrix_transform_mtx(ACES_AP0, DCI_P3))
     print(ocio_matrix_transform_mtx(DCI_P3, ACES_AP0))
@@ -15,7 +15,8 @@ from colour.colorimetry import MultiSpectralDistribution, SpectralDistribution
 from colour.utilities import tstack
 from colour.temperature import CCT_to_xy_CIE_D
 from colour import sd_CIE_illuminant_D_series
-from colour import XYZ_to_RGB, RGB_to_XYZ
+from colour import XYZ_to_RGB, RGB_to_XYZ, xy_to_XYZ
+from colour.adaptation import chromatic_adaptation_matrix_VonKries
 import color_space as cs
 
 CIE1931 = 'CIE 1931 2 Degree Standard Observer'
@@ -206,15 +207,13 @@ def colorchecker_spectrum_to_large_xyz(d_light, color_checker, cmfs):
     color_checker.trim(shape)
     cmfs.trim(shape)
     d_light.trim(shape)
-    
-    large_xyz_buf = []
-    for idx in range(24):
-        temp = d_light.values * color_checker.values[:, idx]
-        temp = temp.reshape((d_light.values.shape[0], 1))
-        large_xyz = np.sum(temp * cmfs.values * normalize_coef, axis=0)
-        large_xyz_buf.append(large_xyz)
 
-    return np.array(large_xyz_buf)
+    # 全パッチをまとめて 光源 x 反射率 x 等色関数 を計算する
+    large_xyz = np.einsum(
+        'w,wp,wc->pc', d_light.values, color_checker.values, cmfs.values,
+        optimize=True)
+
+    return large_xyz * normalize_coef
 
 
 def color_checker_large_xyz_to_rgb(
@@ -268,5 +267,143 @@ def temperature_convert(
     return rgb_out
 
 
+def calc_temperature_convert_matrix(
+        src_temperature=6500, dst_temperatures=[5000],
+        chromatic_adaptation="CAT02",
+        color_space=cs.RGB_COLOURSPACES[cs.SRTB]):
+    """
+    `temperature_convert()` と同じ変換を行う 3x3 Matrix を
+    変換先の色温度毎に求める。
+    RGB→XYZ→色順応→RGB を1つの Matrix に合成している。
+
+    Returns
+    -------
+    ndarray
+        shape は (len(dst_temperatures), 3, 3)。
+    """
+    dst_temperatures = np.atleast_1d(
+        np.asarray(dst_temperatures, dtype=np.float64))
+    rgb_to_xyz_matrix = color_space.RGB_to_XYZ_matrix
+    xyz_to_rgb_matrix = color_space.XYZ_to_RGB_matrix
+    if chromatic_adaptation is None:
+        cat_matrix = np.tile(np.identity(3), (dst_temperatures.size, 1, 1))
+    else:
+        src_large_xyz = xy_to_XYZ(
+            make_xy_value_from_temperature(src_temperature))
+        dst_large_xyz = xy_to_XYZ(
+            make_xy_value_from_temperature(dst_temperatures))
+        cat_matrix = chromatic_adaptation_matrix_VonKries(
+            src_large_xyz, dst_large_xyz, chromatic_adaptation)
+        cat_matrix = cat_matrix.reshape((dst_temperatures.size, 3, 3))
+
+    return np.matmul(
+        xyz_to_rgb_matrix, np.matmul(cat_matrix, rgb_to_xyz_matrix))
+
+
+def _normalize_temperature_converted_rgb(rgb_out):
+    """
+    `temperature_convert()` と同じく、負の値は0にクリップし、
+    1.0 を超えたフレームはそのフレームの最大値で正規化する。
+    rgb_out は (T, ..., 3) で、in-place で処理する。
+    """
+    if np.min(rgb_out) < 0:
+        print("under flow has occured, at temperature_convert.")
+        np.maximum(rgb_out, 0, out=rgb_out)
+
+    frame_max = rgb_out.reshape((rgb_out.shape[0], -1)).max(axis=-1)
+    over_idx = np.flatnonzero(frame_max > 1)
+    if over_idx.size > 0:
+        print("over flow has occured, at temperature_convert.")
+        for idx in over_idx:
+            rgb_out[idx] /= frame_max[idx]
+
+    return rgb_out
+
+
+def temperature_convert_batch(
+       rgb_in, src_temperature=6500, dst_temperatures=[5000],
+       chromatic_adaptation="CAT02", color_space=cs.RGB_COLOURSPACES[cs.SRTB]):
+    """
+    ColorChecker の色温度を複数の色温度に一括で変更する。
+    rgb_in は linear data とする。
+
+    色温度毎に 3x3 の Matrix を事前に計算しておき、
+    (T, H, W, 3) に対して1回の matmul で適用する。
+    アンダーフロー・オーバーフローの処理はフレーム毎に行うので、
+    各フレームは `temperature_convert()` を個別に呼んだ結果と一致する。
+
+    Parameters
+    ----------
+    rgb_in : array_like
+        linear RGB. shape is (..., 3).
+    src_temperature : float
+        変換元の色温度。
+    dst_temperatures : array_like
+        変換先の色温度。shape is (T,).
+
+    Returns
+    -------
+    ndarray
+        shape is (T, ..., 3).
+    """
+    rgb_in = np.asarray(rgb_in, dtype=np.float64)
+    mtx = calc_temperature_convert_matrix(
+        src_temperature, dst_temperatures, chromatic_adaptation, color_space)
+    rgb_out = np.matmul(
+        rgb_in.reshape((1, -1, 3)), mtx.transpose((0, 2, 1)))
+    rgb_out = rgb_out.reshape((mtx.shape[0], ) + rgb_in.shape)
+
+    return _normalize_temperature_converted_rgb(rgb_out)
+
+
+def temperature_convert_frames(
+       rgb_in, src_temperature=6500, dst_temperatures=[5000],
+       chromatic_adaptation="CAT02", color_space=cs.RGB_COLOURSPACES[cs.SRTB]):
+    """
+    `temperature_convert_batch()` のストリーミング版。
+    Matrix は一括で計算し、変換は1フレームずつ行って yield する。
+    (T, H, W, 3) を確保できない長いスイープの描画に使う。
+
+    Yields
+    ------
+    ndarray
+        shape is rgb_in.shape.
+    """
+    rgb_in = np.asarray(rgb_in, dtype=np.float64)
+    mtx = calc_temperature_convert_matrix(
+        src_temperature, dst_temperatures, chromatic_adaptation, color_space)
+    for frame_mtx in mtx:
+        rgb_out = np.matmul(rgb_in, frame_mtx.T)
+        yield _normalize_temperature_converted_rgb(
+            rgb_out[np.newaxis])[0]
+
+
+def _benchmark_temperature_convert_batch(
+        width=640, height=360, temperature_num=64):
+    """
+    色温度のスイープで、`temperature_convert()` をループで呼んだ場合と
+    `temperature_convert_batch()` の処理時間と差分を比較する。
+    """
+    import time
+
+    rgb_in = np.random.default_rng(0).random((height, width, 3)) * 0.5
+    dst_temperatures = np.linspace(3000, 12000, temperature_num)
+
+    start = time.time()
+    rgb_loop = np.array(
+        [temperature_convert(rgb_in, dst_temperature=dst_temperature)
+         for dst_temperature in dst_temperatures])
+    loop_time = time.time() - start
+
+    start = time.time()
+    rgb_batch = temperature_convert_batch(
+        rgb_in, dst_temperatures=dst_temperatures)
+    batch_time = time.time() - start
+
+    print("loop: {:.3f}[s], batch: {:.3f}[s], max diff={:.3e}".format(
+        loop_time, batch_time, np.max(np.abs(rgb_loop - rgb_batch))))
+
+
 if __name__ == '__main__':
     os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    # _benchmark_temperature_convert_batch()
@@ -14,11 +14,48 @@ these data have been downloaded from following site.
 """
 
 import os
+from functools import lru_cache
 import numpy as np
 from scipy import linalg
 import matplotlib.pyplot as plt
 
 
+def _get_data_filename(name):
+    return os.path.dirname(os.path.abspath(__file__))\
+        + os.path.normpath("/data/" + name)
+
+
+@lru_cache(maxsize=None)
+def _load_csv_data(filename):
+    """
+    # 概要
+    csv を読み込んで転置したデータを返す。
+
+    # 注意事項
+    初回に csv の横に ``filename + ".npy"`` を作成し、
+    2回目以降はそれを memmap で読み込む。csv の方が新しい場合は作り直す。
+    プロセス内でもキャッシュするため、戻り値は書き込み禁止。
+    """
+    npy_name = filename + ".npy"
+    if os.path.exists(npy_name)\
+            and os.path.getmtime(npy_name) >= os.path.getmtime(filename):
+        return np.load(npy_name, mmap_mode='r')
+
+    data = np.loadtxt(filename, delimiter=',', skiprows=1).T
+    # 別プロセスが書き込み途中のファイルを読まないように一時ファイルから置き換える
+    tmp_name = npy_name + ".{:d}.tmp.npy".format(os.getpid())
+    try:
+        np.save(tmp_name, data)
+        os.replace(tmp_name, npy_name)
+    except OSError:
+        # 書き込めない場所ではプロセス内のキャッシュだけ使う
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
+    data.setflags(write=False)
+
+    return data
+
+
 def color_temp_to_small_xy(temperature):
     """
     # 概要
@@ -45,11 +82,8 @@ def _get_d_illuminants_s_coef():
     D光源の算出に必要な係数(S0, S1, S2)を取得する
     """
 
-    filename = os.path.dirname(os.path.abspath(__file__))\
-        + os.path.normpath("/data/d_illuminant_s0s1s2_components.csv")
-    data = np.loadtxt(filename, delimiter=',', skiprows=1).T
-
-    return data
+    return _load_csv_data(
+        _get_data_filename("d_illuminant_s0s1s2_components.csv"))
 
 
 def _get_d_illuminants_m_coef(x, y):
@@ -73,18 +107,14 @@ def get_d_illuminants_spectrum(temperature):
 
     # 注意事項
     temperature は numpy であること。1次元。
+    S0 + M1 * S1 + M2 * S2 を全ての色温度に対して1回の行列積で計算する。
     """
     s_param = _get_d_illuminants_s_coef()
     wavelength = np.uint16(s_param[0])
-    s0 = s_param[1]
-    s1 = s_param[2]
-    s2 = s_param[3]
-    x, y = color_temp_to_small_xy(temperature)
+    x, y = color_temp_to_small_xy(np.asarray(temperature, dtype=np.float64))
     m1, m2 = _get_d_illuminants_m_coef(x, y)
-    s = []
-    for idx, t in enumerate(temperature):
-        s.append(s0 + m1[idx] * s1 + m2[idx] * s2)
-    s = np.array(s)
+    m_coef = np.stack([np.ones_like(m1), m1, m2], axis=-1)
+    s = np.dot(m_coef, s_param[1:4])
 
     return wavelength, s
 
@@ -98,9 +128,7 @@ def get_d65_spectrum():
     http://www.cie.co.at/index.php/LEFTMENUE/DOWNLOADS
     """
 
-    filename = os.path.dirname(os.path.abspath(__file__))\
-        + os.path.normpath("/data/d65_spectrum.csv")
-    data = np.loadtxt(filename, delimiter=',', skiprows=1).T
+    data = _load_csv_data(_get_data_filename("d65_spectrum.csv"))
 
     return np.uint16(data[0]), data[1]
 
@@ -114,13 +142,153 @@ def get_cie1931_color_matching_function():
     http://www.cie.co.at/index.php/LEFTMENUE/DOWNLOADS
     """
 
-    filename = os.path.dirname(os.path.abspath(__file__))\
-        + os.path.normpath("/data/cie_1931_color_matching_function.csv")
-    data = np.loadtxt(filename, delimiter=',', skiprows=1).T
+    data = _load_csv_data(
+        _get_data_filename("cie_1931_color_matching_function.csv"))
 
     return np.uint16(data[0]), data[1:]
 
 
+class SpectralEngine():
+    def __init__(self):
+        """
+        # 概要
+        複数の光源・複数の反射率から XYZ をまとめて計算する。
+
+        S0, S1, S2、等色関数、D65 の分光分布は初回に読み込んで
+        共通の波長にそろえておく。XYZ の計算は
+        光源 x 反射率 x 等色関数 を1回の einsum で行う。
+
+        # 使い方
+        >>> engine = SpectralEngine()
+        >>> t = np.linspace(4000, 25000, 5000)
+        >>> large_xyz = engine.d_illuminant_to_large_xyz(t, reflectance)
+        >>> large_xyz.shape
+        (5000, 24, 3)
+        """
+        s_coef = _get_d_illuminants_s_coef()
+        s_wl = s_coef[0]
+        s_param = s_coef[1:4]
+        d65_wl, d65 = get_d65_spectrum()
+        cmf_wl, cmf = get_cie1931_color_matching_function()
+        wavelength = np.intersect1d(
+            np.intersect1d(np.uint16(s_wl), d65_wl), cmf_wl)
+
+        def extract(src_wl, data):
+            idx = np.in1d(np.uint16(src_wl), wavelength)
+            return np.ascontiguousarray(data[..., idx], dtype=np.float64)
+
+        self.wavelength = wavelength
+        self.s_param = extract(s_wl, s_param)
+        self.d65 = extract(d65_wl, d65)
+        self.cmf = extract(cmf_wl, cmf).T.copy()
+
+    def d_illuminant_spectrum(self, temperature):
+        """
+        # 概要
+        D光源の分光分布を求める。
+
+        # 引数
+        temperature : array_like
+            色温度。shape は (N,)。
+
+        # 戻り値
+        shape が (N, self.wavelength.size) の array。
+        """
+        x, y = color_temp_to_small_xy(
+            np.asarray(temperature, dtype=np.float64))
+        m1, m2 = _get_d_illuminants_m_coef(x, y)
+        m_coef = np.stack([np.ones_like(m1), m1, m2], axis=-1)
+
+        return np.dot(m_coef, self.s_param)
+
+    def spectrum_to_large_xyz(self, spd, reflectance=None):
+        """
+        # 概要
+        光源の分光分布と反射率から XYZ を求める。
+        完全拡散反射面の Y が 1.0 となるように光源毎に正規化する。
+
+        # 引数
+        spd : array_like
+            光源の分光分布。shape は (N, self.wavelength.size)。
+        reflectance : array_like
+            反射率。shape は (M, self.wavelength.size)。
+            None の場合は光源そのものの XYZ を求める。
+
+        # 戻り値
+        reflectance を指定した場合は shape が (N, M, 3)、
+        None の場合は (N, 3) の array。
+        """
+        spd = np.atleast_2d(spd)
+        normalize_coef = 1 / np.dot(spd, self.cmf[:, 1])
+        if reflectance is None:
+            large_xyz = np.dot(spd, self.cmf)
+            return large_xyz * normalize_coef[:, np.newaxis]
+
+        large_xyz = np.einsum(
+            'nw,mw,wc->nmc', spd, np.atleast_2d(reflectance), self.cmf,
+            optimize=True)
+
+        return large_xyz * normalize_coef[:, np.newaxis, np.newaxis]
+
+    def d_illuminant_to_large_xyz(self, temperature, reflectance=None):
+        """
+        # 概要
+        D光源の色温度のリストと反射率から XYZ を求める。
+        引数と戻り値は `spectrum_to_large_xyz()` を参照。
+        """
+        return self.spectrum_to_large_xyz(
+            self.d_illuminant_spectrum(temperature), reflectance)
+
+    def d65_to_large_xyz(self, reflectance=None):
+        """
+        # 概要
+        D65 での XYZ を求める。
+        引数と戻り値は `spectrum_to_large_xyz()` を参照。
+        """
+        return self.spectrum_to_large_xyz(self.d65, reflectance)[0]
+
+
+@lru_cache(maxsize=None)
+def get_spectral_engine():
+    """
+    # 概要
+    SpectralEngine を1つだけ作成して使い回す。
+    """
+    return SpectralEngine()
+
+
+def _benchmark_spectral_engine(temperature_num=5000, patch_num=24):
+    """
+    # 概要
+    色温度を振った場合の XYZ の計算時間を、
+    色温度毎・パッチ毎にループした場合と比較する。
+    """
+    import time
+
+    engine = get_spectral_engine()
+    temperature = np.linspace(4000, 25000, temperature_num)
+    reflectance = np.random.default_rng(0).random(
+        (patch_num, engine.wavelength.size))
+
+    start = time.time()
+    spd = engine.d_illuminant_spectrum(temperature)
+    large_xyz_loop = np.zeros((temperature_num, patch_num, 3))
+    for t_idx in range(temperature_num):
+        normalize_coef = 1 / np.sum(spd[t_idx] * engine.cmf[:, 1])
+        for p_idx in range(patch_num):
+            temp = (spd[t_idx] * reflectance[p_idx]).reshape((-1, 1))
+            large_xyz_loop[t_idx, p_idx] = np.sum(
+                temp * engine.cmf * normalize_coef, axis=0)
+    loop_time = time.time() - start
+
+    start = time.time()
+    large_xyz = engine.d_illuminant_to_large_xyz(temperature, reflectance)
+    engine_time = time.time() - start
+
+    print("loop: {:.3f}[s], engine: {:.3f}[s], max diff={:.3e}".format(
+        loop_time, engine_time, np.max(np.abs(large_xyz - large_xyz_loop))))
+
+
 if __name__ == '__main__':
     t = np.arange(4000, 10100, 100, dtype=np.float64)
     x, y = color_temp_to_small_xy(t)
@@ -132,3 +300,4 @@ if __name__ == '__main__':
     wl1, s = get_d65_spectrum()
     wl2, xyz = get_cie1931_color_matching_function()
     idx = np.in1d(wl1, wl2)
+    # _benchmark_spectral_engine()
@@ -55,12 +55,19 @@
 """
 
 import os
+import json
+import hashlib
 import numpy as np
 import math
+from concurrent.futures import ThreadPoolExecutor
 
 AUTHOR_INFORMATION = "This 3DLUT data was created by TY-LUT creation tool"
 LUT_BIT_DEPTH_3DL = 16
 
+# PeriodicLut1D のキャッシュ。LUTの中身をキーにしている。
+PERIODIC_LUT_1D_CACHE_SIZE = 64
+_periodic_lut_1d_cache = {}
+
 
 def get_3d_grid_cube_format(grid_num=4):
     """
@@ -186,6 +193,29 @@ def _is_int_expression(s):
         return False
 
 
+def _format_lut_data(data, line_format):
+    """
+    LUTデータ全体を1回の書式変換で文字列にする。
+    1行毎に str.format するよりも高速。
+
+    Parameters
+    ----------
+    data : array_like
+        LUT data. shape is (line_num, column_num).
+    line_format : str
+        1行分の書式。printf 形式で指定する。
+        例: '%.10e %.10e %.10e\n'
+
+    Returns
+    -------
+    str
+        formatted data.
+    """
+    data = np.asarray(data)
+
+    return (line_format * data.shape[0]) % tuple(data.ravel().tolist())
+
+
 def save_3dlut(lut, grid_num, filename="./data/lut_sample/cube.cube",
                title=None, min=0.0, max=1.0):
     """
@@ -223,15 +253,27 @@ def save_3dlut(lut, grid_num, filename="./data/lut_sample/cube.cube",
         raise IOError('extension "{:s}" is not supported.'.format(ext))
 
 
-def load_3dlut(filename="./data/lut_sample/cube.cube"):
+def load_3dlut(filename="./data/lut_sample/cube.cube",
+               use_binary_cache=False, mmap=False):
     """
     3DLUTデータをファイルにファイルから読み込む。
     形式の判定はファイル名の拡張子で行う。
 
+    use_binary_cache=True の場合、テキストファイルと内容が一致する
+    バイナリのサイドカー(``filename + ".npy"``, ``filename + ".json"``)
+    があればそちらを読み込む。
+    サイドカーが無い・古い場合はテキストを読み込んだ後に作成する。
+    サイドカーを書き込めない場合はテキストの読み込み結果だけを返す。
+
     Parameters
     ----------
     filename : str
         file name.
+    use_binary_cache : bool
+        whether to use the binary sidecar.
+    mmap : bool
+        True の場合、サイドカーを読み込み専用の np.memmap のまま返す。
+        False の場合は書き込み可能な array にコピーして返す。
 
     Returns
     -------
@@ -241,7 +283,16 @@ def load_3dlut(filename="./data/lut_sample/cube.cube"):
         grid number of the 3DLUT.
     """
 
+    if use_binary_cache and is_3dlut_binary_cache_valid(filename):
+        lut, grid_num, header = load_3dlut_binary(filename)
+        if not mmap:
+            lut = np.array(lut)
+        return lut, grid_num
+
     root, ext = os.path.splitext(filename)
+    title = None
+    min = 0.0
+    max = 1.0
 
     if ext == ".cube":
         lut, grid_num, title, min, max\
@@ -255,9 +306,132 @@ def load_3dlut(filename="./data/lut_sample/cube.cube"):
     else:
         raise IOError('extension "{:s}" is not supported.'.format(ext))
 
+    if use_binary_cache:
+        try:
+            save_3dlut_binary(
+                lut, grid_num, filename=filename, title=title, min=min,
+                max=max, source_filename=filename)
+        except OSError:
+            # 読み込み専用のディレクトリなどではサイドカーを作らない
+            pass
+
     return lut, grid_num
 
 
+def get_3dlut_binary_name(filename):
+    """
+    3DLUT のバイナリのサイドカーのファイル名を返す。
+
+    Returns
+    -------
+    str, str
+        file name of the data (.npy) and the header (.json).
+    """
+    return filename + ".npy", filename + ".json"
+
+
+def _calc_file_hash(filename):
+    hash_obj = hashlib.sha1()
+    with open(filename, "rb") as file:
+        for chunk in iter(lambda: file.read(2 ** 20), b''):
+            hash_obj.update(chunk)
+
+    return hash_obj.hexdigest()
+
+
+def save_3dlut_binary(lut, grid_num, filename, title=None, min=0.0, max=1.0,
+                      source_filename=None, dtype=np.float64):
+    """
+    3DLUTデータをバイナリのサイドカー形式で保存する。
+    データは .npy、ヘッダ情報は .json に保存する。
+
+    Parameters
+    ----------
+    lut : array_like
+        3dlut data with cube format.
+    grid_num : int
+        grid number.
+    filename : str
+        file name of the text LUT. サイドカーのファイル名は
+        get_3dlut_binary_name(filename) となる。
+    title : str
+        title of the 3dlut data.
+    min : int or float
+        minimum value of the 3dlut
+    max : int or float
+        maximum value of the 3dlut
+    source_filename : str
+        元となったテキストファイル。
+        ハッシュ値とサイズをヘッダに記録する。
+    dtype : type
+        保存時のデータ型。np.float32 にするとサイズが半分になる。
+    """
+    data_name, header_name = get_3dlut_binary_name(filename)
+    header = dict(
+        grid_num=int(grid_num), min=float(min), max=float(max), title=title,
+        dtype=np.dtype(dtype).name, source_hash=None, source_size=None)
+    if source_filename is not None:
+        header['source_hash'] = _calc_file_hash(source_filename)
+        header['source_size'] = os.path.getsize(source_filename)
+
+    # 別プロセスが読み込み中でも壊れないように一時ファイルから置き換える。
+    # データを先、ヘッダを最後に置き換える。途中で読まれても
+    # 新しいデータ + 古いヘッダとなり、ハッシュ値の不一致で無効と判定される
+    tmp_data_name = data_name + ".{:d}.tmp.npy".format(os.getpid())
+    tmp_header_name = header_name + ".{:d}.tmp".format(os.getpid())
+    np.save(tmp_data_name, np.asarray(lut, dtype=dtype).reshape((-1, 3)))
+    with open(tmp_header_name, "w") as file:
+        json.dump(header, file, indent=4)
+    os.replace(tmp_data_name, data_name)
+    os.replace(tmp_header_name, header_name)
+
+
+def load_3dlut_binary(filename):
+    """
+    バイナリのサイドカー形式の3DLUTデータを np.memmap で読み込む。
+    複数のプロセスで読み込んでも物理メモリ上のデータは共有される。
+
+    Parameters
+    ----------
+    filename : str
+        file name of the text LUT.
+
+    Returns
+    -------
+    lut : array_like
+        3DLUT data with cube format. read-only memmap.
+    grid_num : int
+        grid number.
+    header : dict
+        header information.
+    """
+    data_name, header_name = get_3dlut_binary_name(filename)
+    with open(header_name, "r") as file:
+        header = json.load(file)
+    lut = np.load(data_name, mmap_mode='r')
+
+    return lut, header['grid_num'], header
+
+
+def is_3dlut_binary_cache_valid(filename):
+    """
+    サイドカーが存在し、テキストファイルと内容が一致するかを判定する。
+    mtime は cp -p や git checkout で巻き戻ることがあるため使わず、
+    サイズとハッシュ値で判定する。テキストファイルが無い場合は無効とする。
+    """
+    data_name, header_name = get_3dlut_binary_name(filename)
+    if not (os.path.exists(data_name) and os.path.exists(header_name)):
+        return False
+    if not os.path.exists(filename):
+        return False
+    with open(header_name, "r") as file:
+        header = json.load(file)
+    if header.get('source_size') != os.path.getsize(filename):
+        return False
+
+    return header.get('source_hash') == _calc_file_hash(filename)
+
+
 def save_3dlut_cube_format(lut, grid_num, filename,
                            title=None, min=0.0, max=1.0):
     """
@@ -293,11 +467,9 @@ def save_3dlut_cube_format(lut, grid_num, filename,
 
     # ファイルにデータを書き込む
     # ------------------------
-    out_str = '{:.10e} {:.10e} {:.10e}\n'
     with open(filename, "w") as file:
         file.write(header)
-        for line in lut:
-            file.write(out_str.format(line[0], line[1], line[2]))
+        file.write(_format_lut_data(lut, '%.10e %.10e %.10e\n'))
 
 
 def load_3dlut_cube_format(filename):
@@ -389,18 +561,18 @@ def save_3dlut_spi_format(lut, grid_num, filename,
     header += '{:d} {:d}\n'.format(3, 3)  # 数値の意味は不明
     header += '{0:d} {0:d} {0:d}\n'.format(grid_num)
 
+    # 各行の r_idx, g_idx, b_idx を一括で求めておく
+    # ------------------------
+    r_idx, g_idx, b_idx = _get_rgb_index_for_spi3d_output(
+        np.arange(grid_num ** 3), grid_num)
+    out_data = np.column_stack((r_idx, g_idx, b_idx, out_lut))
+
     # ファイルにデータを書き込む
     # ------------------------
-    line_index = 0
-    out_str = '{:d} {:d} {:d} {:.10e} {:.10e} {:.10e}\n'
     with open(filename, "w") as file:
         file.write(header)
-        for line in out_lut:
-            r_idx, g_idx, b_idx\
-                = _get_rgb_index_for_spi3d_output(line_index, grid_num)
-            file.write(out_str.format(r_idx, g_idx, b_idx,
-                                      line[0], line[1], line[2]))
-            line_index += 1
+        file.write(_format_lut_data(
+            out_data, '%d %d %d %.10e %.10e %.10e\n'))
 
 
 def load_3dlut_spi_format(filename):
@@ -526,11 +698,9 @@ def save_3dlut_3dl_format(lut, grid_num, filename,
 
     # ファイルにデータを書き込む
     # ------------------------
-    out_str = '{:d} {:d} {:d}\n'
     with open(filename, "w") as file:
         file.write(header)
-        for line in out_lut:
-            file.write(out_str.format(line[0], line[1], line[2]))
+        file.write(_format_lut_data(out_lut, '%d %d %d\n'))
 
 
 def load_3dlut_3dl_format(filename):
@@ -652,11 +822,10 @@ def save_1dlut_cube_format(lut, filename, title=None, min=0.0, max=1.0):
 
     # ファイルにデータを書き込む
     # ------------------------
-    out_str = '{0:.10e} {0:.10e} {0:.10e}\n'
+    out_data = np.repeat(np.asarray(lut).reshape((-1, 1)), 3, axis=1)
     with open(filename, "w") as file:
         file.write(header)
-        for line in lut:
-            file.write(out_str.format(line))
+        file.write(_format_lut_data(out_data, '%.10e %.10e %.10e\n'))
 
 
 def load_1dlut_cube_format(filename):
@@ -743,11 +912,10 @@ def save_1dlut_spi_format(lut, filename,
 
     # ファイルにデータを書き込む
     # ------------------------
-    out_str = '         {:.10e}\n'
+    out_data = np.asarray(lut).reshape((-1, 1))
     with open(filename, "w") as file:
         file.write(header)
-        for line in lut:
-            file.write(out_str.format(line))
+        file.write(_format_lut_data(out_data, '         %.10e\n'))
         file.write(footer)
 
 
@@ -892,6 +1060,280 @@ def make_3dlut_grid(grid_num=33):
     return rgb_grid
 
 
+class Lut3D():
+    def __init__(
+            self, lut, grid_num, min=0.0, max=1.0,
+            interpolation="tetrahedral", chunk_size=2 ** 18, thread_num=1,
+            dtype=np.float32):
+        """
+        3DLUT を画像に適用するクラスのコンストラクタ
+
+        Parameters
+        ----------
+        lut : array_like
+            3DLUT data with cube format. shape is (grid_num ** 3, 3).
+        grid_num : int
+            grid number of the 3DLUT.
+        min : int or float
+            minimum value of the input domain.
+        max : int or float
+            maximum value of the input domain.
+        interpolation : str
+            "tetrahedral" or "trilinear".
+        chunk_size : int
+            一度に処理する画素数。中間データのメモリ使用量を抑えるため。
+        thread_num : int
+            chunk を並列処理するスレッド数。
+        dtype : type
+            内部の計算精度。出力もこの型となる。
+
+        Examples
+        --------
+        >>> lut, grid_num = load_3dlut("./data/lut_sample/cube.cube")
+        >>> lut3d = Lut3D(lut, grid_num, thread_num=4)
+        >>> img = lut3d.apply(img)
+        """
+        if interpolation not in ["tetrahedral", "trilinear"]:
+            raise ValueError(
+                'interpolation "{:s}" is not supported.'.format(
+                    interpolation))
+        self.table = np.ascontiguousarray(
+            np.asarray(lut).reshape((grid_num ** 3, 3)), dtype=dtype)
+        self.grid_num = grid_num
+        self.min = min
+        self.max = max
+        self.interpolation = interpolation
+        self.chunk_size = chunk_size
+        self.thread_num = thread_num
+        self.dtype = dtype
+
+        # cube形式なので idx は R -> G -> B の順に増加する
+        self.offset = np.array([1, grid_num, grid_num ** 2], dtype=np.int32)
+
+    def apply(self, rgb):
+        """
+        3DLUT を適用する。
+
+        Parameters
+        ----------
+        rgb : array_like
+            input data. shape is (..., 3).
+            dtype が uint8, uint16 の場合はそれぞれ 0xFF, 0xFFFF で
+            正規化して扱う。それ以外の整数型は TypeError となる。
+
+        Returns
+        -------
+        array_like
+            output data. shape is same as the input data.
+        """
+        rgb = np.asarray(rgb)
+        src = rgb.reshape((-1, 3))
+        dst = np.empty(src.shape, dtype=self.dtype)
+        chunk_list = [
+            (st, min(st + self.chunk_size, src.shape[0]))
+            for st in range(0, src.shape[0], self.chunk_size)]
+
+        def apply_chunk(st_ed):
+            st, ed = st_ed
+            dst[st:ed] = self._apply_chunk(src[st:ed])
+
+        if self.thread_num > 1:
+            with ThreadPoolExecutor(self.thread_num) as executor:
+                list(executor.map(apply_chunk, chunk_list))
+        else:
+            for st_ed in chunk_list:
+                apply_chunk(st_ed)
+
+        return dst.reshape(rgb.shape)
+
+    def _calc_index_and_fraction(self, src):
+        """
+        入力値から格子点の index と格子点間の端数を求める。
+        """
+        if src.dtype == np.uint8:
+            in_scale = 1 / 0xFF
+        elif src.dtype == np.uint16:
+            in_scale = 1 / 0xFFFF
+        elif np.issubdtype(src.dtype, np.integer):
+            raise TypeError(
+                'integer input must be uint8 or uint16. '
+                'normalize "{}" data to float [0:1].'.format(src.dtype.name))
+        else:
+            in_scale = 1.0
+        scale = (self.grid_num - 1) / (self.max - self.min)
+        pos = src.astype(self.dtype)
+        pos *= in_scale * scale
+        pos -= self.min * scale
+        np.clip(pos, 0, self.grid_num - 1, out=pos)
+        idx = np.minimum(pos.astype(np.int32), self.grid_num - 2)
+        frac = pos - idx
+        base_idx = idx @ self.offset
+
+        return base_idx, frac
+
+    def _apply_chunk(self, src):
+        base_idx, frac = self._calc_index_and_fraction(src)
+        if self.interpolation == "tetrahedral":
+            return self._tetrahedral(base_idx, frac)
+        else:
+            return self._trilinear(base_idx, frac)
+
+    def _trilinear(self, base_idx, frac):
+        fr = frac[:, 0:1]
+        fg = frac[:, 1:2]
+        fb = frac[:, 2:3]
+        dr, dg, db = self.offset
+        table = self.table
+
+        c00 = np.take(table, base_idx, axis=0)
+        c00 += (np.take(table, base_idx + dr, axis=0) - c00) * fr
+        c10 = np.take(table, base_idx + dg, axis=0)
+        c10 += (np.take(table, base_idx + dg + dr, axis=0) - c10) * fr
+        c01 = np.take(table, base_idx + db, axis=0)
+        c01 += (np.take(table, base_idx + db + dr, axis=0) - c01) * fr
+        c11 = np.take(table, base_idx + db + dg, axis=0)
+        c11 += (np.take(table, base_idx + db + dg + dr, axis=0) - c11) * fr
+        c00 += (c10 - c00) * fg
+        c01 += (c11 - c01) * fg
+        c00 += (c01 - c00) * fb
+
+        return c00
+
+    def _tetrahedral(self, base_idx, frac):
+        """
+        各画素の端数を大きい順に並べ、その順に辿った4頂点で補間する。
+        """
+        fr = frac[:, 0]
+        fg = frac[:, 1]
+        fb = frac[:, 2]
+        dr, dg, db = self.offset
+        table = self.table
+
+        # 端数が最大・最小となる軸の offset
+        r_ge_g = fr >= fg
+        g_ge_b = fg >= fb
+        r_ge_b = fr >= fb
+        max_offset = np.where(
+            r_ge_g, np.where(r_ge_b, dr, db), np.where(g_ge_b, dg, db))
+        min_offset = np.where(
+            r_ge_g, np.where(g_ge_b, db, dg), np.where(r_ge_b, db, dr))
+        f_max = np.maximum(np.maximum(fr, fg), fb)
+        f_min = np.minimum(np.minimum(fr, fg), fb)
+        f_mid = fr + fg + fb - f_max - f_min
+
+        v0 = np.take(table, base_idx, axis=0)
+        v1 = np.take(table, base_idx + max_offset, axis=0)
+        v2 = np.take(table, base_idx + (dr + dg + db - min_offset), axis=0)
+        v3 = np.take(table, base_idx + (dr + dg + db), axis=0)
+
+        out = v0 * (1 - f_max)[:, np.newaxis]
+        out += v1 * (f_max - f_mid)[:, np.newaxis]
+        out += v2 * (f_mid - f_min)[:, np.newaxis]
+        out += v3 * f_min[:, np.newaxis]
+
+        return out
+
+
+class PeriodicLut1D():
+    def __init__(self, lut, period=2*np.pi, dtype=np.float64):
+        """
+        等間隔の格子点を持つ周期的な 1DLUT。Hue が入力の LUT 用。
+        格子点は np.linspace(0, period, len(lut)) とし、
+        lut[0] と lut[-1] は同じ値(周期の両端)を想定する。
+
+        scipy.interpolate.interp1d と異なり、格子点の探索をせずに
+        index を直接計算して線形補間する。
+        範囲外の入力は period で折り返す。
+
+        Parameters
+        ----------
+        lut : array_like
+            1dlut data. shape is (N,).
+        period : float
+            周期。
+        dtype : type
+            LUT と補間計算の型。np.float32 も可。
+
+        Examples
+        --------
+        >>> periodic_lut = PeriodicLut1D(l_focal_lut)
+        >>> l_focal = periodic_lut.apply(hue)
+        """
+        self.dtype = np.dtype(dtype)
+        self.lut = np.ascontiguousarray(lut, dtype=self.dtype)
+        self.period = period
+        self.max_idx = len(self.lut) - 2
+        self.step_inv = (len(self.lut) - 1) / period
+        self.slope = np.diff(self.lut)
+
+    def apply(self, x):
+        """
+        Parameters
+        ----------
+        x : array_like
+            入力値。0～period の範囲外は折り返す。
+
+        Returns
+        -------
+        array_like
+            補間結果。shape は x と同じ。
+        """
+        x = np.asarray(x, dtype=self.dtype)
+        out_of_range = (x < 0.0) | (x > self.period)
+        if np.any(out_of_range):
+            x = np.where(out_of_range, np.mod(x, self.period), x)
+
+        pos = x * self.step_inv
+        idx = np.minimum(pos.astype(np.int64), self.max_idx)
+        pos -= idx
+
+        y = np.take(self.slope, idx)
+        y *= pos
+        y += np.take(self.lut, idx)
+
+        return y
+
+
+def get_periodic_lut_1d(lut, period=2*np.pi, dtype=np.float64):
+    """
+    PeriodicLut1D をキャッシュから取得する。無ければ作る。
+    """
+    lut = np.ascontiguousarray(lut, dtype=dtype)
+    key = (lut.tobytes(), period, lut.dtype.str)
+    periodic_lut = _periodic_lut_1d_cache.get(key)
+    if periodic_lut is None:
+        if len(_periodic_lut_1d_cache) >= PERIODIC_LUT_1D_CACHE_SIZE:
+            _periodic_lut_1d_cache.clear()
+        periodic_lut = PeriodicLut1D(lut, period, dtype)
+        _periodic_lut_1d_cache[key] = periodic_lut
+
+    return periodic_lut
+
+
+def interpolate_periodic_1dlut(x, lut, period=2*np.pi, dtype=np.float64):
+    """
+    周期的な 1DLUT の線形補間をする。
+    詳細は PeriodicLut1D を参照。
+
+    Parameters
+    ----------
+    x : array_like
+        入力値。
+    lut : array_like
+        1dlut data. 格子点は np.linspace(0, period, len(lut))。
+    period : float
+        周期。
+    dtype : type
+        LUT と補間計算の型。
+
+    Returns
+    -------
+    array_like
+        補間結果。
+    """
+    return get_periodic_lut_1d(lut, period, dtype).apply(x)
+
+
 def _test_3dlut():
     g_num = 17
     lut = get_3d_grid_cube_format(grid_num=g_num)
@@ -940,7 +1382,143 @@ def _test_1dlut():
     print(lut)
 
 
+def _benchmark_lut_text_io(grid_num=65, dir_name="./data/lut_sample"):
+    """
+    テキスト形式の 3DLUT/1DLUT の書き込み・読み込み時間を計測し、
+    読み込んだデータが元のデータと一致するか確認する。
+    """
+    import time
+
+    lut = get_3d_grid_cube_format(grid_num=grid_num) ** 2.4
+    lut_1d = np.linspace(0, 1, 4096) ** 2.4
+    for ext in [".cube", ".spi3d", ".3dl"]:
+        filename = os.path.join(dir_name, "benchmark" + ext)
+        start = time.time()
+        save_3dlut(lut, grid_num, filename=filename)
+        write_time = time.time() - start
+        start = time.time()
+        lut_read, grid_num_read = load_3dlut(
+            filename=filename, use_binary_cache=False)
+        read_time = time.time() - start
+        print("{:s}: write={:.3f}[sec], read={:.3f}[sec], "
+              "max diff={:.3e}".format(
+                  ext, write_time, read_time,
+                  np.max(np.abs(lut_read - lut))))
+
+    for ext in [".cube", ".spi1d"]:
+        filename = os.path.join(dir_name, "benchmark_1d" + ext)
+        start = time.time()
+        save_1dlut(lut_1d, filename=filename)
+        write_time = time.time() - start
+        start = time.time()
+        lut_read = load_1dlut(filename=filename)
+        read_time = time.time() - start
+        print("{:s}: write={:.3f}[sec], read={:.3f}[sec], "
+              "max diff={:.3e}".format(
+                  ext, write_time, read_time,
+                  np.max(np.abs(lut_read - lut_1d))))
+
+
+def _benchmark_3dlut_binary_cache(
+        grid_num=65, filename="./data/lut_sample/benchmark_cache.cube"):
+    """
+    テキストの読み込みとバイナリのサイドカーの読み込み時間を比較する。
+    """
+    import time
+
+    lut = get_3d_grid_cube_format(grid_num=grid_num) ** 2.4
+    save_3dlut(lut, grid_num, filename=filename)
+    for data_name in get_3dlut_binary_name(filename):
+        if os.path.exists(data_name):
+            os.remove(data_name)
+
+    start = time.time()
+    lut_text, _ = load_3dlut(filename=filename, use_binary_cache=False)
+    print("text  : {:.4f}[sec]".format(time.time() - start))
+
+    start = time.time()
+    load_3dlut(filename=filename, use_binary_cache=True)
+    print("text + sidecar creation : {:.4f}[sec]".format(time.time() - start))
+
+    start = time.time()
+    lut_bin, _ = load_3dlut(
+        filename=filename, use_binary_cache=True, mmap=True)
+    print("sidecar (memmap) : {:.4f}[sec]".format(time.time() - start))
+    print("max diff = {:.3e}".format(np.max(np.abs(lut_bin - lut_text))))
+
+
+def _benchmark_lut3d_apply(grid_num=65, width=3840, height=2160):
+    """
+    Lut3D と colour の LUT3D.apply の処理時間を 4K の画像で比較する。
+    """
+    import time
+    from colour import LUT3D
+    from colour.algebra import table_interpolation_tetrahedral,\
+        table_interpolation_trilinear
+
+    lut = get_3d_grid_cube_format(grid_num=grid_num) ** 2.4
+    lut3d_colour = LUT3D(
+        lut.reshape((grid_num, grid_num, grid_num, 3)).transpose(2, 1, 0, 3))
+    img = np.random.default_rng(0).random((height, width, 3))
+    img_float32 = img.astype(np.float32)
+    img_uint16 = np.uint16(np.round(img * 0xFFFF))
+
+    for interpolation, interpolator in zip(
+            ["tetrahedral", "trilinear"],
+            [table_interpolation_tetrahedral, table_interpolation_trilinear]):
+        # colour は一度に処理するとメモリが足りなくなるので帯状に分割する
+        start = time.time()
+        ref = np.concatenate(
+            [lut3d_colour.apply(band, interpolator=interpolator)
+             for band in np.array_split(img, 8, axis=0)])
+        print("colour   {:s}: {:.2f}[sec]".format(
+            interpolation, time.time() - start))
+
+        for thread_num in sorted({1, os.cpu_count()}):
+            lut3d = Lut3D(
+                lut, grid_num, interpolation=interpolation,
+                thread_num=thread_num)
+            for src in [img_float32, img_uint16]:
+                start = time.time()
+                dst = lut3d.apply(src)
+                print("Lut3D    {:s}, {:s}, thread={:d}: {:.2f}[sec], "
+                      "max diff={:.3e}".format(
+                          interpolation, str(src.dtype), thread_num,
+                          time.time() - start, np.max(np.abs(dst - ref))))
+
+
+def _benchmark_periodic_1dlut(
+        sample_num_list=[10 ** 6, 33 * 10 ** 6], lut_size=1024):
+    """
+    interpolate_periodic_1dlut() と scipy.interpolate.interp1d の
+    処理時間と差分を比較する。
+    """
+    import time
+    from scipy import interpolate
+
+    x_lut = np.linspace(0, 2*np.pi, lut_size)
+    lut = 50 + 20 * np.sin(x_lut * 3)
+    for sample_num in sample_num_list:
+        x = np.random.default_rng(0).random(sample_num) * 2 * np.pi
+
+        start = time.time()
+        y_ref = interpolate.interp1d(x_lut, lut)(x)
+        time_ref = time.time() - start
+
+        start = time.time()
+        y = interpolate_periodic_1dlut(x, lut)
+        time_new = time.time() - start
+
+        print("sample_num={:d}: interp1d={:.3f}[s], periodic={:.3f}[s], "
+              "max diff={:.3e}".format(
+                  sample_num, time_ref, time_new, np.max(np.abs(y - y_ref))))
+
+
 if __name__ == '__main__':
     os.chdir(os.path.dirname(os.path.abspath(__file__)))
     # _test_3dlut()
+    # _benchmark_lut3d_apply()
+    # _benchmark_lut_text_io()
+    # _benchmark_3dlut_binary_cache()
+    # _benchmark_periodic_1dlut()
     _test_1dlut()
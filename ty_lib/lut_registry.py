@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+# LUT Registry モジュール
+
+## 概要
+計算で作成する LUT(Gamut Boundary LUT など)を、その入力パラメータで
+管理する。
+
+* 各 LUT の種類(kind)ごとに、ファイル名の関数・作成用の関数・
+  依存する LUT を登録しておく。
+* 入力パラメータ(色域、サンプル数、LPF のパラメータ等)と
+  依存 LUT のハッシュから、LUT のハッシュ値を計算する。
+* `ensure()` を呼ぶと、必要な LUT を依存関係の順に作成する。
+  作成済みの LUT はキャッシュディレクトリにハッシュ値の名前で保存し、
+  別の作業ディレクトリからも再利用する。
+
+## キャッシュディレクトリ
+環境変数 `TY_LUT_CACHE_DIR` で指定する。
+未指定の場合は `~/.cache/ty_lib/luts` を使う。
+
+## 既存のファイルについて
+作業ディレクトリに既にある LUT で、ハッシュ値の記録(.json)が無いもの、
+または記録したファイルのハッシュ値と内容が一致しないものは
+その作業ディレクトリの中でだけ現在のパラメータで作成されたものとみなす。
+古いパラメータで作成された可能性があるため、キャッシュディレクトリには
+コピーしない。
+"""
+
+# import standard libraries
+import os
+import json
+import shutil
+import hashlib
+import inspect
+
+# import third-party libraries
+import numpy as np
+
+# import my libraries
+import color_space as cs
+import cielab as cl
+
+# information
+__author__ = 'Toru Yoshihara'
+__copyright__ = 'Copyright (C) 2020 - Toru Yoshihara'
+__license__ = 'New BSD License - https://opensource.org/licenses/BSD-3-Clause'
+__maintainer__ = 'Toru Yoshihara'
+__email__ = 'toru.ver.11 at-sign gmail.com'
+
+__all__ = []
+
+LUT_CACHE_DIR_ENV_NAME = "TY_LUT_CACHE_DIR"
+DEFAULT_LUT_CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "ty_lib", "luts")
+
+GAMUT_BOUNDARY_LUT_KIND = "GamutBoundaryLUT"
+GAMUT_BOUNDARY_LUT_LUMINANCE_SAMPLE = 1024
+GAMUT_BOUNDARY_LUT_HUE_SAMPLE = 1024
+
+_lut_registry = None
+
+
+class LutRegistry():
+    def __init__(self, cache_dir=None):
+        """
+        LUT の種類ごとの作成方法を管理し、必要に応じて LUT を作成する。
+
+        Parameters
+        ----------
+        cache_dir : str
+            キャッシュディレクトリ。None の場合は環境変数
+            TY_LUT_CACHE_DIR か DEFAULT_LUT_CACHE_DIR を使う。
+
+        Examples
+        --------
+        >>> registry = LutRegistry()
+        >>> registry.register(
+        ...     kind="LfocalLUT", name_func=get_focal_name,
+        ...     build_func=build_focal_lut, depends_func=get_focal_depends,
+        ...     constants=dict(lpf_nn=4, lpf_wn=0.4))
+        >>> fname = registry.ensure(
+        ...     "LfocalLUT", outer_color_space_name=cs.BT2020)
+        """
+        if cache_dir is None:
+            cache_dir = os.environ.get(
+                LUT_CACHE_DIR_ENV_NAME, DEFAULT_LUT_CACHE_DIR)
+        self.cache_dir = cache_dir
+        self.entries = {}
+
+    def register(
+            self, kind, name_func, build_func, depends_func=None,
+            constants=None):
+        """
+        LUT の種類を登録する。
+
+        Parameters
+        ----------
+        kind : str
+            LUT の種類の名前。
+        name_func : callable
+            ``name_func(**params)`` で作業ディレクトリ上のファイル名を返す。
+            params の既定値はこの関数の引数の既定値を使う。
+        build_func : callable
+            ``build_func(**params)`` で name_func のファイルを作成する。
+            同時に他の種類の LUT を作成しても構わない。
+        depends_func : callable
+            ``depends_func(**params)`` で依存する LUT の
+            ``[(kind, params), ...]`` を返す。None の場合は依存なし。
+        constants : dict
+            LUT の内容に影響する定数(LPF のパラメータ等)。
+            ハッシュ値の計算に含める。
+        """
+        self.entries[kind] = dict(
+            name_func=name_func, build_func=build_func,
+            depends_func=depends_func, constants=constants or {})
+
+    def get_params(self, kind, **params):
+        """
+        name_func の既定値を補完した params を返す。
+        """
+        signature = inspect.signature(self.entries[kind]['name_func'])
+        bound = signature.bind(**params)
+        bound.apply_defaults()
+        return dict(bound.arguments)
+
+    def get_depends(self, kind, **params):
+        depends_func = self.entries[kind]['depends_func']
+        if depends_func is None:
+            return []
+        return depends_func(**self.get_params(kind, **params))
+
+    def get_digest(self, kind, **params):
+        """
+        LUT の入力パラメータ、定数、依存 LUT のハッシュ値から
+        ハッシュ値を計算する。
+        """
+        params = self.get_params(kind, **params)
+        description = dict(
+            kind=kind, params=params,
+            constants=self.entries[kind]['constants'],
+            depends=[
+                self.get_digest(dep_kind, **dep_params)
+                for dep_kind, dep_params
+                in self.get_depends(kind, **params)])
+        text = json.dumps(description, sort_keys=True, default=str)
+
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def get_name(self, kind, **params):
+        return self.entries[kind]['name_func'](
+            **self.get_params(kind, **params))
+
+    def get_sibling_outputs(self, kind, **params):
+        """
+        kind と同じ build_func で同時に作成される LUT の
+        ``[(kind, params), ...]`` を返す。
+        name_func を partial で作っている場合、その固定引数は
+        kind 固有の値なので他の LUT には引き継がない。
+        """
+        build_func = self.entries[kind]['build_func']
+        fixed_keys = getattr(self.entries[kind]['name_func'], 'keywords', {})
+        siblings = []
+        for other_kind, entry in self.entries.items():
+            if other_kind == kind or entry['build_func'] is not build_func:
+                continue
+            names = inspect.signature(entry['name_func']).parameters
+            other_params = {
+                key: value for key, value in params.items()
+                if key in names and key not in fixed_keys}
+            siblings.append(
+                (other_kind, self.get_params(other_kind, **other_params)))
+
+        return siblings
+
+    def get_cache_name(self, kind, **params):
+        digest = self.get_digest(kind, **params)
+        return os.path.join(self.cache_dir, f"{kind}_{digest}.npy")
+
+    def ensure(self, kind, **params):
+        """
+        LUT が最新の状態で作業ディレクトリに存在するようにする。
+
+        1. 作業ディレクトリのファイルのハッシュ値が一致すればそのまま。
+           ハッシュ値の記録が無い、または記録後にファイルの内容が
+           変わったものは、adopted として記録して採用する。
+           adopted のファイルはキャッシュにはコピーしない。
+        2. キャッシュディレクトリにあればコピーする。
+        3. 無ければ依存 LUT を用意したうえで作成し、キャッシュに保存する。
+           同じ build_func で同時に作成された LUT もキャッシュに保存する。
+
+        Returns
+        -------
+        str
+            作業ディレクトリ上の LUT のファイル名。
+        """
+        params = self.get_params(kind, **params)
+        fname = self.get_name(kind, **params)
+        digest = self.get_digest(kind, **params)
+        cache_name = self.get_cache_name(kind, **params)
+
+        tag = _read_tag(fname)
+        if os.path.isfile(fname):
+            # レジストリの外で作成・更新されたファイル
+            if tag is None or tag.get('file_hash') != _calc_file_hash(fname):
+                _write_tag(fname, kind, params, digest, adopted=True)
+                return fname
+            if tag['digest'] == digest:
+                # adopted の記録が無い古いタグは adopted とみなす
+                if not tag.get('adopted', True)\
+                        and not os.path.isfile(cache_name):
+                    _copy_file_atomic(fname, cache_name)
+                return fname
+
+        if os.path.isfile(cache_name):
+            _copy_file_atomic(cache_name, fname)
+            _write_tag(fname, kind, params, digest)
+            return fname
+
+        for dep_kind, dep_params in self.get_depends(kind, **params):
+            self.ensure(dep_kind, **dep_params)
+        outputs = [(kind, params)] + self.get_sibling_outputs(kind, **params)
+        mtime_list = [
+            _get_mtime(self.get_name(out_kind, **out_params))
+            for out_kind, out_params in outputs]
+        print(f"building {fname}")
+        self.entries[kind]['build_func'](**params)
+        for (out_kind, out_params), mtime in zip(outputs, mtime_list):
+            out_name = self.get_name(out_kind, **out_params)
+            if out_kind != kind and _get_mtime(out_name) in [None, mtime]:
+                # この build で作成されていない
+                continue
+            _write_tag(
+                out_name, out_kind, out_params,
+                self.get_digest(out_kind, **out_params))
+            _copy_file_atomic(
+                out_name, self.get_cache_name(out_kind, **out_params))
+
+        return fname
+
+    def load(self, kind, mmap_mode=None, **params):
+        """
+        LUT を用意して読み込む。
+        """
+        return np.load(self.ensure(kind, **params), mmap_mode=mmap_mode)
+
+
+def get_tag_name(fname):
+    return fname + ".json"
+
+
+def _read_tag(fname):
+    tag_name = get_tag_name(fname)
+    if not os.path.isfile(tag_name):
+        return None
+    with open(tag_name, "r") as f:
+        return json.load(f)
+
+
+def _get_mtime(fname):
+    if not os.path.isfile(fname):
+        return None
+    return os.stat(fname).st_mtime_ns
+
+
+def _calc_file_hash(fname):
+    hash_obj = hashlib.sha1()
+    with open(fname, "rb") as f:
+        for chunk in iter(lambda: f.read(2 ** 20), b''):
+            hash_obj.update(chunk)
+
+    return hash_obj.hexdigest()
+
+
+def _write_tag(fname, kind, params, digest, adopted=False):
+    """
+    ファイルの内容のハッシュ値も記録し、タグとファイルを対応付ける。
+    adopted=True はレジストリで作成していない既存のファイルを
+    採用したことを示す。
+    """
+    with open(get_tag_name(fname), "w") as f:
+        json.dump(
+            dict(kind=kind, params=params, digest=digest, adopted=adopted,
+                 file_hash=_calc_file_hash(fname)),
+            f, indent=4, default=str)
+
+
+def _copy_file_atomic(src, dst):
+    """
+    途中で止まっても壊れたファイルが残らないように一時ファイル経由でコピーする。
+    """
+    dst_dir = os.path.dirname(os.path.abspath(dst))
+    os.makedirs(dst_dir, exist_ok=True)
+    tmp_name = dst + f".{os.getpid()}.tmp"
+    shutil.copyfile(src, tmp_name)
+    os.replace(tmp_name, dst)
+
+
+def get_gamut_boundary_lut_name(
+        color_space_name=cs.BT709,
+        luminance_sample_num=GAMUT_BOUNDARY_LUT_LUMINANCE_SAMPLE,
+        hue_sample_num=GAMUT_BOUNDARY_LUT_HUE_SAMPLE):
+    name = f"./luts/GamutBoundaryLUT_{color_space_name}_"\
+        + f"L_{luminance_sample_num}_H_{hue_sample_num}.npy"
+    return name
+
+
+def build_gamut_boundary_lut(
+        color_space_name=cs.BT709,
+        luminance_sample_num=GAMUT_BOUNDARY_LUT_LUMINANCE_SAMPLE,
+        hue_sample_num=GAMUT_BOUNDARY_LUT_HUE_SAMPLE):
+    """
+    Gamut Boundary LUT を cl.solve_chroma_analytical で作成して保存する。
+    """
+    l_vals = np.linspace(0, 100, luminance_sample_num)
+    h_vals = np.linspace(0, 2*np.pi, hue_sample_num)
+    chroma = cl.solve_chroma_analytical(
+        l_vals[:, np.newaxis], h_vals[np.newaxis, :],
+        color_space_name=color_space_name)
+    fname = get_gamut_boundary_lut_name(
+        color_space_name, luminance_sample_num, hue_sample_num)
+    os.makedirs(os.path.dirname(fname), exist_ok=True)
+    np.save(fname, chroma)
+
+
+def get_lut_registry():
+    """
+    Gamut Boundary LUT を登録済みの共通のレジストリを返す。
+    """
+    global _lut_registry
+    if _lut_registry is None:
+        _lut_registry = LutRegistry()
+        _lut_registry.register(
+            kind=GAMUT_BOUNDARY_LUT_KIND,
+            name_func=get_gamut_boundary_lut_name,
+            build_func=build_gamut_boundary_lut,
+            constants=dict(solver="analytical"))
+    return _lut_registry
+
+
+def _test_lut_registry(cache_dir="/tmp/ty_lut_registry_test"):
+    """
+    一時ディレクトリで LUT の作成、キャッシュからの復元を確認する。
+    """
+    import tempfile
+
+    registry = get_lut_registry()
+    registry.cache_dir = cache_dir
+    params = dict(
+        color_space_name=cs.BT709, luminance_sample_num=17,
+        hue_sample_num=33)
+    current_dir = os.getcwd()
+    try:
+        for idx in range(2):
+            with tempfile.TemporaryDirectory() as work_dir:
+                os.chdir(work_dir)
+                lut = registry.load(GAMUT_BOUNDARY_LUT_KIND, **params)
+                cache_name = registry.get_cache_name(
+                    GAMUT_BOUNDARY_LUT_KIND, **params)
+                print(f"trial={idx}, shape={lut.shape}, cache={cache_name}")
+                os.chdir(current_dir)
+    finally:
+        os.chdir(current_dir)
+
+
+if __name__ == '__main__':
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    _test_lut_registry()
@@ -19,9 +19,6 @@ In-Out は原則 [0:1] のレンジで行う。
 
 import os
 import numpy as np
-import colour
-import plot_utility as pu
-import matplotlib.pyplot as plt
 
 # NAME
 GAMMA24 = 'Gamma 2.4'
@@ -41,16 +38,24 @@ FLOG = "FUJIFILM F-Log"
 SRGB = "sRGB"
 # ACES_CG = 'ACEScg'
 
-slog_max = colour.models.log_decoding_SLog3((1023 / 1023),
-                                            out_reflection=False)
-slog_ref_max = colour.models.log_decoding_SLog3((1023 / 1023),
-                                                out_reflection=True)
-logc_max = colour.models.log_decoding_ALEXALogC(1.0)
-vlog_ire_max = colour.models.log_decoding_VLog(1.0, out_reflection=False)
-vlog_ref_max = colour.models.log_decoding_VLog(1.0, out_reflection=True)
-red_max = colour.models.log_decoding_REDLog(1.0)
-log3g10_max = colour.models.log_decoding_Log3G10(1.0)
-log3g12_max = colour.models.log_decoding_Log3G12(1.0)
+# colour の import は重いので、各 curve の最大値は計算済みの値を使う。
+# 値が正しいかは _test_max_value() で確認する。
+# slog_max = colour.models.log_decoding_SLog3(1.0, out_reflection=False)
+slog_max = 42.689927041336155
+# slog_ref_max = colour.models.log_decoding_SLog3(1.0, out_reflection=True)
+slog_ref_max = 38.42093433720254
+# logc_max = colour.models.log_decoding_ALEXALogC(1.0)
+logc_max = 55.079576698813185
+# vlog_ire_max = colour.models.log_decoding_VLog(1.0, out_reflection=False)
+vlog_ire_max = 51.206142174155936
+# vlog_ref_max = colour.models.log_decoding_VLog(1.0, out_reflection=True)
+vlog_ref_max = 46.08552795674034
+# red_max = colour.models.log_decoding_REDLog(1.0)
+red_max = 1.0
+# log3g10_max = colour.models.log_decoding_Log3G10(1.0)
+log3g10_max = 184.32234764032498
+# log3g12_max = colour.models.log_decoding_Log3G12(1.0)
+log3g12_max = 737.2984840671963
 # nlog_max = n_log_decoding(1.0, out_reflection=True)
 nlog_max = 14.78086344050015
 # flog_max = f_log_decoding(1.0, out_reflection=True)
@@ -84,6 +89,12 @@ PEAK_LUMINANCE = {GAMMA24: REF_WHITE_LUMINANCE,
                   FLOG: flog_max * REF_WHITE_LUMINANCE,
                   DLOG: dlog_max * REF_WHITE_LUMINANCE}
 
+# oetf_lut, eotf_lut で使用する 1DLUT のサンプル数
+TF_LUT_SIZE = 65536
+
+# oetf_lut, eotf_lut で使用する 1DLUT のキャッシュ
+_tf_lut_cache = {}
+
 
 def oetf(x, name=GAMMA24):
     """
@@ -110,6 +121,8 @@ def oetf(x, name=GAMMA24):
     >>> oetf(0.01, ST2084)
     0.5 付近の値
     """
+    # colour の import は重いので初めて使う時まで遅延させる
+    import colour
 
     if name == GAMMA24:
         y = (x * MAX_VALUE[name]) ** (1/2.4)
@@ -206,6 +219,9 @@ def eotf(x, name=GAMMA24):
     >>> oetf(0.5, ST2084)
     0.01 付近の値
     """
+    # colour の import は重いので初めて使う時まで遅延させる
+    import colour
+
     if name == GAMMA24:
         y = x ** 2.4
     elif name == SRGB:
@@ -276,6 +292,119 @@ def eotf_to_luminance(x, name=GAMMA24):
     return eotf(x, name) * PEAK_LUMINANCE[name]
 
 
+def _get_tf_lut(name, direction, lut_size):
+    """
+    oetf_lut, eotf_lut 用の 1DLUT を返す。
+    初回呼び出し時に作成し、以降はキャッシュを返す。
+    """
+    key = (name, direction, lut_size)
+    if key not in _tf_lut_cache:
+        x = np.linspace(0, 1, lut_size)
+        if direction == "oetf":
+            lut = oetf(x, name)
+        else:
+            lut = eotf(x, name)
+        lut = np.asarray(lut, dtype=np.float64)
+        lut.flags.writeable = False
+        _tf_lut_cache[key] = lut
+
+    return _tf_lut_cache[key]
+
+
+def _apply_tf_lut(x, name, direction, lut_size):
+    """
+    uint8, uint16 は直接参照、浮動小数点型は線形補間で 1DLUT を適用する。
+    Python の int は [0:1] の数値として浮動小数点型と同じ扱いにする。
+    """
+    if isinstance(x, int):
+        x = float(x)
+    x = np.asarray(x)
+    if x.dtype in (np.uint8, np.uint16):
+        # dtype の最大値を 1.0 とする Code Value とみなす
+        max_code = np.iinfo(x.dtype).max
+        lut = _get_tf_lut(name, direction, max_code + 1)
+        return np.take(lut, x)
+    if np.issubdtype(x.dtype, np.integer):
+        # 1DLUT が巨大になる、負の値が折り返される等の問題があるため
+        raise TypeError(
+            'integer input must be uint8 or uint16. '
+            'normalize "{}" data to float [0:1].'.format(x.dtype.name))
+
+    lut = _get_tf_lut(name, direction, lut_size)
+    pos = np.clip(x, 0.0, 1.0) * (lut_size - 1)
+    idx = np.minimum(pos.astype(np.intp), lut_size - 2)
+    y0 = lut[idx]
+
+    return y0 + (lut[idx + 1] - y0) * (pos - idx)
+
+
+def oetf_lut(x, name=GAMMA24, lut_size=TF_LUT_SIZE):
+    """
+    oetf() を 1DLUT で近似計算する。
+    curve 毎に lut_size 点の 1DLUT を初回呼び出し時に作成して使い回す。
+
+    * uint8, uint16 の入力は dtype の最大値を 1.0 とみなして
+      1DLUT を直接参照する(uint8 は 256点, uint16 は 65536点の 1DLUT を使う)。
+      この場合の結果は oetf() と一致する。
+      それ以外の整数型の ndarray は TypeError とする。
+    * 浮動小数点型の入力は [0:1] にクリップした後に線形補間する。
+      oetf() との最大誤差は _benchmark_tf_lut() で確認できる。
+      0 付近の傾きが急峻な curve (ST2084, HLG など) は誤差が大きいので
+      精度が必要な場合は oetf() を使うこと。
+
+    Parameters
+    ----------
+    x : numeric or array_like
+        scene luminance. range is [0:1]
+    name : unicode
+        GAMMA24, ST2084, HLG, ... and so on.
+    lut_size : int
+        sample number of the 1DLUT for the float input.
+
+    Returns
+    -------
+    numeric or ndarray
+        encoded video level.
+
+    Examples
+    --------
+    >>> oetf_lut(0.18, GAMMA24)
+    0.5 付近の値
+    >>> oetf_lut(np.array([0, 0xFFFF], dtype=np.uint16), GAMMA24)
+    array([ 0.,  1.])
+    """
+    return _apply_tf_lut(x, name, "oetf", lut_size)
+
+
+def eotf_lut(x, name=GAMMA24, lut_size=TF_LUT_SIZE):
+    """
+    eotf() を 1DLUT で近似計算する。
+    仕様は oetf_lut() と同じ。
+
+    Parameters
+    ----------
+    x : numeric or array_like
+        code value. range is [0:1]
+    name : unicode
+        GAMMA24, ST2084, HLG, ... and so on.
+    lut_size : int
+        sample number of the 1DLUT for the float input.
+
+    Returns
+    -------
+    numeric or ndarray
+        decoded video level. range is [0:1]
+
+    Examples
+    --------
+    >>> eotf_lut(0.5, GAMMA24)
+    0.18 付近の値
+    >>> eotf_lut(np.array([0, 0xFF], dtype=np.uint8), GAMMA24)
+    array([ 0.,  1.])
+    """
+    return _apply_tf_lut(x, name, "eotf", lut_size)
+
+
 def n_log_encoding(x, in_reflection=False):
     """
     Conversion from linear light to N-Log Value(not CodeValue).
@@ -517,5 +646,90 @@ def d_log_decoding(x, out_reflection=False):
     return y
 
 
+def _test_max_value():
+    """
+    MAX_VALUE に記載した計算済みの値が colour の計算結果と一致するか確認する。
+    """
+    import colour
+
+    ref_value = {
+        SLOG3: colour.models.log_decoding_SLog3(1.0, out_reflection=False),
+        SLOG3_REF: colour.models.log_decoding_SLog3(1.0, out_reflection=True),
+        LOGC: colour.models.log_decoding_ALEXALogC(1.0),
+        VLOG_IRE: colour.models.log_decoding_VLog(1.0, out_reflection=False),
+        VLOG: colour.models.log_decoding_VLog(1.0, out_reflection=True),
+        REDLOG: colour.models.log_decoding_REDLog(1.0),
+        LOG3G10: colour.models.log_decoding_Log3G10(1.0),
+        LOG3G12: colour.models.log_decoding_Log3G12(1.0),
+        NLOG: n_log_decoding(1.0, out_reflection=True),
+        FLOG: f_log_decoding(1.0, out_reflection=True),
+        DLOG: d_log_decoding(1.0, out_reflection=True)}
+    for name, value in ref_value.items():
+        np.testing.assert_allclose(MAX_VALUE[name], value, rtol=1e-12)
+        np.testing.assert_allclose(
+            PEAK_LUMINANCE[name], value * REF_WHITE_LUMINANCE, rtol=1e-12)
+    print("MAX_VALUE is OK")
+
+
+def _benchmark_import_time(budget=0.5):
+    """
+    ``python -X importtime`` で本モジュールの import 時間を計測する。
+    budget [sec] を超えた場合は AssertionError とする。
+    """
+    import subprocess
+    import sys
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c",
+         "import transfer_functions"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    last_line = result.stderr.strip().splitlines()[-1]
+    cumulative_us = int(last_line.split("|")[1])
+    print("import transfer_functions: {:.3f}[sec]".format(
+        cumulative_us / 1e6))
+    assert cumulative_us / 1e6 < budget
+
+
+def _benchmark_tf_lut(sample_num=2 ** 22):
+    """
+    全ての curve について oetf/eotf と oetf_lut/eotf_lut の
+    処理時間と最大誤差を比較する。
+    """
+    import time
+
+    name_list = [GAMMA24, SRGB, ST2084, HLG, LOGC, VLOG_IRE, VLOG,
+                 SLOG3, SLOG3_REF, REDLOG, LOG3G10, LOG3G12, NLOG, DLOG,
+                 FLOG]
+    x = np.random.default_rng(0).random(sample_num)
+    x_uint16 = np.uint16(np.round(x * 0xFFFF))
+    print("{:26s} {:4s} {:>8s} {:>8s} {:>8s} {:>8s} {:>10s}".format(
+        "name", "func", "build", "exact", "lut", "uint16", "max error"))
+    for name in name_list:
+        for func, func_lut in zip([oetf, eotf], [oetf_lut, eotf_lut]):
+            start = time.time()
+            func_lut(0.5, name)
+            build_time = time.time() - start
+
+            start = time.time()
+            ref = func(x, name)
+            exact_time = time.time() - start
+
+            start = time.time()
+            y = func_lut(x, name)
+            lut_time = time.time() - start
+
+            start = time.time()
+            func_lut(x_uint16, name)
+            uint16_time = time.time() - start
+
+            print("{:26s} {:4s} {:8.4f} {:8.4f} {:8.4f} {:8.4f} {:10.2e}".format(
+                name, func.__name__, build_time, exact_time, lut_time,
+                uint16_time, np.max(np.abs(y - ref))))
+
+
 if __name__ == '__main__':
     os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    # _test_max_value()
+    # _benchmark_import_time()
+    # _benchmark_tf_lut()